@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+import sys
+import __builtin__
+import os
+
+# python puts the program's directory path in sys.path[0].  In other words,
+# the user ordinarily has no way to override python's choice of a module from
+# its own dir.  We want to have that ability in our environment.  However, we
+# don't want to break any established python modules that depend on this
+# behavior.  So, we'll save the value from sys.path[0], delete it, import our
+# modules and then restore sys.path to its original value.
+
+save_path_0 = sys.path[0]
+del sys.path[0]
+
+from gen_print import *
+from gen_arg import *
+import openbmc_ffdc_store as ffdc_store
+
+# Restore sys.path[0].
+sys.path.insert(0, save_path_0)
+
+
+###############################################################################
+# Create parser object to process command line parameters and args.
+
+# Create parser object.
+parser = argparse.ArgumentParser(
+    usage='%(prog)s [OPTIONS] COMMAND [FFDC_PREFIXES]',
+    description="%(prog)s works with a content-addressed FFDC store (see" +
+                " lib/openbmc_ffdc_store.py).  The commands are:\n" +
+                "  materialize  Recreate the flat FFDC directory for each" +
+                " given FFDC prefix\n" +
+                "               (or for all FFDC prefixes in the store).\n" +
+                "  list         Print the FFDC prefixes in the store.\n" +
+                "  report       Print the store's storage savings and write" +
+                " times.",
+    formatter_class=argparse.RawTextHelpFormatter,
+    prefix_chars='-+'
+    )
+
+# Create arguments.
+parser.add_argument(
+    'command',
+    choices=['materialize', 'list', 'report'],
+    help="The command to be run."
+    )
+
+parser.add_argument(
+    'ffdc_prefixes',
+    nargs='*',
+    default=[],
+    help="The FFDC prefixes to be materialized."
+    )
+
+parser.add_argument(
+    '--store_dir_path',
+    default=os.environ.get('FFDC_STORE_DIR_PATH', ""),
+    help="The FFDC store directory path.  This defaults to the value of the" +
+         " FFDC_STORE_DIR_PATH environment variable." + default_string
+    )
+
+parser.add_argument(
+    '--ffdc_dir_path',
+    default="",
+    help="The directory in which to materialize the FFDC files.  If this is" +
+         " blank, the directory recorded in each FFDC prefix's manifest is" +
+         " used." + default_string
+    )
+
+# The stock_list will be passed to gen_get_options.  We populate it with the
+# names of stock parm options we want.  These stock parms are pre-defined by
+# gen_get_options.
+stock_list = [("test_mode", 0), ("quiet", 1), ("debug", 0)]
+
+###############################################################################
+
+
+###############################################################################
+def exit_function(signal_number=0,
+                  frame=None):
+
+    r"""
+    Execute whenever the program ends normally or with the signals that we
+    catch (i.e. TERM, INT).
+    """
+
+    dprint_executing()
+    dprint_var(signal_number)
+
+    qprint_pgm_footer()
+
+###############################################################################
+
+
+###############################################################################
+def signal_handler(signal_number, frame):
+
+    r"""
+    Handle signals.  Without a function to catch a SIGTERM or SIGINT, our
+    program would terminate immediately with return code 143 and without
+    calling our exit_function.
+    """
+
+    # Our convention is to set up exit_function with atexit.registr() so
+    # there is no need to explicitly call exit_function from here.
+
+    dprint_executing()
+
+    # Calling exit prevents us from returning to the code that was running
+    # when we received the signal.
+    exit(0)
+
+###############################################################################
+
+
+###############################################################################
+def validate_parms():
+
+    r"""
+    Validate program parameters, etc.  Return True or False accordingly.
+    """
+
+    if store_dir_path == "":
+        print_error_report("No store_dir_path was given and"
+                           " FFDC_STORE_DIR_PATH is not set.\n")
+        return False
+    if not os.path.isdir(store_dir_path):
+        print_error_report("Store directory \"" + store_dir_path +
+                           "\" does not exist.\n")
+        return False
+
+    gen_post_validation(exit_function, signal_handler)
+
+    return True
+
+###############################################################################
+
+
+###############################################################################
+def main():
+
+    r"""
+    This is the "main" function.  The advantage of having this function vs
+    just doing this in the true mainline is that you can:
+    - Declare local variables
+    - Use "return" instead of "exit".
+    - Indent 4 chars like you would in any function.
+    This makes coding more consistent, i.e. it's easy to move code from here
+    into a function and vice versa.
+    """
+
+    if not gen_get_options(parser, stock_list):
+        return False
+
+    if not validate_parms():
+        return False
+
+    qprint_pgm_header()
+
+    # Access program parameter globals.
+    global command
+    global ffdc_prefixes
+    global store_dir_path
+    global ffdc_dir_path
+
+    store = ffdc_store.ffdc_store(store_dir_path)
+
+    if command == "list":
+        for ffdc_prefix in store.get_ffdc_prefixes():
+            print(ffdc_prefix)
+    elif command == "report":
+        sys.stdout.write(store.sprint_report())
+    elif command == "materialize":
+        if not len(ffdc_prefixes):
+            ffdc_prefixes = store.get_ffdc_prefixes()
+        for ffdc_prefix in ffdc_prefixes:
+            try:
+                file_paths = store.materialize(ffdc_prefix,
+                                               ffdc_dir_path or None)
+            except ValueError as error:
+                print_error_report(str(error) + "\n")
+                return False
+            qprint_timen("Materialized " + str(len(file_paths)) +
+                         " files for FFDC prefix \"" + ffdc_prefix + "\".")
+
+    return True
+
+###############################################################################
+
+
+###############################################################################
+# Main
+
+if not main():
+    exit(1)
+
+###############################################################################
@@ -2,7 +2,6 @@
 
 import sys
 import __builtin__
-import subprocess
 import os
 import argparse
 
@@ -190,107 +189,6 @@ def validate_parms():
 ###############################################################################
 
 
-###############################################################################
-def run_pgm(plug_in_dir_path,
-            call_point,
-            allow_shell_rc):
-
-    r"""
-    Run the call point program in the given plug_in_dir_path.  Return the
-    following:
-    rc                              The return code - 0 = PASS, 1 = FAIL.
-    shell_rc                        The shell return code returned by
-                                    process_plug_in_packages.py.
-    failed_plug_in_name             The failed plug in name (if any).
-
-    Description of arguments:
-    plug_in_dir_path                The directory path where the call_point
-                                    program may be located.
-    call_point                      The call point (e.g. "setup").  This
-                                    program will look for a program named
-                                    "cp_" + call_point in the
-                                    plug_in_dir_path.  If no such call point
-                                    program is found, this function returns an
-                                    rc of 0 (i.e. success).
-    allow_shell_rc                  The user may supply a value other than
-                                    zero to indicate an acceptable non-zero
-                                    return code.  For example, if this value
-                                    equals 0x00000200, it means that for each
-                                    plug-in call point that runs, a 0x00000200
-                                    will not be counted as a failure.  See
-                                    note above regarding left-shifting of
-                                    return codes.
-    """
-
-    global autoscript
-
-    rc = 0
-    failed_plug_in_name = ""
-    shell_rc = 0x00000000
-
-    plug_in_name = os.path.basename(os.path.normpath(plug_in_dir_path))
-    cp_prefix = "cp_"
-    plug_in_pgm_path = plug_in_dir_path + cp_prefix + call_point
-    if not os.path.exists(plug_in_pgm_path):
-        # No such call point in this plug in dir path.  This is legal so we
-        # return 0, etc.
-        return rc, shell_rc, failed_plug_in_name
-
-    # Get some stats on the file.
-    cmd_buf = "stat -c '%n %s %z' " + plug_in_pgm_path
-    dpissuing(cmd_buf)
-    sub_proc = subprocess.Popen(cmd_buf, shell=True, stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT)
-    out_buf, err_buf = sub_proc.communicate()
-    shell_rc = sub_proc.returncode
-    if shell_rc != 0:
-        rc = 1
-        print_var(shell_rc, hex)
-        failed_plug_in_name = plug_in_name
-        print(out_buf)
-        print_var(failed_plug_in_name)
-        print_var(shell_rc, hex)
-        return rc, shell_rc, failed_plug_in_name
-
-    print("------------------------------------------------- Starting plug-" +
-          "in -----------------------------------------------")
-    print(out_buf)
-    if autoscript:
-        stdout = 1 - quiet
-        if AUTOBOOT_OPENBMC_NICKNAME != "":
-            autoscript_prefix = AUTOBOOT_OPENBMC_NICKNAME + "."
-        else:
-            autoscript_prefix = ""
-        autoscript_prefix += plug_in_name + ".cp_" + call_point
-        autoscript_subcmd = "autoscript --quiet=1 --show_url=y --prefix=" +\
-            autoscript_prefix + " --stdout=" + str(stdout) + " -- "
-    else:
-        autoscript_subcmd = ""
-
-    cmd_buf = "PATH=" + plug_in_dir_path + ":${PATH} ; " + autoscript_subcmd +\
-              cp_prefix + call_point
-    pissuing(cmd_buf)
-
-    sub_proc = subprocess.Popen(cmd_buf, shell=True)
-    sub_proc.communicate()
-    shell_rc = sub_proc.returncode
-    # Shift to left.
-    shell_rc *= 0x100
-    if shell_rc != 0 and shell_rc != allow_shell_rc:
-        rc = 1
-        failed_plug_in_name = plug_in_name
-
-    print("------------------------------------------------- Ending plug-in" +
-          " -------------------------------------------------")
-    if failed_plug_in_name != "":
-        print_var(failed_plug_in_name)
-    print_var(shell_rc, hex)
-
-    return rc, shell_rc, failed_plug_in_name
-
-###############################################################################
-
-
 ###############################################################################
 def main():
 
@@ -325,45 +223,12 @@ def main():
     qpvar(plug_in_packages_list)
     qprint("\n")
 
-    allow_shell_rc = int(allow_shell_rc, 0)
-    shell_rc = 0
-    failed_plug_in_name = ""
-
-    # If the autoscript program is present, we will use it to direct call point
-    # program output to a separate status file.  This keeps the output of the
-    # main program (i.e. OBMC Boot Test) cleaner and yet preserves call point
-    # output if it is needed for debug.
-    global autoscript
-    global AUTOBOOT_OPENBMC_NICKNAME
-    autoscript = 0
-    AUTOBOOT_OPENBMC_NICKNAME = ""
-    rc, out_buf = cmd_fnc("which autoscript", quiet=1, print_output=0,
-                          show_err=0)
-    if rc == 0:
-        autoscript = 1
-        AUTOBOOT_OPENBMC_NICKNAME = os.environ.get("AUTOBOOT_OPENBMC_NICKNAME",
-                                                   "")
-    ret_code = 0
-    for plug_in_dir_path in plug_in_packages_list:
-        rc, shell_rc, failed_plug_in_name = \
-            run_pgm(plug_in_dir_path, call_point, allow_shell_rc)
-        if rc != 0:
-            ret_code = 1
-            if stop_on_plug_in_failure:
-                break
-        if shell_rc != 0 and stop_on_non_zero_rc:
-            qprint_time("Stopping on non-zero shell return code as requested" +
-                        " by caller.\n")
-            break
-
-    if ret_code == 0:
-        return True
-    else:
-        if not stop_on_plug_in_failure:
-            # We print a summary error message to make the failure more
-            # obvious.
-            print_error("At least one plug-in failed.\n")
-        return False
+    rc, shell_rc, failed_plug_in_name, plug_in_results_list = \
+        process_plug_in_packages(plug_in_packages_list, call_point,
+                                 allow_shell_rc, stop_on_plug_in_failure,
+                                 stop_on_non_zero_rc, quiet=0, debug=debug)
+
+    return rc == 0
 
 ###############################################################################
 
@@ -21,6 +21,7 @@ import gen_robot_keyword as keyword
 import gen_print as gp
 import gen_valid as gv
 import variables as var
+import openbmc_rest
 from robot.libraries.BuiltIn import BuiltIn
 
 
@@ -36,11 +37,10 @@ def wait_for_activation_state_change(version_id, initial_state):
     initial_state  The activation state we want to wait for.
     """
 
-    keyword.run_key_u("Open Connection And Log In")
     retry = 0
     while (retry < 20):
-        status, software_state = keyword.run_key("Read Properties  " +
-                                        var.SOFTWARE_VERSION + str(version_id))
+        software_state = openbmc_rest.rest_read_properties(
+            var.SOFTWARE_VERSION + str(version_id))
         current_state = (software_state)["Activation"]
         if (initial_state == current_state):
             time.sleep(60)
@@ -20,9 +20,36 @@ sys.path.append(repo_data_path)
 import gen_robot_keyword as grk
 import gen_print as gp
 import variables as var
+import openbmc_rest
+import ssh_pool
 from robot.libraries.BuiltIn import BuiltIn
 
 
+###############################################################################
+def execute_pooled_bmc_command(cmd_buf,
+                               ignore=0,
+                               timeout=30):
+
+    r"""
+    Run the given command on the BMC's pooled SSH connection (see
+    ssh_pool.py) and return its stdout.  As with "Execute Command On BMC",
+    fail if the command writes to stderr (unless ignore is set).
+
+    Description of argument(s):
+    cmd_buf    The command to be run on the BMC.
+    ignore     Return the stdout even if the command writes to stderr.
+    timeout    The number of seconds to allow for the command.
+    """
+
+    stdout, stderr, rc = ssh_pool.execute_ssh_command(cmd_buf,
+                                                      timeout=timeout)
+    if stderr != "" and not ignore:
+        BuiltIn().fail(gp.sprint_error(stderr))
+    return stdout
+
+###############################################################################
+
+
 ###############################################################################
 def get_latest_file(dir_path):
 
@@ -35,9 +62,7 @@ def get_latest_file(dir_path):
                 calling function.
     """
 
-    grk.run_key_u("Open Connection And Log In")
-    status, ret_values =\
-            grk.run_key("Execute Command On BMC  cd " + dir_path
+    ret_values = execute_pooled_bmc_command("cd " + dir_path
             + "; stat -c '%Y %n' * | sort -k1,1nr | head -n 1", ignore=1)
     return ret_values.split(" ")[-1]
 
@@ -80,9 +105,7 @@ def get_image_version(file_path):
     file_path    The path to a file that holds the image version.
     """
 
-    grk.run_key_u("Open Connection And Log In")
-    status, ret_values =\
-            grk.run_key("Execute Command On BMC  cat "
+    ret_values = execute_pooled_bmc_command("cat "
             + file_path + " | grep \"version=\"", ignore=1)
     return (ret_values.split("\n")[0]).split("=")[-1]
 
@@ -99,9 +122,7 @@ def get_image_purpose(file_path):
     file_path    The path to a file that holds the image purpose.
     """
 
-    grk.run_key_u("Open Connection And Log In")
-    status, ret_values =\
-            grk.run_key("Execute Command On BMC  cat "
+    ret_values = execute_pooled_bmc_command("cat "
             + file_path + " | grep \"purpose=\"", ignore=1)
     return ret_values.split("=")[-1]
 
@@ -123,10 +144,7 @@ def get_image_path(image_version):
     """
 
     upload_dir = BuiltIn().get_variable_value("${upload_dir_path}")
-    grk.run_key_u("Open Connection And Log In")
-    status, image_list =\
-            grk.run_key("Execute Command On BMC  ls -d " + upload_dir
-            + "*/")
+    image_list = execute_pooled_bmc_command("ls -d " + upload_dir + "*/")
 
     image_list = image_list.split("\n")
     retry = 0
@@ -154,13 +172,11 @@ def verify_image_upload():
     image_version_id = image_path.split("/")[-2]
     BuiltIn().set_global_variable("${version_id}", image_version_id)
 
-    grk.run_key_u("Open Connection And Log In")
     image_purpose = get_image_purpose(image_path + "MANIFEST")
     if (image_purpose == var.VERSION_PURPOSE_BMC or
         image_purpose == var.VERSION_PURPOSE_HOST):
         uri = var.SOFTWARE_VERSION + image_version_id
-        status, ret_values =\
-        grk.run_key("Read Attribute  " + uri + "  Activation")
+        ret_values = openbmc_rest.rest_read_attribute(uri, "Activation")
 
         if ((ret_values == var.READY) or (ret_values == var.INVALID)
             or (ret_values == var.ACTIVE)):
@@ -187,15 +203,14 @@ def verify_image_not_in_bmc_uploads_dir(image_version):
     image_version  The version of the image to look for on the BMC.
     """
 
-    grk.run_key('Open Connection And Log In')
     upload_dir_path = BuiltIn().get_variable_value("${UPLOAD_DIR_PATH}")
     for i in range(6):
-        stat, grep_res = grk.run_key('Execute Command On BMC  '
-                + 'ls ' + upload_dir_path + '*/MANIFEST 2>/dev/null '
+        grep_res = execute_pooled_bmc_command(
+                'ls ' + upload_dir_path + '*/MANIFEST 2>/dev/null '
                 + '| xargs grep -rl "version=' + image_version + '"')
         image_dir = os.path.dirname(grep_res.split('\n')[0])
         if '' != image_dir:
-            grk.run_key('Execute Command On BMC  rm -rf ' + image_dir)
+            execute_pooled_bmc_command('rm -rf ' + image_dir)
             BuiltIn().fail('Found invalid BMC Image: ' + image_dir)
         time.sleep(30)
 
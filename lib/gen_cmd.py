@@ -5,11 +5,20 @@ This module provides command execution functions such as cmd_fnc and cmd_fnc_u.
 """
 
 import sys
+import os
+import errno
+import time
+import signal
+import select
 import subprocess
+import collections
+import threading
+import Queue
 
 robot_env = 1
 try:
     from robot.libraries.BuiltIn import BuiltIn
+    from robot.utils import DotDict
 except ImportError:
     robot_env = 0
 import gen_print as gp
@@ -20,39 +29,83 @@ if robot_env:
 
 
 ###############################################################################
-def cmd_fnc(cmd_buf,
+def run_cmd(cmd_buf,
             quiet=None,
             test_mode=None,
             debug=0,
             print_output=1,
-            show_err=1):
+            show_err=1,
+            timeout=0,
+            max_out_bytes=0,
+            out_file_path=None):
 
     r"""
-    Run the given command in a shell and return the shell return code.
+    Run the given command in a shell and return a dictionary describing the
+    results.
+
+    Output is read in chunks as it is produced, so memory use is bounded by
+    max_out_bytes no matter how much output the command generates.
+
+    The dictionary returned contains the following keys:
+    rc                              The shell return code.  If the command was
+                                    killed by a signal, this will be the
+                                    negative of the signal number.
+    out_buf                         The stdout/stderr generated by the command
+                                    (or its last max_out_bytes bytes).
+    duration                        The number of seconds the command ran.
+    num_bytes                       The total number of bytes of output
+                                    generated by the command.
+    truncated                       Indicates that out_buf does not contain
+                                    all of the output.
+    timed_out                       Indicates that the command was killed
+                                    because it ran for longer than timeout
+                                    seconds.
+    user_time                       The user CPU seconds used by the command.
+    system_time                     The system CPU seconds used by the
+                                    command.
+    max_rss                         The command's maximum resident set size
+                                    in kilobytes.
+
+    The resource usage values are those of the command and any children it
+    waited for.  They are not available (i.e. 0) for a command which timed
+    out.
 
     Description of arguments:
     cmd_buf                         The command string to be run in a shell.
     quiet                           Indicates whether this function should run
-                                    the pissuing()
-                  function prints an "Issuing: <cmd string>" to stdout.
+                                    the pissuing() function which prints an
+                                    "Issuing: <cmd string>" to stdout.
     test_mode                       If test_mode is set, this function will
-                                    not actually run
-                  the command.
+                                    not actually run the command.
     debug                           If debug is set, this function will print
                                     extra debug info.
     print_output                    If this is set, this function will print
-                                    the stdout/stderr
-                  generated by the shell command.
+                                    the stdout/stderr generated by the shell
+                                    command.
     show_err                        If show_err is set, this function will
-                                    print a standardized
-                  error report if the shell command returns non-zero.
+                                    print a standardized error report if the
+                                    shell command returns non-zero.
+    timeout                         The maximum number of seconds that the
+                                    command may run.  When this time is
+                                    exceeded, the command's entire process
+                                    group is killed.  A value of 0 means no
+                                    timeout.
+    max_out_bytes                   The maximum number of bytes of output to
+                                    be kept in out_buf.  When exceeded, the
+                                    oldest output is discarded.  A value of 0
+                                    means no limit.
+    out_file_path                   The path of a file to which all of the
+                                    command's output is to be written.
     """
 
     quiet = int(gm.global_default(quiet, 0))
     test_mode = int(gm.global_default(test_mode, 0))
+    timeout = float(timeout)
+    max_out_bytes = int(max_out_bytes)
 
     if debug:
-        gp.print_vars(cmd_buf, quiet, test_mode, debug)
+        gp.print_vars(cmd_buf, quiet, test_mode, debug, timeout,
+                      max_out_bytes, out_file_path)
 
     err_msg = gv.svalid_value(cmd_buf)
     if err_msg != "":
@@ -62,35 +115,296 @@ def cmd_fnc(cmd_buf,
         gp.pissuing(cmd_buf, test_mode)
 
     if test_mode:
-        return 0, ""
+        return new_cmd_results()
+
+    out_func = None
+    if print_output:
+        # The output is read in chunks so a password may be split across two
+        # of them.  The redactor holds back any text which might begin one.
+        redactor = gp.stream_redactor()
+
+        def out_func(chunk):
+            print_cmd_output(redactor.redact(chunk))
+
+    results = exec_cmd(cmd_buf, timeout, max_out_bytes, out_file_path,
+                       out_func)
+
+    if print_output:
+        print_cmd_output(redactor.flush())
+
+    if show_err:
+        print_cmd_error(results, timeout)
+
+    return results
+
+###############################################################################
+
+
+###############################################################################
+def new_cmd_results():
+
+    r"""
+    Return a command results dictionary with default values.  See run_cmd for
+    a description of its keys.
+    """
+
+    return collections.OrderedDict([('rc', 0), ('out_buf', ""),
+                                    ('duration', 0.0), ('num_bytes', 0),
+                                    ('truncated', False),
+                                    ('timed_out', False),
+                                    ('user_time', 0.0), ('system_time', 0.0),
+                                    ('max_rss', 0)])
+
+###############################################################################
+
+
+###############################################################################
+def exec_cmd(cmd_buf,
+             timeout=0,
+             max_out_bytes=0,
+             out_file_path=None,
+             out_func=None):
+
+    r"""
+    Run the given command in a shell and return a command results dictionary
+    (see run_cmd).  Unlike run_cmd, this function does no printing of its own
+    and consults no global defaults so it may safely be called from multiple
+    threads.
 
+    Description of arguments:
+    cmd_buf                         The command string to be run in a shell.
+    timeout                         See run_cmd.
+    max_out_bytes                   See run_cmd.
+    out_file_path                   See run_cmd.
+    out_func                        A function to be called with each chunk of
+                                    output as it is read.
+    """
+
+    results = new_cmd_results()
+
+    if timeout:
+        # Put the command in its own process group so that it and all of its
+        # children can be killed should it time out.
+        preexec_fn = os.setpgrp
+    else:
+        preexec_fn = None
+
+    start_seconds = gp.monotonic_time()
+    # close_fds prevents a command started concurrently by another thread from
+    # inheriting (and thus holding open) the write end of our pipe.
     sub_proc = subprocess.Popen(cmd_buf,
-                                bufsize=1,
                                 shell=True,
                                 stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT)
-    out_buf = ""
-    for line in sub_proc.stdout:
-        out_buf += line
-        if not print_output:
+                                stderr=subprocess.STDOUT,
+                                preexec_fn=preexec_fn,
+                                close_fds=True)
+    out_file_obj = None
+    if out_file_path is not None:
+        out_file_obj = open(out_file_path, 'w')
+
+    # The output is kept as a list of chunks which are joined once at the end
+    # rather than appending to a string as output arrives.
+    chunks = collections.deque()
+    num_kept_bytes = 0
+    fd = sub_proc.stdout.fileno()
+    while True:
+        if timeout:
+            time_left = start_seconds + timeout - gp.monotonic_time()
+            if time_left <= 0:
+                results['timed_out'] = True
+                kill_process_group(sub_proc)
+                break
+            ready, _, _ = select.select([fd], [], [], time_left)
+            if not ready:
+                continue
+        chunk = os.read(fd, 65536)
+        if chunk == "":
+            break
+        results['num_bytes'] += len(chunk)
+        if out_file_obj is not None:
+            out_file_obj.write(chunk)
+        chunks.append(chunk)
+        num_kept_bytes += len(chunk)
+        while max_out_bytes and num_kept_bytes > max_out_bytes:
+            excess_bytes = num_kept_bytes - max_out_bytes
+            if len(chunks[0]) <= excess_bytes:
+                num_kept_bytes -= len(chunks.popleft())
+            else:
+                chunks[0] = chunks[0][excess_bytes:]
+                num_kept_bytes -= excess_bytes
+            results['truncated'] = True
+        if out_func is not None:
+            out_func(chunk)
+    if out_file_obj is not None:
+        out_file_obj.close()
+    sub_proc.stdout.close()
+    # Use wait4 rather than sub_proc.wait so that we learn the resources used
+    # by the command (including any children it waited for).  A command may
+    # close its output long before it ends so, when there is a timeout, it is
+    # polled until the time left runs out and is then killed.
+    pid = 0
+    while sub_proc.returncode is None and pid == 0:
+        if timeout and not results['timed_out']:
+            time_left = start_seconds + timeout - gp.monotonic_time()
+            if time_left <= 0:
+                results['timed_out'] = True
+                kill_process_group(sub_proc)
+                continue
+            wait_options = os.WNOHANG
+        else:
+            wait_options = 0
+        try:
+            pid, status, rusage = os.wait4(sub_proc.pid, wait_options)
+        except OSError as os_error:
+            if os_error.errno != errno.EINTR:
+                raise
             continue
-        if robot_env:
-            grp.rprint(line)
+        if pid == 0:
+            time.sleep(min(time_left, 0.1))
+    if pid != 0:
+        if os.WIFSIGNALED(status):
+            sub_proc.returncode = -os.WTERMSIG(status)
         else:
-            sys.stdout.write(line)
-    if print_output and not robot_env:
+            sub_proc.returncode = os.WEXITSTATUS(status)
+        results['user_time'] = rusage.ru_utime
+        results['system_time'] = rusage.ru_stime
+        results['max_rss'] = rusage.ru_maxrss
+    results['rc'] = sub_proc.returncode
+    results['out_buf'] = "".join(chunks)
+    results['duration'] = gp.monotonic_time() - start_seconds
+
+    return results
+
+###############################################################################
+
+
+###############################################################################
+def print_cmd_error(results,
+                    timeout=0):
+
+    r"""
+    Print a standardized error report if the command results indicate a
+    failure.
+
+    Description of arguments:
+    results                         A command results dictionary (see
+                                    run_cmd).
+    timeout                         The timeout that was given for the
+                                    command.
+    """
+
+    shell_rc = results['rc']
+    if shell_rc == 0:
+        return
+
+    if results['timed_out']:
+        error_message = "The prior command timed out.\n" +\
+            gp.sprint_var(timeout, 1)
+    else:
+        error_message = "The prior command failed.\n"
+    # A negative shell_rc is a signal number which reads better in decimal.
+    error_message += gp.sprint_var(shell_rc, int(shell_rc > 0))
+    if robot_env:
+        grp.rprint_error_report(error_message)
+    else:
+        gp.print_error_report(error_message)
+
+###############################################################################
+
+
+###############################################################################
+def print_cmd_output(buffer):
+
+    r"""
+    Print command output (i.e. text with no added linefeed) with all
+    registered passwords replaced.
+
+    Description of arguments:
+    buffer                          The command output to be printed.
+    """
+
+    if robot_env:
+        grp.rprint(buffer)
+    else:
+        sys.stdout.write(gp.replace_passwords(buffer))
         sys.stdout.flush()
-    sub_proc.communicate()
-    shell_rc = sub_proc.returncode
-    if shell_rc != 0 and show_err:
-        if robot_env:
-            grp.rprint_error_report("The prior command failed.\n" +
-                                    gp.sprint_var(shell_rc, 1))
-        else:
-            gp.print_error_report("The prior command failed.\n" +
-                                  gp.sprint_var(shell_rc, 1))
 
-    return shell_rc, out_buf
+###############################################################################
+
+
+###############################################################################
+def kill_process_group(sub_proc,
+                       grace_period=2):
+
+    r"""
+    Kill the process group led by the given subprocess.  SIGTERM is sent
+    first and, if the subprocess has not ended within grace_period seconds,
+    SIGKILL is sent.
+
+    Description of arguments:
+    sub_proc                        A subprocess.Popen object whose process
+                                    was made a process group leader (e.g. via
+                                    preexec_fn=os.setpgrp).
+    grace_period                    The number of seconds to wait after
+                                    sending SIGTERM.
+    """
+
+    for signal_number in [signal.SIGTERM, signal.SIGKILL]:
+        try:
+            os.killpg(sub_proc.pid, signal_number)
+        except OSError:
+            # The process group no longer exists.
+            return
+        end_seconds = gp.monotonic_time() + grace_period
+        while gp.monotonic_time() < end_seconds:
+            if sub_proc.poll() is not None:
+                return
+            time.sleep(0.1)
+
+###############################################################################
+
+
+###############################################################################
+def cmd_fnc(cmd_buf,
+            quiet=None,
+            test_mode=None,
+            debug=0,
+            print_output=1,
+            show_err=1,
+            timeout=0):
+
+    r"""
+    Run the given command in a shell and return the shell return code and the
+    output.  See run_cmd (above) for details.
+
+    Description of arguments:
+    cmd_buf                         The command string to be run in a shell.
+    quiet                           Indicates whether this function should run
+                                    the pissuing() function which prints an
+                                    "Issuing: <cmd string>" to stdout.
+    test_mode                       If test_mode is set, this function will
+                                    not actually run the command.
+    debug                           If debug is set, this function will print
+                                    extra debug info.
+    print_output                    If this is set, this function will print
+                                    the stdout/stderr generated by the shell
+                                    command.
+    show_err                        If show_err is set, this function will
+                                    print a standardized error report if the
+                                    shell command returns non-zero.
+    timeout                         The maximum number of seconds that the
+                                    command may run.  A value of 0 means no
+                                    timeout.
+    """
+
+    quiet = int(gm.global_default(quiet, 0))
+    test_mode = int(gm.global_default(test_mode, 0))
+
+    results = run_cmd(cmd_buf, quiet=quiet, test_mode=test_mode, debug=debug,
+                      print_output=print_output, show_err=show_err,
+                      timeout=timeout)
+
+    return results['rc'], results['out_buf']
 
 ###############################################################################
 
@@ -112,3 +426,135 @@ def cmd_fnc_u(cmd_buf,
                    print_output=print_output, show_err=show_err)
 
 ###############################################################################
+
+
+###############################################################################
+def run_cmds(cmd_bufs,
+             max_workers=4,
+             quiet=None,
+             test_mode=None,
+             print_output=1,
+             show_err=1,
+             timeout=0,
+             max_out_bytes=0):
+
+    r"""
+    Run the given commands concurrently and return a list of command results
+    dictionaries (see run_cmd) in the same order as cmd_bufs.
+
+    At most max_workers commands run at any one time.  The "Issuing" line,
+    output and any error report for each command are printed together and in
+    the order given in cmd_bufs so that the output of one command is never
+    interleaved with that of another.
+
+    Example code:
+
+    results = run_cmds(["uname -a", "df -h", "free"], max_workers=2)
+    for result in results:
+        print(result['rc'])
+
+    Description of arguments:
+    cmd_bufs                        A list of command strings to be run in a
+                                    shell.
+    max_workers                     The maximum number of commands to be run
+                                    at once.
+    quiet                           See run_cmd.
+    test_mode                       See run_cmd.
+    print_output                    See run_cmd.
+    show_err                        See run_cmd.
+    timeout                         The maximum number of seconds that any one
+                                    command may run (see run_cmd).
+    max_out_bytes                   See run_cmd.
+    """
+
+    quiet = int(gm.global_default(quiet, 0))
+    test_mode = int(gm.global_default(test_mode, 0))
+    max_workers = max(int(max_workers), 1)
+    timeout = float(timeout)
+    max_out_bytes = int(max_out_bytes)
+
+    for cmd_buf in cmd_bufs:
+        err_msg = gv.svalid_value(cmd_buf)
+        if err_msg != "":
+            raise ValueError(err_msg)
+
+    cmd_results = [None] * len(cmd_bufs)
+    done_events = [threading.Event() for cmd_buf in cmd_bufs]
+    work_queue = Queue.Queue()
+
+    def worker():
+        while True:
+            try:
+                ix = work_queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                cmd_results[ix] = exec_cmd(cmd_bufs[ix], timeout,
+                                           max_out_bytes)
+            except Exception as exception:
+                # Report the failure to launch the command like a shell would
+                # rather than losing it in this thread.
+                cmd_results[ix] = new_cmd_results()
+                cmd_results[ix]['rc'] = 127
+                cmd_results[ix]['out_buf'] = str(exception) + "\n"
+            done_events[ix].set()
+
+    if not test_mode:
+        for ix in range(len(cmd_bufs)):
+            work_queue.put(ix)
+        for thread_ix in range(min(max_workers, len(cmd_bufs))):
+            thread = threading.Thread(target=worker)
+            thread.daemon = True
+            thread.start()
+
+    # All printing is done by this thread, in order, as each command
+    # completes.
+    for ix in range(len(cmd_bufs)):
+        if not quiet:
+            gp.pissuing(cmd_bufs[ix], test_mode)
+        if test_mode:
+            cmd_results[ix] = new_cmd_results()
+            continue
+        # A timeout on wait keeps this thread responsive to KeyboardInterrupt.
+        while not done_events[ix].wait(1):
+            pass
+        if print_output:
+            print_cmd_output(cmd_results[ix]['out_buf'])
+        if show_err:
+            print_cmd_error(cmd_results[ix], timeout)
+
+    return cmd_results
+
+###############################################################################
+
+
+###############################################################################
+def rrun_cmds(*cmd_bufs,
+              **kwargs):
+
+    r"""
+    Run the given commands concurrently and return a list of command results
+    (see run_cmds).  This is the robot keyword version of run_cmds.  Each
+    result is a DotDict so that its fields may be accessed with robot's
+    extended variable syntax.
+
+    Robot example:
+
+    ${results}=  Rrun Cmds  uname -a  df -h  free  max_workers=${2}
+    Should Be Equal As Integers  ${results[0].rc}  0
+
+    Description of arguments:
+    cmd_bufs                        The command strings to be run in a shell.
+    kwargs                          Any of the other arguments accepted by
+                                    run_cmds (e.g. max_workers, timeout).
+    """
+
+    # Robot passes arguments as strings, and a string such as "0" is true.
+    for arg_name in ['print_output', 'show_err']:
+        if arg_name in kwargs:
+            kwargs[arg_name] = int(kwargs[arg_name])
+    cmd_results = run_cmds(list(cmd_bufs), **kwargs)
+
+    return [DotDict(cmd_result) for cmd_result in cmd_results]
+
+###############################################################################
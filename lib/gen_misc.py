@@ -346,3 +346,22 @@ def get_host_name_ip(host):
     return host_host_name, host_ip
 
 ###############################################################################
+
+
+###############################################################################
+def strip_trailing_newline(buffer):
+
+    r"""
+    Return the given buffer with one trailing newline (if any) removed as
+    SSHLibrary's "Execute Command" does.
+
+    Description of arguments:
+    buffer                          The buffer to be stripped.
+    """
+
+    if buffer.endswith("\n"):
+        return buffer[:-1]
+
+    return buffer
+
+###############################################################################
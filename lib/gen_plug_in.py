@@ -6,11 +6,21 @@ This module provides functions which are useful for running plug-ins.
 
 import sys
 import os
+import stat
+import time
 import commands
-import glob
+import collections
+import tempfile
+import shutil
+import threading
+import Queue
+import pickle
 
 import gen_print as gp
 import gen_misc as gm
+import gen_cmd as gc
+import gen_plug_in_host as gpih
+import tally_sheet
 
 # Some help text that is common to more than one program.
 plug_in_dir_paths_help_text = \
@@ -29,6 +39,10 @@ mch_class_help_text = \
 
 PATH_LIST = gm.return_path_list()
 
+# The maximum number of bytes of call point program output to be kept in
+# memory (see run_call_point).
+plug_in_max_out_bytes = 65536
+
 
 ###############################################################################
 def get_plug_in_base_paths():
@@ -57,6 +71,313 @@ def get_plug_in_base_paths():
 # its value.
 plug_in_base_path_list = get_plug_in_base_paths()
 
+# The plug-in discovery index is cached on disk so that the programs which
+# are run many times per boot (e.g. process_plug_in_packages.py) need not
+# rediscover the plug-ins each time.  See get_plug_in_index.  Since loading
+# a pickle file can run arbitrary code, the file is kept in a directory which
+# only the current user may write (see path_is_private).
+plug_in_index_file_path = \
+    os.environ.get('PLUG_IN_INDEX_FILE_PATH',
+                   tempfile.gettempdir() + os.sep + "plug_in_index." +
+                   str(os.getuid()) + os.sep + "plug_in_index.pickle")
+plug_in_index = None
+# This is incremented whenever the format of the index changes so that index
+# files written by older versions of this module are rebuilt.
+plug_in_index_version = 2
+
+
+###############################################################################
+def build_plug_in_index(plug_in_base_path_list):
+
+    r"""
+    Examine every plug-in package found in the given plug-in base paths and
+    return a plug-in index (see get_plug_in_index).
+
+    Description of arguments:
+    plug_in_base_path_list          A list of plug-in base paths (see
+                                    get_plug_in_base_paths).
+    """
+
+    plug_ins = collections.OrderedDict()
+    for plug_in_base_path in plug_in_base_path_list:
+        for plug_in_name in sorted(os.listdir(plug_in_base_path)):
+            plug_in_dir_path = os.path.normpath(plug_in_base_path +
+                                                plug_in_name) + os.sep
+            if plug_in_dir_path in plug_ins or\
+               not os.path.isdir(plug_in_dir_path):
+                continue
+            file_names = os.listdir(plug_in_dir_path)
+            if gpih.call_points_module_name in file_names:
+                module_file_path = plug_in_dir_path +\
+                    gpih.call_points_module_name
+                module_mtime = os.stat(module_file_path).st_mtime
+                call_point_callables = \
+                    gpih.get_call_point_callables(module_file_path)
+            else:
+                module_mtime = None
+                call_point_callables = []
+            plug_ins[plug_in_dir_path] = {
+                'plug_in_name': plug_in_name,
+                'mtime': os.stat(plug_in_dir_path).st_mtime,
+                'mch_classes': sorted([x[len("supports_"):]
+                                       for x in file_names
+                                       if x.startswith("supports_")]),
+                'integrated': "integrated" in file_names,
+                'call_points': sorted([x[len("cp_"):] for x in file_names
+                                       if x.startswith("cp_")]),
+                'module_mtime': module_mtime,
+                'call_point_callables': call_point_callables}
+
+    return {'version': plug_in_index_version,
+            'base_paths': [(plug_in_base_path,
+                            os.stat(plug_in_base_path).st_mtime)
+                           for plug_in_base_path in plug_in_base_path_list],
+            'plug_ins': plug_ins}
+
+###############################################################################
+
+
+###############################################################################
+def plug_in_index_is_current(index,
+                             plug_in_base_path_list):
+
+    r"""
+    Return True if the given plug-in index still describes the plug-in
+    packages found in plug_in_base_path_list.  Adding or removing a plug-in
+    package changes the modification time of its base directory and adding or
+    removing a file in a plug-in package (e.g. a cp_ program) changes the
+    modification time of the package directory so these are what is checked
+    (along with the modification time of any call points module).
+
+    Description of arguments:
+    index                           A plug-in index (see get_plug_in_index).
+    plug_in_base_path_list          A list of plug-in base paths (see
+                                    get_plug_in_base_paths).
+    """
+
+    try:
+        if index['version'] != plug_in_index_version:
+            return False
+        if [x[0] for x in index['base_paths']] != plug_in_base_path_list:
+            return False
+        for plug_in_base_path, mtime in index['base_paths']:
+            if os.stat(plug_in_base_path).st_mtime != mtime:
+                return False
+        for plug_in_dir_path, plug_in_info in index['plug_ins'].items():
+            if os.stat(plug_in_dir_path).st_mtime != plug_in_info['mtime']:
+                return False
+            if plug_in_info['module_mtime'] is not None and\
+               os.stat(plug_in_dir_path + gpih.call_points_module_name
+                       ).st_mtime != plug_in_info['module_mtime']:
+                return False
+    except (OSError, KeyError, TypeError):
+        return False
+
+    return True
+
+###############################################################################
+
+
+###############################################################################
+def path_is_private(path):
+
+    r"""
+    Return True if the given path is owned by the current user and may not be
+    written by any other user (i.e. it is neither group nor world writable
+    and it is not a symbolic link).
+
+    Description of arguments:
+    path                            The path of a file or directory.
+    """
+
+    try:
+        stat_info = os.lstat(path)
+    except OSError:
+        return False
+
+    return stat_info.st_uid == os.getuid() and\
+        not stat.S_ISLNK(stat_info.st_mode) and\
+        not stat_info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+###############################################################################
+
+
+###############################################################################
+def get_plug_in_index(check=0):
+
+    r"""
+    Return an index describing every plug-in package found in the global
+    plug_in_base_path_list.
+
+    The index is kept in memory and in the file named by
+    plug_in_index_file_path (which may be set via the PLUG_IN_INDEX_FILE_PATH
+    environment variable).  It is rebuilt only when the plug-in base
+    directories or plug-in package directories change.  The index file is
+    neither read nor written unless both it and its directory are private to
+    the current user (see path_is_private).
+
+    Checking whether the index is current means examining every plug-in
+    directory.  So that looking up a plug-in's call points costs nothing, the
+    in-memory index is checked when it is first loaded and thereafter only
+    when check is set (as process_plug_in_packages does once per call).
+
+    The index is a dictionary with the following keys:
+    version                         The plug_in_index_version of the module
+                                    which built the index.
+    base_paths                      A list of (plug-in base path, modification
+                                    time) tuples.
+    plug_ins                        A dictionary whose keys are normalized
+                                    plug-in directory paths and whose values
+                                    are dictionaries with these keys:
+                                    plug_in_name, mtime, mch_classes (the
+                                    machine classes named by its supports_
+                                    files), integrated, call_points (the
+                                    call points named by its cp_ programs),
+                                    module_mtime (the modification time of
+                                    its call points module or None) and
+                                    call_point_callables (the call points
+                                    named by the cp_ functions of its call
+                                    points module).
+
+    Description of arguments:
+    check                           Check that the in-memory index is still
+                                    current.
+    """
+
+    global plug_in_index
+
+    if plug_in_index is not None:
+        if not int(check) or\
+           plug_in_index_is_current(plug_in_index, plug_in_base_path_list):
+            return plug_in_index
+
+    index_dir_path = os.path.dirname(plug_in_index_file_path)
+    plug_in_index = None
+    if path_is_private(index_dir_path) and\
+       path_is_private(plug_in_index_file_path):
+        try:
+            with open(plug_in_index_file_path, 'rb') as file_obj:
+                plug_in_index = pickle.load(file_obj)
+        except Exception:
+            # A corrupt index file simply means that the index must be
+            # rebuilt.
+            plug_in_index = None
+    if plug_in_index is not None and\
+       plug_in_index_is_current(plug_in_index, plug_in_base_path_list):
+        return plug_in_index
+
+    plug_in_index = build_plug_in_index(plug_in_base_path_list)
+    try:
+        if not os.path.isdir(index_dir_path):
+            os.mkdir(index_dir_path, 0o700)
+        if not path_is_private(index_dir_path):
+            return plug_in_index
+        # Write to a temporary file and rename it so that concurrent readers
+        # never see a partially written index.
+        file_descriptor, temp_file_path = \
+            tempfile.mkstemp(dir=index_dir_path)
+        with os.fdopen(file_descriptor, 'wb') as file_obj:
+            pickle.dump(plug_in_index, file_obj, pickle.HIGHEST_PROTOCOL)
+        os.rename(temp_file_path, plug_in_index_file_path)
+    except (IOError, OSError):
+        # The index file is merely an optimization.
+        gp.dprint_executing()
+
+    return plug_in_index
+
+###############################################################################
+
+
+###############################################################################
+def get_plug_in_info(plug_in_dir_path):
+
+    r"""
+    Return the plug-in index entry (see get_plug_in_index) for the given
+    plug-in directory path or None if the plug-in is not in the index (e.g.
+    it was specified by an absolute path outside of any plug-in base path).
+
+    Description of arguments:
+    plug_in_dir_path                A plug-in directory path.
+    """
+
+    return get_plug_in_index()['plug_ins'].get(
+        os.path.normpath(plug_in_dir_path) + os.sep)
+
+###############################################################################
+
+
+###############################################################################
+def plug_in_has_call_point(plug_in_dir_path,
+                           call_point):
+
+    r"""
+    Return True if the given plug-in has a program or a callable (see
+    gen_plug_in_host) for the given call point.
+
+    Description of arguments:
+    plug_in_dir_path                A plug-in directory path.
+    call_point                      The call point (e.g. "setup").
+    """
+
+    plug_in_info = get_plug_in_info(plug_in_dir_path)
+    if plug_in_info is None:
+        return os.path.exists(plug_in_dir_path + "cp_" + call_point) or\
+            call_point_is_callable(plug_in_dir_path, call_point)
+
+    return call_point in plug_in_info['call_points'] or\
+        call_point in plug_in_info['call_point_callables']
+
+###############################################################################
+
+
+###############################################################################
+def call_point_is_callable(plug_in_dir_path,
+                           call_point):
+
+    r"""
+    Return True if the given plug-in's call point is to be run as a Python
+    callable (see gen_plug_in_host).  This is the case when the plug-in's call
+    points module defines a callable for the call point and there is no
+    cp_<call point> program (which would take precedence).
+
+    Description of arguments:
+    plug_in_dir_path                A plug-in directory path.
+    call_point                      The call point (e.g. "setup").
+    """
+
+    plug_in_info = get_plug_in_info(plug_in_dir_path)
+    if plug_in_info is None:
+        if os.path.exists(plug_in_dir_path + "cp_" + call_point):
+            return False
+        return call_point in gpih.get_call_point_callables(
+            plug_in_dir_path + gpih.call_points_module_name)
+
+    return call_point not in plug_in_info['call_points'] and\
+        call_point in plug_in_info['call_point_callables']
+
+###############################################################################
+
+
+###############################################################################
+def get_call_point_file_path(plug_in_dir_path,
+                             call_point):
+
+    r"""
+    Return the path of the file which implements the given plug-in's call
+    point (i.e. its cp_ program or its call points module).
+
+    Description of arguments:
+    plug_in_dir_path                A plug-in directory path.
+    call_point                      The call point (e.g. "setup").
+    """
+
+    if call_point_is_callable(plug_in_dir_path, call_point):
+        return plug_in_dir_path + gpih.call_points_module_name
+
+    return plug_in_dir_path + "cp_" + call_point
+
+###############################################################################
+
 
 ###############################################################################
 def find_plug_in_package(plug_in_name):
@@ -71,11 +392,12 @@ def find_plug_in_package(plug_in_name):
     """
 
     global plug_in_base_path_list
+    plug_ins = get_plug_in_index()['plug_ins']
     for plug_in_base_dir_path in plug_in_base_path_list:
         candidate_plug_in_dir_path = os.path.normpath(plug_in_base_dir_path +
                                                       plug_in_name) + \
             os.sep
-        if os.path.isdir(candidate_plug_in_dir_path):
+        if candidate_plug_in_dir_path in plug_ins:
             return candidate_plug_in_dir_path
 
     return ""
@@ -122,7 +444,12 @@ def validate_plug_in_package(plug_in_dir_path,
             exit(1)
     # Make sure that this plug-in supports us...
     supports_file_path = candidate_plug_in_dir_path + "supports_" + mch_class
-    if not os.path.exists(supports_file_path):
+    plug_in_info = get_plug_in_info(candidate_plug_in_dir_path)
+    if plug_in_info is None:
+        supported = os.path.exists(supports_file_path)
+    else:
+        supported = mch_class in plug_in_info['mch_classes']
+    if not supported:
         gp.print_error_report("The following file path could not be" +
                               " found:\n" +
                               gp.sprint_varx("supports_file_path",
@@ -163,20 +490,14 @@ def return_integrated_plug_ins(mch_class="obmc"):
     if DEBUG_SKIP_INTEGRATED:
         return integrated_plug_ins_list
 
-    for plug_in_base_path in plug_in_base_path_list:
-        # Get a list of all plug-in paths that support our mch_class.
-        mch_class_candidate_list = glob.glob(plug_in_base_path +
-                                             "*/supports_" + mch_class)
-        for candidate_path in mch_class_candidate_list:
-            integrated_plug_in_dir_path = os.path.dirname(candidate_path) +\
-                os.sep
-            integrated_file_path = integrated_plug_in_dir_path + "integrated"
-            if os.path.exists(integrated_file_path):
-                plug_in_name = \
-                    os.path.basename(os.path.dirname(candidate_path))
-                if plug_in_name not in integrated_plug_ins_list:
-                    # If this plug-in has not already been added to the list...
-                    integrated_plug_ins_list.append(plug_in_name)
+    for plug_in_info in get_plug_in_index()['plug_ins'].values():
+        if mch_class not in plug_in_info['mch_classes'] or\
+           not plug_in_info['integrated']:
+            continue
+        plug_in_name = plug_in_info['plug_in_name']
+        if plug_in_name not in integrated_plug_ins_list:
+            # If this plug-in has not already been added to the list...
+            integrated_plug_ins_list.append(plug_in_name)
 
     return integrated_plug_ins_list
 
@@ -213,10 +534,795 @@ def return_plug_in_packages_list(plug_in_dir_paths,
 
     plug_in_packages_list = plug_in_packages_list + integrated_plug_ins_list
 
+    # Duplicates are removed in a way which preserves the order of the list
+    # so that plug-ins are always run in a predictable order.
     plug_in_packages_list = \
-        list(set([validate_plug_in_package(path, mch_class)
-                  for path in plug_in_packages_list]))
+        list(collections.OrderedDict.fromkeys(
+            [validate_plug_in_package(path, mch_class)
+             for path in plug_in_packages_list]))
 
     return plug_in_packages_list
 
 ###############################################################################
+
+
+###############################################################################
+def sprint_call_point_stats(plug_in_pgm_path):
+
+    r"""
+    Return a line describing the given call point program in the same format
+    as "stat -c '%n %s %z'" (i.e. path, size and change time).
+
+    Description of arguments:
+    plug_in_pgm_path                The path to a call point program.
+    """
+
+    stat_info = os.stat(plug_in_pgm_path)
+    change_time = stat_info.st_ctime
+    if time.localtime(change_time).tm_isdst:
+        utc_offset = -time.altzone
+    else:
+        utc_offset = -time.timezone
+    utc_offset_string = "%s%02d%02d" % ("-" if utc_offset < 0 else "+",
+                                        abs(utc_offset) // 3600,
+                                        abs(utc_offset) % 3600 // 60)
+
+    return plug_in_pgm_path + " " + str(stat_info.st_size) + " " +\
+        time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(change_time)) +\
+        ".%09d" % int((change_time % 1) * 1000000000) + " " +\
+        utc_offset_string
+
+###############################################################################
+
+
+###############################################################################
+def get_autoscript_subcmd(plug_in_name,
+                          call_point,
+                          debug=0):
+
+    r"""
+    If the autoscript program is present, return the autoscript sub-command
+    to be used to run the given plug-in's call point program.  Otherwise,
+    return an empty string.
+
+    autoscript directs call point program output to a separate status file.
+    This keeps the output of the main program (i.e. OBMC Boot Test) cleaner
+    and yet preserves call point output if it is needed for debug.
+
+    Description of arguments:
+    plug_in_name                    The name of the plug-in (e.g.
+                                    "OBMC_Sample").
+    call_point                      The call point (e.g. "setup").
+    debug                           If this is set, autoscript will also
+                                    write the output to stdout.
+    """
+
+    for path in gm.return_path_list():
+        if os.access(path + "autoscript", os.X_OK):
+            break
+    else:
+        return ""
+
+    AUTOBOOT_OPENBMC_NICKNAME = os.environ.get("AUTOBOOT_OPENBMC_NICKNAME", "")
+    if AUTOBOOT_OPENBMC_NICKNAME != "":
+        autoscript_prefix = AUTOBOOT_OPENBMC_NICKNAME + "."
+    else:
+        autoscript_prefix = ""
+    autoscript_prefix += plug_in_name + ".cp_" + call_point
+
+    return "autoscript --quiet=1 --show_url=y --prefix=" +\
+        autoscript_prefix + " --stdout=" + str(int(debug)) + " -- "
+
+###############################################################################
+
+
+###############################################################################
+def get_plug_in_properties(plug_in_dir_path):
+
+    r"""
+    Return a dictionary of the properties which the plug-in declares in its
+    optional "plug_in_properties" file.  Default values are supplied for any
+    properties not declared.
+
+    The plug_in_properties file is a properties file (see
+    gen_misc.my_parm_file) which lives in the plug-in package directory
+    alongside its supports_<class> file.  Example:
+
+    # This plug-in's call point programs may run alongside those of other
+    # plug-ins.
+    parallel_safe=1
+    # Run our call point programs after those of these plug-ins.
+    dependencies=OBMC_Sample:Other_Plug_In
+    # Kill any of our call point programs that run longer than 10 minutes
+    # except for cp_ffdc which may run for 20 minutes.
+    timeout=600
+    ffdc_timeout=1200
+
+    The dictionary returned contains the following keys:
+    parallel_safe                   Indicates that the plug-in's call point
+                                    programs may run concurrently with those
+                                    of other plug-ins.  Defaults to 0.
+    dependencies                    A list of the names of plug-ins whose call
+                                    point programs must finish before this
+                                    plug-in's call point program is started.
+                                    Defaults to [].
+    timeout                         The maximum number of seconds that any of
+                                    the plug-in's call point programs may
+                                    run.  0 means no timeout.  None (the
+                                    default) means that the caller's timeout
+                                    applies (see get_call_point_timeout).
+    call_point_timeouts             A dictionary of call point/timeout pairs
+                                    taken from any <call point>_timeout
+                                    properties.  These override timeout for
+                                    the given call points.
+
+    Description of arguments:
+    plug_in_dir_path                The plug-in directory path.
+    """
+
+    plug_in_properties = {'parallel_safe': 0, 'dependencies': [],
+                          'timeout': None, 'call_point_timeouts': {}}
+    properties_file_path = plug_in_dir_path + "plug_in_properties"
+    if not os.path.isfile(properties_file_path):
+        return plug_in_properties
+
+    properties = gm.my_parm_file(properties_file_path)
+    plug_in_properties['parallel_safe'] = \
+        int(properties.get('parallel_safe', 0))
+    plug_in_properties['dependencies'] = \
+        filter(None, properties.get('dependencies', "").split(":"))
+    for key, value in properties.items():
+        if key == 'timeout':
+            plug_in_properties['timeout'] = float(value)
+        elif key.endswith('_timeout'):
+            plug_in_properties['call_point_timeouts'][
+                key[:-len('_timeout')]] = float(value)
+
+    return plug_in_properties
+
+###############################################################################
+
+
+###############################################################################
+def get_call_point_timeout(plug_in_dir_path,
+                           call_point,
+                           default_timeout=0):
+
+    r"""
+    Return the number of seconds that the given plug-in's call point program
+    may run.  The plug-in's <call point>_timeout property takes precedence,
+    followed by its timeout property and finally by default_timeout.  A
+    value of 0 means no timeout.
+
+    Description of arguments:
+    plug_in_dir_path                The plug-in directory path.
+    call_point                      The call point (e.g. "setup").
+    default_timeout                 The timeout to be used if the plug-in
+                                    declares none.
+    """
+
+    plug_in_properties = get_plug_in_properties(plug_in_dir_path)
+    if call_point in plug_in_properties['call_point_timeouts']:
+        return plug_in_properties['call_point_timeouts'][call_point]
+    if plug_in_properties['timeout'] is not None:
+        return plug_in_properties['timeout']
+
+    return float(default_timeout)
+
+###############################################################################
+
+
+###############################################################################
+def run_call_point(plug_in_dir_path,
+                   call_point,
+                   allow_shell_rc=0x00000000,
+                   quiet=0,
+                   debug=0,
+                   out_dir_path="",
+                   print_output=1,
+                   timeout=0,
+                   plug_in_ix=None):
+
+    r"""
+    Run the call point program in the given plug_in_dir_path and return a
+    dictionary describing the results.  If the plug-in has no such call point
+    program, return None.
+
+    If the plug-in implements the call point as a Python callable rather than
+    as a program (see gen_plug_in_host), the callable is run in the plug-in's
+    persistent host process.  Its exit status is treated exactly as a call
+    point program's would be.
+
+    The dictionary returned contains the following keys:
+    plug_in_name                    The name of the plug-in.
+    plug_in_dir_path                The plug-in directory path.
+    call_point                      The call point.
+    cmd_buf                         The command used to run the call point
+                                    program (or, for a callable, the path of
+                                    the call points module followed by ":"
+                                    and the callable's name).
+    rc                              The return code - 0 = PASS, 1 = FAIL.
+    shell_rc                        The shell return code of the call point
+                                    program shifted left one byte (e.g. an rc
+                                    of 2 becomes 0x00000200).  The rightmost
+                                    byte is reserved for errors in calling the
+                                    call point program rather than errors
+                                    generated by the call point program (e.g.
+                                    if the program is killed by signal 15,
+                                    shell_rc will be 0x0000000f).
+    timed_out                       Indicates that the call point program was
+                                    killed because it exceeded the plug-in's
+                                    timeout (see get_plug_in_properties).
+    duration                        The number of seconds the call point
+                                    program ran.
+    user_time                       The user CPU seconds used by the call
+                                    point program (see gen_cmd.run_cmd).
+    system_time                     The system CPU seconds used by the call
+                                    point program.
+    max_rss                         The call point program's maximum resident
+                                    set size in kilobytes.
+    out_file_path                   The path of the file containing the call
+                                    point program's output (or "" if
+                                    out_dir_path was not specified).
+    out_buf                         The last plug_in_max_out_bytes bytes of
+                                    the call point program's output.
+    cp_results                      The structured results returned by a
+                                    call point callable or None.
+
+    Description of arguments:
+    plug_in_dir_path                The directory path where the call_point
+                                    program may be located.
+    call_point                      The call point (e.g. "setup").  This
+                                    function will look for a program named
+                                    "cp_" + call_point in the
+                                    plug_in_dir_path.
+    allow_shell_rc                  The user may supply a value other than
+                                    zero to indicate an acceptable non-zero
+                                    return code.  For example, if this value
+                                    equals 0x00000200, it means that a
+                                    0x00000200 will not be counted as a
+                                    failure.
+    quiet                           If this is set, this function will not
+                                    print status messages or the call point
+                                    program's output.
+    debug                           If this is set, this function will print
+                                    additional debug information.
+    out_dir_path                    The path of a directory to which the call
+                                    point program's output is to be written.
+                                    The file name will be <plug-in
+                                    name>.cp_<call point>.out (or <plug-in
+                                    name>.<plug_in_ix>.cp_<call point>.out if
+                                    plug_in_ix is given).
+    print_output                    If this is 0, this function does no
+                                    printing at all (regardless of quiet) and
+                                    may therefore be called from a worker
+                                    thread.  The caller may print the results
+                                    later with print_call_point_results.
+    timeout                         The maximum number of seconds that the
+                                    call point program may run unless the
+                                    plug-in declares otherwise (see
+                                    get_call_point_timeout).  When exceeded,
+                                    the program's process group is killed.
+    plug_in_ix                      The plug-in's index in the list of
+                                    plug-ins being run.  Since plug-ins from
+                                    different plug-in directories may have
+                                    the same name, this must be given when
+                                    they share an out_dir_path concurrently.
+    """
+
+    plug_in_name = os.path.basename(os.path.normpath(plug_in_dir_path))
+    cp_prefix = "cp_"
+    if not plug_in_has_call_point(plug_in_dir_path, call_point):
+        # No such call point in this plug in dir path.  This is legal.
+        return None
+
+    timeout = get_call_point_timeout(plug_in_dir_path, call_point, timeout)
+
+    plug_in_results = collections.OrderedDict()
+    plug_in_results['plug_in_name'] = plug_in_name
+    plug_in_results['plug_in_dir_path'] = plug_in_dir_path
+    plug_in_results['call_point'] = call_point
+    is_callable = call_point_is_callable(plug_in_dir_path, call_point)
+    if is_callable:
+        plug_in_results['cmd_buf'] = plug_in_dir_path +\
+            gpih.call_points_module_name + ":" + cp_prefix + call_point
+    else:
+        plug_in_results['cmd_buf'] = "PATH=" + plug_in_dir_path +\
+            ":${PATH} ; " +\
+            get_autoscript_subcmd(plug_in_name, call_point, debug) +\
+            cp_prefix + call_point
+    plug_in_results['rc'] = 0
+    plug_in_results['shell_rc'] = 0x00000000
+    plug_in_results['timed_out'] = False
+    plug_in_results['duration'] = 0.0
+    plug_in_results['user_time'] = 0.0
+    plug_in_results['system_time'] = 0.0
+    plug_in_results['max_rss'] = 0
+    if out_dir_path:
+        plug_in_results['out_file_path'] = os.path.normpath(out_dir_path) +\
+            os.sep + plug_in_name + "."
+        if plug_in_ix is not None:
+            plug_in_results['out_file_path'] += str(plug_in_ix) + "."
+        plug_in_results['out_file_path'] += cp_prefix + call_point + ".out"
+    else:
+        plug_in_results['out_file_path'] = ""
+    plug_in_results['out_buf'] = ""
+    plug_in_results['cp_results'] = None
+
+    if is_callable:
+        # A callable's output is printed once it has returned (see below).
+        cmd_results = gpih.run_call_point_callable(
+            plug_in_dir_path, call_point,
+            gpih.get_call_point_context(plug_in_dir_path, call_point, quiet,
+                                        debug),
+            timeout, plug_in_max_out_bytes,
+            plug_in_results['out_file_path'] or None)
+        plug_in_results['cp_results'] = cmd_results['cp_results']
+    elif print_output and not quiet:
+        print_call_point_header(plug_in_results)
+        cmd_results = gc.run_cmd(plug_in_results['cmd_buf'], quiet=0,
+                                 test_mode=0, print_output=1, show_err=0,
+                                 timeout=timeout,
+                                 max_out_bytes=plug_in_max_out_bytes,
+                                 out_file_path=plug_in_results[
+                                     'out_file_path'] or None)
+    else:
+        cmd_results = gc.exec_cmd(plug_in_results['cmd_buf'], timeout,
+                                  plug_in_max_out_bytes,
+                                  plug_in_results['out_file_path'] or None)
+
+    if cmd_results['rc'] < 0:
+        # The program was killed by a signal.
+        plug_in_results['shell_rc'] = -cmd_results['rc']
+    else:
+        # Shift to left.
+        plug_in_results['shell_rc'] = cmd_results['rc'] * 0x100
+    plug_in_results['timed_out'] = cmd_results['timed_out']
+    plug_in_results['duration'] = cmd_results['duration']
+    plug_in_results['user_time'] = cmd_results['user_time']
+    plug_in_results['system_time'] = cmd_results['system_time']
+    plug_in_results['max_rss'] = cmd_results['max_rss']
+    plug_in_results['out_buf'] = cmd_results['out_buf']
+    if plug_in_results['shell_rc'] != 0 and\
+       plug_in_results['shell_rc'] != allow_shell_rc:
+        plug_in_results['rc'] = 1
+
+    if print_output and not quiet:
+        if is_callable:
+            print_call_point_results(plug_in_results)
+        else:
+            print_call_point_footer(plug_in_results)
+
+    return plug_in_results
+
+###############################################################################
+
+
+###############################################################################
+def print_call_point_header(plug_in_results):
+
+    r"""
+    Print the lines which precede a call point program's output.
+
+    Description of arguments:
+    plug_in_results                 A plug-in results dictionary (see
+                                    run_call_point).
+    """
+
+    gp.printn("------------------------------------------------- Starting"
+              " plug-in ----------------------------------------------")
+    gp.printn(sprint_call_point_stats(get_call_point_file_path(
+        plug_in_results['plug_in_dir_path'], plug_in_results['call_point'])))
+
+###############################################################################
+
+
+###############################################################################
+def print_call_point_footer(plug_in_results):
+
+    r"""
+    Print the lines which follow a call point program's output.
+
+    Description of arguments:
+    plug_in_results                 A plug-in results dictionary (see
+                                    run_call_point).
+    """
+
+    gp.printn("------------------------------------------------- Ending"
+              " plug-in ------------------------------------------------")
+    if plug_in_results['timed_out']:
+        gp.print_error("The call point program timed out.\n")
+    if plug_in_results['rc'] != 0:
+        gp.print_varx("failed_plug_in_name", plug_in_results['plug_in_name'])
+    gp.print_varx("shell_rc", plug_in_results['shell_rc'], 1)
+
+###############################################################################
+
+
+###############################################################################
+def print_call_point_results(plug_in_results):
+
+    r"""
+    Print the header, "Issuing" line, output and footer for a call point
+    program which was run with print_output=0 (see run_call_point).  The
+    output is taken from the plug-in's output file if there is one and from
+    out_buf otherwise.
+
+    Description of arguments:
+    plug_in_results                 A plug-in results dictionary (see
+                                    run_call_point).
+    """
+
+    print_call_point_header(plug_in_results)
+    gp.pissuing(plug_in_results['cmd_buf'])
+    if plug_in_results['out_file_path']:
+        redactor = gp.stream_redactor()
+        with open(plug_in_results['out_file_path']) as out_file_obj:
+            for chunk in iter(lambda: out_file_obj.read(65536), ""):
+                gc.print_cmd_output(redactor.redact(chunk))
+        gc.print_cmd_output(redactor.flush())
+    else:
+        gc.print_cmd_output(plug_in_results['out_buf'])
+    print_call_point_footer(plug_in_results)
+
+###############################################################################
+
+
+###############################################################################
+def process_plug_in_packages(plug_in_packages_list,
+                             call_point="setup",
+                             allow_shell_rc=0x00000000,
+                             stop_on_plug_in_failure=1,
+                             stop_on_non_zero_rc=0,
+                             quiet=0,
+                             debug=0,
+                             out_dir_path="",
+                             max_workers=None,
+                             timeout=None):
+
+    r"""
+    Run the given call point program for each plug-in package in
+    plug_in_packages_list and return the following:
+    rc                              The return code - 0 = PASS, 1 = FAIL.
+    shell_rc                        The shell return code of the last call
+                                    point program run (see run_call_point).
+    failed_plug_in_name             The failed plug in name (if any).
+    plug_in_results_list            A list of plug-in results dictionaries
+                                    (see run_call_point), one for each call
+                                    point program run, in the order given by
+                                    plug_in_packages_list.
+
+    When max_workers is greater than 1 and neither stop_on_plug_in_failure nor
+    stop_on_non_zero_rc is set, call point programs are run concurrently (see
+    run_call_points_parallel).  Otherwise, they are run one at a time.
+
+    Description of arguments:
+    plug_in_packages_list           A list of validated plug-in directory
+                                    paths (see return_plug_in_packages_list).
+    call_point                      The call point program to be called for
+                                    each plug-in package (e.g. post_boot).
+                                    This name should not include the "cp_"
+                                    prefix.
+    allow_shell_rc                  The user may supply a value other than
+                                    zero to indicate an acceptable non-zero
+                                    return code.  This may be an integer or a
+                                    string (e.g. "0x00000200").
+    stop_on_plug_in_failure         If this parameter is set to 1, this
+                                    function will stop and return non-zero if
+                                    the call point program from any plug-in
+                                    directory fails.
+    stop_on_non_zero_rc             If this parm is set to 1 and a plug-in
+                                    call point program returns a valid
+                                    non-zero return code (see "allow_shell_rc"
+                                    parm above), this function will stop
+                                    processing and return 0 (success).
+    quiet                           If this is set, this function will not
+                                    print status messages or call point
+                                    program output.
+    debug                           If this is set, this function will print
+                                    additional debug information.
+    out_dir_path                    The path of a directory to which each call
+                                    point program's output is to be written
+                                    (see run_call_point).
+    max_workers                     The maximum number of call point programs
+                                    to be run at once.  This defaults to the
+                                    value of the PLUG_IN_MAX_WORKERS
+                                    environment variable or to 1.
+    timeout                         The maximum number of seconds that each
+                                    call point program may run unless its
+                                    plug-in declares otherwise (see
+                                    get_call_point_timeout).  This defaults
+                                    to the value of the PLUG_IN_TIMEOUT
+                                    environment variable or to 0 (i.e. no
+                                    timeout).
+    """
+
+    allow_shell_rc = int(str(allow_shell_rc), 0)
+    stop_on_plug_in_failure = int(stop_on_plug_in_failure)
+    stop_on_non_zero_rc = int(stop_on_non_zero_rc)
+    quiet = int(quiet)
+    debug = int(debug)
+    if max_workers is None:
+        max_workers = os.environ.get('PLUG_IN_MAX_WORKERS', 1)
+    max_workers = max(int(max_workers), 1)
+    if timeout is None:
+        timeout = os.environ.get('PLUG_IN_TIMEOUT', 0)
+    timeout = float(timeout)
+
+    # Check that the plug-in index is current once here rather than on each
+    # of the lookups made while running the call points.
+    get_plug_in_index(check=1)
+
+    rc = 0
+    shell_rc = 0x00000000
+    failed_plug_in_name = ""
+    if max_workers > 1 and not stop_on_plug_in_failure and\
+       not stop_on_non_zero_rc:
+        plug_in_results_list = \
+            run_call_points_parallel(plug_in_packages_list, call_point,
+                                     allow_shell_rc, quiet, debug,
+                                     out_dir_path, max_workers, timeout)
+        for plug_in_results in plug_in_results_list:
+            shell_rc = plug_in_results['shell_rc']
+            if plug_in_results['rc'] != 0:
+                rc = 1
+                failed_plug_in_name = plug_in_results['plug_in_name']
+    else:
+        plug_in_results_list = []
+        for plug_in_dir_path in plug_in_packages_list:
+            plug_in_results = run_call_point(plug_in_dir_path, call_point,
+                                             allow_shell_rc, quiet, debug,
+                                             out_dir_path, timeout=timeout)
+            if plug_in_results is None:
+                continue
+            plug_in_results_list.append(plug_in_results)
+            shell_rc = plug_in_results['shell_rc']
+            if plug_in_results['rc'] != 0:
+                rc = 1
+                failed_plug_in_name = plug_in_results['plug_in_name']
+                if stop_on_plug_in_failure:
+                    break
+            if shell_rc != 0 and stop_on_non_zero_rc:
+                if not quiet:
+                    gp.print_time("Stopping on non-zero shell return code as"
+                                  " requested by caller.\n")
+                break
+
+    for plug_in_results in plug_in_results_list:
+        tally_plug_in_cost(plug_in_results)
+
+    if rc != 0 and not stop_on_plug_in_failure and not quiet:
+        # We print a summary error message to make the failure more obvious.
+        gp.print_error("At least one plug-in failed.\n")
+
+    return rc, shell_rc, failed_plug_in_name, plug_in_results_list
+
+###############################################################################
+
+
+###############################################################################
+def run_call_points_parallel(plug_in_packages_list,
+                             call_point,
+                             allow_shell_rc=0x00000000,
+                             quiet=0,
+                             debug=0,
+                             out_dir_path="",
+                             max_workers=4,
+                             timeout=0):
+
+    r"""
+    Run the given call point program for each plug-in package concurrently
+    and return a list of plug-in results dictionaries (see run_call_point) in
+    the order given by plug_in_packages_list.
+
+    Scheduling is governed by each plug-in's properties (see
+    get_plug_in_properties):
+    - A plug-in which is not parallel_safe runs by itself, i.e. it starts
+      only after all running programs have finished and no other program
+      starts until it has finished.
+    - A plug-in's call point program starts only after those of its
+      dependencies have finished.  Dependencies on plug-ins which are not
+      being run are ignored.
+    Subject to those rules, programs are started in plug_in_packages_list
+    order.
+
+    Each program's output is captured and printed, along with its header and
+    footer, in plug_in_packages_list order so that output never interleaves.
+
+    Description of arguments:
+    plug_in_packages_list           See process_plug_in_packages.
+    call_point                      See process_plug_in_packages.
+    allow_shell_rc                  See process_plug_in_packages.
+    quiet                           See process_plug_in_packages.
+    debug                           See process_plug_in_packages.
+    out_dir_path                    See process_plug_in_packages.  If this is
+                                    blank, output is captured in temporary
+                                    files which are removed once printed.
+    max_workers                     The maximum number of call point programs
+                                    to be run at once.
+    timeout                         See process_plug_in_packages.
+    """
+
+    plug_in_dir_paths = [plug_in_dir_path for plug_in_dir_path in
+                         plug_in_packages_list
+                         if plug_in_has_call_point(plug_in_dir_path,
+                                                   call_point)]
+    plug_in_names = [os.path.basename(os.path.normpath(plug_in_dir_path))
+                     for plug_in_dir_path in plug_in_dir_paths]
+    plug_in_properties_list = [get_plug_in_properties(plug_in_dir_path)
+                               for plug_in_dir_path in plug_in_dir_paths]
+    if out_dir_path:
+        work_dir_path = out_dir_path
+    else:
+        work_dir_path = tempfile.mkdtemp(prefix="plug_in_output.")
+
+    plug_in_results_list = [None] * len(plug_in_dir_paths)
+    done_queue = Queue.Queue()
+
+    def worker(ix):
+        try:
+            plug_in_results = run_call_point(plug_in_dir_paths[ix],
+                                             call_point, allow_shell_rc,
+                                             quiet, debug, work_dir_path,
+                                             print_output=0, timeout=timeout,
+                                             plug_in_ix=ix)
+        except Exception as exception:
+            # Count a failure to launch the program as an error in calling
+            # it (see run_call_point).
+            plug_in_results = collections.OrderedDict()
+            plug_in_results['plug_in_name'] = plug_in_names[ix]
+            plug_in_results['plug_in_dir_path'] = plug_in_dir_paths[ix]
+            plug_in_results['call_point'] = call_point
+            plug_in_results['cmd_buf'] = ""
+            plug_in_results['rc'] = 1
+            plug_in_results['shell_rc'] = 0x000000ff
+            plug_in_results['timed_out'] = False
+            plug_in_results['duration'] = 0.0
+            plug_in_results['user_time'] = 0.0
+            plug_in_results['system_time'] = 0.0
+            plug_in_results['max_rss'] = 0
+            plug_in_results['out_file_path'] = ""
+            plug_in_results['out_buf'] = str(exception) + "\n"
+            plug_in_results['cp_results'] = None
+        done_queue.put((ix, plug_in_results))
+
+    pending = range(len(plug_in_dir_paths))
+    running = []
+    finished_names = set()
+    exclusive_running = False
+    print_ix = 0
+    try:
+        while len(pending) or len(running):
+            start_ixs = []
+            for ix in pending:
+                if len(running) + len(start_ixs) >= max_workers or\
+                   exclusive_running:
+                    break
+                parallel_safe = plug_in_properties_list[ix]['parallel_safe']
+                if not parallel_safe and len(running) + len(start_ixs):
+                    # Wait for the running programs to finish.
+                    break
+                dependencies = plug_in_properties_list[ix]['dependencies']
+                unfinished_dependencies = \
+                    [name for name in dependencies
+                     if name in plug_in_names and name not in finished_names]
+                if len(unfinished_dependencies):
+                    continue
+                start_ixs.append(ix)
+                exclusive_running = not parallel_safe
+            if not len(running) and not len(start_ixs):
+                # Every pending plug-in is waiting on another pending plug-in
+                # so the dependencies must be circular.
+                ix = pending[0]
+                gp.print_error("Ignoring the unsatisfiable dependencies of"
+                               " the following plug-in:\n" +
+                               gp.sprint_varx("plug_in_name",
+                                              plug_in_names[ix]))
+                start_ixs.append(ix)
+                exclusive_running = \
+                    not plug_in_properties_list[ix]['parallel_safe']
+            for ix in start_ixs:
+                pending.remove(ix)
+                running.append(ix)
+                thread = threading.Thread(target=worker, args=(ix,))
+                thread.daemon = True
+                thread.start()
+
+            ix, plug_in_results = done_queue.get()
+            running.remove(ix)
+            exclusive_running = False
+            finished_names.add(plug_in_names[ix])
+            plug_in_results_list[ix] = plug_in_results
+
+            # Print the results of every program which has finished and which
+            # follows all other programs that have been printed.
+            while print_ix < len(plug_in_results_list) and\
+                    plug_in_results_list[print_ix] is not None:
+                plug_in_results = plug_in_results_list[print_ix]
+                if not quiet:
+                    print_call_point_results(plug_in_results)
+                if not out_dir_path and plug_in_results['out_file_path']:
+                    os.remove(plug_in_results['out_file_path'])
+                    plug_in_results['out_file_path'] = ""
+                print_ix += 1
+    finally:
+        if not out_dir_path:
+            # Remove any output files which were not removed above (e.g.
+            # because an exception was raised) along with the directory.
+            shutil.rmtree(work_dir_path, ignore_errors=True)
+
+    return plug_in_results_list
+
+###############################################################################
+
+
+# The resources used by each plug-in's call point programs during this run,
+# keyed by plug-in name (see tally_plug_in_cost).
+plug_in_costs = collections.OrderedDict()
+
+
+###############################################################################
+def tally_plug_in_cost(plug_in_results):
+
+    r"""
+    Add the resources used by a call point program to the running totals for
+    its plug-in.
+
+    Description of arguments:
+    plug_in_results                 A plug-in results dictionary (see
+                                    run_call_point).
+    """
+
+    plug_in_name = plug_in_results['plug_in_name']
+    if plug_in_name not in plug_in_costs:
+        plug_in_costs[plug_in_name] = collections.OrderedDict(
+            [('runs', 0), ('failures', 0), ('timeouts', 0),
+             ('wall_msecs', 0), ('user_msecs', 0), ('sys_msecs', 0),
+             ('max_rss_kb', 0)])
+    plug_in_cost = plug_in_costs[plug_in_name]
+    plug_in_cost['runs'] += 1
+    plug_in_cost['failures'] += plug_in_results['rc']
+    plug_in_cost['timeouts'] += int(plug_in_results['timed_out'])
+    plug_in_cost['wall_msecs'] += int(plug_in_results['duration'] * 1000)
+    plug_in_cost['user_msecs'] += int(plug_in_results['user_time'] * 1000)
+    plug_in_cost['sys_msecs'] += int(plug_in_results['system_time'] * 1000)
+    plug_in_cost['max_rss_kb'] = max(plug_in_cost['max_rss_kb'],
+                                     int(plug_in_results['max_rss']))
+
+###############################################################################
+
+
+###############################################################################
+def sprint_plug_in_cost_report():
+
+    r"""
+    Return a report showing the resources used by each plug-in's call point
+    programs during this run or an empty string if no call point programs
+    have been run.
+
+    Example result:
+
+    Plug-In                        Runs Failures Timeouts Wall_Msecs ...
+    ------------------------------ ---- -------- -------- ---------- ...
+    OBMC_Sample                      10        0        0      51233 ...
+    ==================================================================...
+    Totals                           10        0        0      51233 ...
+    """
+
+    if not len(plug_in_costs):
+        return ""
+
+    sum_fields = ['runs', 'failures', 'timeouts', 'wall_msecs', 'user_msecs',
+                  'sys_msecs']
+    plug_in_cost_sheet = tally_sheet.tally_sheet(
+        'plug-in', collections.OrderedDict(
+            [(field_name, 0) for field_name in
+             plug_in_costs.values()[0].keys()]), 'plug_in_costs')
+    plug_in_cost_sheet.set_sum_fields(sum_fields)
+    for plug_in_name, plug_in_cost in plug_in_costs.items():
+        plug_in_cost_sheet.add_row(plug_in_name, plug_in_cost)
+    plug_in_cost_sheet.calc()
+
+    return plug_in_cost_sheet.sprint_report()
+
+###############################################################################
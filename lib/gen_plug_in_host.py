@@ -0,0 +1,467 @@
+#!/usr/bin/env python
+
+r"""
+This module runs plug-in call points which are written as Python callables
+rather than as programs.
+
+A plug-in package may contain a "call_points.py" module which defines
+functions named cp_<call point> (e.g. cp_setup).  Each such function is
+passed a context dictionary (see get_call_point_context) and may return
+either None (success), an integer exit status or a dictionary of structured
+results with an optional "rc" key containing the exit status.
+
+Rather than starting a shell and a new Python interpreter for every call, the
+callables of each plug-in are run in a persistent worker process (a
+plug_in_host) which lives for the duration of the run.  Should the worker
+die or time out, it is killed and a new one is started for the next call.
+"""
+
+import sys
+import os
+import re
+import imp
+import signal
+import resource
+import traceback
+import threading
+import collections
+import multiprocessing
+import tempfile
+
+import gen_print as gp
+
+# The name of the module in which a plug-in may define its call point
+# callables.
+call_points_module_name = "call_points.py"
+
+# Serializes the starting of worker processes (see plug_in_host.start).
+start_lock = threading.Lock()
+
+
+###############################################################################
+def get_call_point_callables(module_file_path):
+
+    r"""
+    Return a sorted list of the call points for which the given call points
+    module defines a callable.  The module is scanned rather than imported so
+    that the caller's process is unaffected by the plug-in's code.  A call
+    point callable must therefore be defined at the top level of the module
+    with a "def cp_<call point>(" statement.
+
+    Description of arguments:
+    module_file_path                The path to a plug-in's call points
+                                    module.
+    """
+
+    try:
+        with open(module_file_path) as file_obj:
+            source = file_obj.read()
+    except IOError:
+        return []
+
+    return sorted(set(re.findall(r"^def cp_(\w+)\s*\(", source,
+                                 re.MULTILINE)))
+
+###############################################################################
+
+
+###############################################################################
+def get_call_point_context(plug_in_dir_path,
+                           call_point,
+                           quiet=0,
+                           debug=0):
+
+    r"""
+    Return the context dictionary to be passed to a call point callable.
+
+    The dictionary contains the following keys:
+    plug_in_name                    The name of the plug-in.
+    plug_in_dir_path                The plug-in directory path.
+    call_point                      The call point (e.g. "setup").
+    quiet                           The caller's quiet value.
+    debug                           The caller's debug value.
+    autoboot                        A dictionary of all AUTOBOOT_ environment
+                                    variables (e.g. AUTOBOOT_OPENBMC_HOST)
+                                    and their values.  These are also set in
+                                    the worker's environment before the
+                                    callable is called.
+
+    Description of arguments:
+    plug_in_dir_path                The plug-in directory path.
+    call_point                      The call point (e.g. "setup").
+    quiet                           See gen_plug_in.run_call_point.
+    debug                           See gen_plug_in.run_call_point.
+    """
+
+    context = collections.OrderedDict()
+    context['plug_in_name'] = \
+        os.path.basename(os.path.normpath(plug_in_dir_path))
+    context['plug_in_dir_path'] = plug_in_dir_path
+    context['call_point'] = call_point
+    context['quiet'] = int(quiet)
+    context['debug'] = int(debug)
+    context['autoboot'] = dict([(key, value) for key, value in
+                                os.environ.items()
+                                if key.startswith("AUTOBOOT_")])
+
+    return context
+
+###############################################################################
+
+
+###############################################################################
+def host_main(conn,
+              plug_in_dir_path):
+
+    r"""
+    Serve call point requests for the given plug-in until the connection is
+    closed or None is received.  This is the main function of each plug-in
+    host worker process.
+
+    Each request is a (call point, context, output file path) tuple.  The
+    callable's stdout and stderr (including that of any programs it runs) are
+    written to the output file.  The reply is a dictionary with the keys rc,
+    cp_results, user_time, system_time and max_rss.
+
+    Description of arguments:
+    conn                            The worker's end of a
+                                    multiprocessing.Pipe.
+    plug_in_dir_path                The plug-in directory path.
+    """
+
+    # Lead our own process group so that we and any programs started by a
+    # callable may be killed together.
+    os.setpgrp()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    sys.path.insert(0, plug_in_dir_path)
+    os.environ['PATH'] = plug_in_dir_path + ":" + os.environ.get('PATH', "")
+    module_file_path = plug_in_dir_path + call_points_module_name
+    module_name = "cp_" + re.sub(r"\W", "_", os.path.basename(
+        os.path.normpath(plug_in_dir_path)))
+    module = None
+    module_mtime = None
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        call_point, context, out_file_path = request
+
+        reply = {'rc': 0, 'cp_results': None}
+        start_self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        start_child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        out_file_obj = open(out_file_path, 'w', 0)
+        saved_fds = [os.dup(1), os.dup(2)]
+        saved_streams = [sys.stdout, sys.stderr]
+        os.dup2(out_file_obj.fileno(), 1)
+        os.dup2(out_file_obj.fileno(), 2)
+        sys.stdout = sys.stderr = out_file_obj
+        try:
+            os.environ.update(context['autoboot'])
+            # Reload the module if the plug-in has been changed since it was
+            # last loaded.
+            mtime = os.stat(module_file_path).st_mtime
+            if module is None or mtime != module_mtime:
+                module = imp.load_source(module_name, module_file_path)
+                module_mtime = mtime
+            result = getattr(module, "cp_" + call_point)(context)
+            if isinstance(result, dict):
+                reply['rc'] = int(result.get('rc', 0))
+                reply['cp_results'] = result
+            elif result is not None:
+                reply['rc'] = int(result)
+        except SystemExit as system_exit:
+            # Treat sys.exit the way the Python interpreter would.
+            if system_exit.code is None:
+                reply['rc'] = 0
+            elif isinstance(system_exit.code, (int, long)):
+                reply['rc'] = system_exit.code
+            else:
+                sys.stderr.write(str(system_exit.code) + "\n")
+                reply['rc'] = 1
+        except Exception:
+            traceback.print_exc()
+            reply['rc'] = 1
+        sys.stdout, sys.stderr = saved_streams
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        for fd in saved_fds:
+            os.close(fd)
+        out_file_obj.close()
+
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        reply['user_time'] = \
+            self_usage.ru_utime - start_self_usage.ru_utime +\
+            child_usage.ru_utime - start_child_usage.ru_utime
+        reply['system_time'] = \
+            self_usage.ru_stime - start_self_usage.ru_stime +\
+            child_usage.ru_stime - start_child_usage.ru_stime
+        reply['max_rss'] = max(self_usage.ru_maxrss, child_usage.ru_maxrss)
+        try:
+            conn.send(reply)
+        except Exception:
+            # The structured results could not be pickled.
+            reply['cp_results'] = repr(reply['cp_results'])
+            conn.send(reply)
+
+###############################################################################
+
+
+class plug_in_host:
+
+    r"""
+    This class manages a persistent worker process which runs the call point
+    callables of one plug-in.  Calls are serialized by a lock so that a
+    plug_in_host may be shared by multiple threads.
+    """
+
+    def __init__(self,
+                 plug_in_dir_path):
+
+        r"""
+        Create a plug_in_host object.  The worker process is not started
+        until the first call.
+
+        Description of arguments:
+        plug_in_dir_path            The plug-in directory path.
+        """
+
+        self.plug_in_dir_path = plug_in_dir_path
+        self.__lock = threading.Lock()
+        self.__process = None
+        self.__conn = None
+        self.num_starts = 0
+
+    def start(self):
+
+        r"""
+        Start the worker process.
+        """
+
+        # Workers are started one at a time so that no worker inherits the
+        # child end of another worker's pipe (which would prevent us from
+        # seeing EOF should that other worker die).
+        with start_lock:
+            self.__conn, child_conn = multiprocessing.Pipe()
+            self.__process = multiprocessing.Process(
+                target=host_main, args=(child_conn, self.plug_in_dir_path))
+            # A daemonic worker is terminated automatically when we exit.
+            self.__process.daemon = True
+            self.__process.start()
+            child_conn.close()
+        self.num_starts += 1
+
+    def kill(self,
+             grace_period=2):
+
+        r"""
+        Kill the worker process and any programs it started.  SIGTERM is sent
+        first and, if the worker has not ended within grace_period seconds,
+        SIGKILL is sent.  Return the worker's exit code.
+
+        Description of arguments:
+        grace_period                The number of seconds to wait after
+                                    sending SIGTERM.
+        """
+
+        for signal_number in [signal.SIGTERM, signal.SIGKILL]:
+            try:
+                os.killpg(self.__process.pid, signal_number)
+            except OSError:
+                # The process group no longer exists.
+                pass
+            self.__process.join(grace_period)
+            if not self.__process.is_alive():
+                break
+
+        return self.__forget()
+
+    def stop(self):
+
+        r"""
+        Ask the worker process to exit.
+        """
+
+        with self.__lock:
+            if self.__process is None:
+                return
+            try:
+                self.__conn.send(None)
+            except (IOError, OSError):
+                pass
+            self.__process.join(2)
+            if self.__process.is_alive():
+                self.kill()
+            else:
+                self.__forget()
+
+    def __forget(self):
+
+        r"""
+        Release the worker process and its connection so that a new worker
+        will be started on the next call.  Return the worker's exit code.
+        """
+
+        self.__process.join(0)
+        exit_code = self.__process.exitcode
+        self.__conn.close()
+        self.__process = None
+        self.__conn = None
+
+        return exit_code
+
+    def run(self,
+            call_point,
+            context,
+            out_file_path,
+            timeout=0):
+
+        r"""
+        Run the given call point's callable in the worker process and return
+        a command results dictionary (see gen_cmd.run_cmd) with an additional
+        cp_results key containing the callable's structured results (or
+        None).  The out_buf key is left empty as the output is in
+        out_file_path.
+
+        Description of arguments:
+        call_point                  The call point (e.g. "setup").
+        context                     The context dictionary to be passed to
+                                    the callable (see
+                                    get_call_point_context).
+        out_file_path               The path of the file to which the
+                                    callable's output is to be written.
+        timeout                     The maximum number of seconds that the
+                                    callable may run.  When exceeded, the
+                                    worker is killed.  0 means no timeout.
+        """
+
+        results = collections.OrderedDict([('rc', 0), ('out_buf', ""),
+                                           ('duration', 0.0),
+                                           ('num_bytes', 0),
+                                           ('truncated', False),
+                                           ('timed_out', False),
+                                           ('user_time', 0.0),
+                                           ('system_time', 0.0),
+                                           ('max_rss', 0),
+                                           ('cp_results', None)])
+        with self.__lock:
+            start_seconds = gp.monotonic_time()
+            if self.__process is None or not self.__process.is_alive():
+                if self.__process is not None:
+                    self.__forget()
+                self.start()
+            try:
+                self.__conn.send((call_point, context, out_file_path))
+                if self.__conn.poll(float(timeout) if timeout else None):
+                    results.update(self.__conn.recv())
+                else:
+                    results['timed_out'] = True
+                    self.kill()
+                    results['rc'] = -signal.SIGTERM
+            except (EOFError, IOError, OSError):
+                # The worker died (e.g. the callable called os._exit or
+                # crashed the interpreter).
+                exit_code = self.kill(0)
+                results['rc'] = exit_code or 1
+            results['duration'] = gp.monotonic_time() - start_seconds
+
+        return results
+
+###############################################################################
+
+
+# Plug-in hosts keyed by plug-in directory path.
+plug_in_hosts = collections.OrderedDict()
+plug_in_hosts_lock = threading.Lock()
+
+
+###############################################################################
+def get_plug_in_host(plug_in_dir_path):
+
+    r"""
+    Return the plug_in_host object for the given plug-in, creating it if
+    necessary.
+
+    Description of arguments:
+    plug_in_dir_path                The plug-in directory path.
+    """
+
+    with plug_in_hosts_lock:
+        if plug_in_dir_path not in plug_in_hosts:
+            plug_in_hosts[plug_in_dir_path] = plug_in_host(plug_in_dir_path)
+
+        return plug_in_hosts[plug_in_dir_path]
+
+###############################################################################
+
+
+###############################################################################
+def run_call_point_callable(plug_in_dir_path,
+                            call_point,
+                            context,
+                            timeout=0,
+                            max_out_bytes=0,
+                            out_file_path=None):
+
+    r"""
+    Run the given plug-in's call point callable in its plug-in host and
+    return a command results dictionary (see plug_in_host.run) whose out_buf
+    contains the last max_out_bytes bytes of the callable's output.
+
+    Description of arguments:
+    plug_in_dir_path                The plug-in directory path.
+    call_point                      The call point (e.g. "setup").
+    context                         See plug_in_host.run.
+    timeout                         See plug_in_host.run.
+    max_out_bytes                   The maximum number of bytes of output to
+                                    be kept in out_buf.  0 means no limit.
+    out_file_path                   The path of the file to which the
+                                    callable's output is to be written.  If
+                                    this is None, a temporary file is used.
+    """
+
+    if out_file_path is None:
+        file_descriptor, temp_file_path = tempfile.mkstemp()
+        os.close(file_descriptor)
+    else:
+        temp_file_path = None
+
+    try:
+        results = get_plug_in_host(plug_in_dir_path).run(
+            call_point, context, temp_file_path or out_file_path, timeout)
+        with open(temp_file_path or out_file_path) as out_file_obj:
+            out_file_obj.seek(0, os.SEEK_END)
+            results['num_bytes'] = out_file_obj.tell()
+            if max_out_bytes and results['num_bytes'] > max_out_bytes:
+                results['truncated'] = True
+                out_file_obj.seek(-max_out_bytes, os.SEEK_END)
+            else:
+                out_file_obj.seek(0)
+            results['out_buf'] = out_file_obj.read()
+    finally:
+        if temp_file_path is not None:
+            os.remove(temp_file_path)
+
+    return results
+
+###############################################################################
+
+
+###############################################################################
+def stop_plug_in_hosts():
+
+    r"""
+    Stop all plug-in host worker processes.
+    """
+
+    with plug_in_hosts_lock:
+        for host in plug_in_hosts.values():
+            host.stop()
+        plug_in_hosts.clear()
+
+###############################################################################
@@ -16,6 +16,10 @@ import argparse
 import __builtin__
 import logging
 import collections
+import json
+import math
+import random
+import functools
 
 try:
     robot_env = 1
@@ -75,6 +79,91 @@ sprint_time_last_seconds = start_time
 # from this module.
 gen_print_debug = int(os.environ.get('GEN_PRINT_DEBUG', 0))
 
+# The following environment variables put limits on the output produced by
+# sprint_varx for large, deeply nested values.  A value of 0 means "no limit".
+# SPRINT_VAR_MAX_DEPTH                The maximum nesting level to be shown.
+# SPRINT_VAR_MAX_ITEMS                The maximum number of items to be shown
+#                                     for any one dict, list, etc.
+# SPRINT_VAR_MAX_BYTES                The maximum total size of the output.
+sprint_var_max_depth = int(os.environ.get('SPRINT_VAR_MAX_DEPTH', 0))
+sprint_var_max_items = int(os.environ.get('SPRINT_VAR_MAX_ITEMS', 0))
+sprint_var_max_bytes = int(os.environ.get('SPRINT_VAR_MAX_BYTES', 0))
+
+# The following environment variables select the format of the output
+# produced by the print functions (e.g. print_time, print_var, etc.).
+# GEN_PRINT_FORMAT                    "text" (the default), "json" or "both".
+#                                     With "json", each print function writes
+#                                     one JSON object per line in place of its
+#                                     usual text.  With "both", the JSON line
+#                                     follows the usual text.
+# GEN_PRINT_JSON_FILE_PATH            If set, JSON lines are appended to this
+#                                     file rather than being written to
+#                                     stdout/stderr.
+gen_print_format = os.environ.get('GEN_PRINT_FORMAT', 'text')
+gen_print_json_file_path = os.environ.get('GEN_PRINT_JSON_FILE_PATH', '')
+json_file_obj = None
+
+
+###############################################################################
+def get_monotonic_clock():
+
+    r"""
+    Return a function which returns the number of seconds since an arbitrary
+    point in the past as measured by a monotonic clock (i.e. a clock which is
+    not affected by adjustments of the system clock, e.g. by NTP).
+
+    Python 2 has no time.monotonic so clock_gettime(CLOCK_MONOTONIC) is
+    called via ctypes.  If that is not available, os.times()[4] (the elapsed
+    real time, which is also independent of the system clock but has a
+    resolution of only one clock tick) is used.
+    """
+
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        # The CLOCK_MONOTONIC value from Linux's <time.h>.
+        clock_monotonic = 1
+        # clock_gettime is in librt for glibc versions prior to 2.17 and in
+        # libc thereafter.
+        clock_gettime = None
+        for lib_name in ['rt', 'c']:
+            lib_path = ctypes.util.find_library(lib_name)
+            if lib_path is None:
+                continue
+            clock_gettime = getattr(ctypes.CDLL(lib_path), 'clock_gettime',
+                                    None)
+            if clock_gettime is not None:
+                break
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        ts = timespec()
+        if clock_gettime(clock_monotonic, ctypes.byref(ts)) != 0:
+            raise OSError("clock_gettime(CLOCK_MONOTONIC) failed.")
+
+        def monotonic():
+            ts = timespec()
+            clock_gettime(clock_monotonic, ctypes.byref(ts))
+            return ts.tv_sec + ts.tv_nsec * 1e-9
+
+        return monotonic
+    except (ImportError, OSError, AttributeError):
+        return lambda: os.times()[4]
+
+###############################################################################
+
+
+# JSON records carry monotonic time stamps so that elapsed times are immune to
+# adjustments of the system clock (see get_monotonic_clock).
+monotonic_time = get_monotonic_clock()
+start_monotonic = monotonic_time()
+json_last_seconds = start_monotonic
+
 
 ###############################################################################
 def sprint_func_name(stack_frame_ix=None):
@@ -512,13 +601,233 @@ def sprint_error(buffer=""):
 ###############################################################################
 
 
+# dict_types is a list of the dictionary types recognized by sprint_varx.
+dict_types = [dict, collections.OrderedDict]
+try:
+    dict_types += [DotDict, NormalizedDict]
+except NameError:
+    pass
+dict_types = tuple(dict_types)
+
+
+###############################################################################
+class truncation_marker(str):
+
+    r"""
+    A string used by iter_varx in place of output that was omitted because a
+    max_depth, max_items or max_bytes limit was reached.
+    """
+
+###############################################################################
+
+
+###############################################################################
+def varx_children(var_name,
+                  var_value,
+                  hex,
+                  trailing_char,
+                  max_items):
+
+    r"""
+    Yield a (name, value, hex, trailing_char) tuple for each subordinate part
+    of the complex var_value.  If max_items is exceeded, the final tuple
+    yielded contains a truncation_marker in place of the remaining items.
+
+    This function is intended for use only by iter_varx.
+
+    Description of arguments:
+    See iter_varx (below) for details.
+    """
+
+    try:
+        length = len(var_value)
+    except TypeError:
+        length = 0
+
+    if type(var_value) in dict_types:
+        if hex:
+            # Since hex is being used as a format type, we want it turned off
+            # when processing integer dictionary values so it is not
+            # interpreted as a hex indicator.
+            children = ((key, value, not (type(value) is int))
+                        for key, value in var_value.iteritems())
+        else:
+            children = ((var_name + "[" + sprint_key(key) + "]", value, hex)
+                        for key, value in var_value.iteritems())
+    elif type(var_value) in (list, tuple, set):
+        children = ((var_name + "[" + str(key) + "]", value, hex)
+                    for key, value in enumerate(var_value))
+    else:
+        # argparse.Namespace.
+        children = ((var_name + "." + str(key), getattr(var_value, key), hex)
+                    for key in var_value.__dict__)
+
+    # Note that length is 0 for an argparse.Namespace, so its final item is
+    # not given the caller's trailing_char.
+    num_items = length or len(getattr(var_value, '__dict__', ()))
+    num_children = length
+    if max_items and length > max_items:
+        num_children = max_items
+
+    ix = 0
+    for name, value, loc_hex in children:
+        ix += 1
+        if max_items and ix > max_items:
+            marker = truncation_marker("<" + str(num_items - max_items) +
+                                       " more items not shown (max_items=" +
+                                       str(max_items) + ")>")
+            yield var_name + "[...]", marker, 0, trailing_char
+            return
+        if ix == num_children and num_children == length:
+            yield name, value, loc_hex, trailing_char
+        else:
+            yield name, value, loc_hex, "\n"
+
+###############################################################################
+
+
+###############################################################################
+def sprint_key(key):
+
+    r"""
+    Return the dictionary key as a string suitable for use in a sprint_varx
+    variable name.
+
+    Description of arguments:
+    key                             A dictionary key.
+    """
+
+    if type(key) in (str, unicode):
+        return key
+
+    return str(key)
+
+###############################################################################
+
+
+###############################################################################
+def iter_varx(var_name,
+              var_value,
+              hex=0,
+              loc_col1_indent=col1_indent,
+              loc_col1_width=col1_width,
+              trailing_char="\n",
+              max_depth=None,
+              max_items=None,
+              max_bytes=None):
+
+    r"""
+    Yield the output of sprint_varx one line at a time.
+
+    Nested values are processed with an explicit stack rather than with
+    recursion so that very large or deeply nested values (e.g. a boot table
+    or the result of an enumerate REST call) may be formatted efficiently.
+
+    Description of arguments:
+    See sprint_varx (below) for details.
+    """
+
+    if max_depth is None:
+        max_depth = sprint_var_max_depth
+    if max_items is None:
+        max_items = sprint_var_max_items
+    if max_bytes is None:
+        max_bytes = sprint_var_max_bytes
+    max_depth = int(max_depth)
+    max_items = int(max_items)
+    max_bytes = int(max_bytes)
+
+    num_bytes = 0
+    # Each stack entry consists of an iterator which yields (name, value, hex,
+    # trailing_char) tuples plus the indent and depth at which those tuples
+    # are to be printed.
+    stack = [(iter([(var_name, var_value, hex, trailing_char)]),
+              int(loc_col1_indent), 0)]
+    while len(stack) > 0:
+        items, loc_col1_indent, depth = stack[-1]
+        try:
+            var_name, var_value, hex, trailing_char = next(items)
+        except StopIteration:
+            stack.pop()
+            continue
+
+        if type(var_value) is type:
+            var_value = str(var_value).split("'")[1]
+
+        is_complex = type(var_value) in dict_types \
+            or type(var_value) in (list, tuple, set) \
+            or type(var_value) is argparse.Namespace
+
+        if type(var_value) in (int, float, bool, str, unicode) \
+           or var_value is None or type(var_value) is truncation_marker:
+            # The data type is simple in the sense that it has no subordinate
+            # parts.
+            # Adjust loc_col1_width.
+            loc_col1_width_adj = loc_col1_width - loc_col1_indent
+            # See if the user wants the output in hex format.
+            if hex:
+                if type(var_value) not in (int, long):
+                    value_format = "%s"
+                    if var_value == "":
+                        var_value = "<blank>"
+                else:
+                    value_format = "0x%08x"
+            else:
+                value_format = "%s"
+            format_string = "%" + str(loc_col1_indent) + "s%-" \
+                + str(loc_col1_width_adj) + "s" + value_format + trailing_char
+            buffer = format_string % ("", str(var_name) + ":", var_value)
+        elif not is_complex:
+            var_type = type(var_value).__name__
+            var_value = "<" + var_type + " type not supported by " + \
+                        "sprint_varx()>"
+            # Adjust loc_col1_width.
+            loc_col1_width_adj = loc_col1_width - loc_col1_indent
+            format_string = "%" + str(loc_col1_indent) + "s%-" \
+                + str(loc_col1_width_adj) + "s%s" + trailing_char
+            buffer = format_string % ("", str(var_name) + ":", var_value)
+        else:
+            # The data type is complex in the sense that it has subordinate
+            # parts.
+            format_string = "%" + str(loc_col1_indent) + "s%s\n"
+            buffer = format_string % ("", str(var_name) + ":")
+            if max_depth and depth >= max_depth:
+                try:
+                    length = len(var_value)
+                except TypeError:
+                    length = len(var_value.__dict__)
+                format_string = "%" + str(loc_col1_indent + 2) + "s%s" +\
+                    trailing_char
+                buffer += format_string % ("", "<" + str(length) +
+                                           " items not shown (max_depth=" +
+                                           str(max_depth) + ")>")
+            else:
+                stack.append((varx_children(var_name, var_value, hex,
+                                            trailing_char, max_items),
+                              loc_col1_indent + 2, depth + 1))
+
+        if max_bytes:
+            num_bytes += len(buffer)
+            if num_bytes > max_bytes:
+                yield "<output truncated (max_bytes=" + str(max_bytes) +\
+                    ")>\n"
+                return
+
+        yield buffer
+
+###############################################################################
+
+
 ###############################################################################
 def sprint_varx(var_name,
                 var_value,
                 hex=0,
                 loc_col1_indent=col1_indent,
                 loc_col1_width=col1_width,
-                trailing_char="\n"):
+                trailing_char="\n",
+                max_depth=None,
+                max_items=None,
+                max_bytes=None):
 
     r"""
     Print the var name/value passed to it.  If the caller lets loc_col1_width
@@ -580,111 +889,63 @@ def sprint_varx(var_name,
     trailing_char                   The character to be used at the end of the
                                     returned string.  The default value is a
                                     line feed.
+    max_depth                       The maximum nesting level to be shown.
+                                    Containers found below this level are
+                                    replaced by a "<... not shown ...>"
+                                    marker.  This defaults to global
+                                    sprint_var_max_depth.  0 means no limit.
+    max_items                       The maximum number of items to be shown
+                                    for any one dict, list, etc.  This
+                                    defaults to global sprint_var_max_items.
+                                    0 means no limit.
+    max_bytes                       The maximum size of the output.  Output
+                                    beyond this size is replaced by a
+                                    "<output truncated ...>" marker.  This
+                                    defaults to global sprint_var_max_bytes.
+                                    0 means no limit.
     """
 
-    # Determine the type
-    if type(var_value) in (int, float, bool, str, unicode) \
-       or var_value is None:
-        # The data type is simple in the sense that it has no subordinate
-        # parts.
-        # Adjust loc_col1_width.
-        loc_col1_width = loc_col1_width - loc_col1_indent
-        # See if the user wants the output in hex format.
-        if hex:
-            if type(var_value) not in (int, long):
-                value_format = "%s"
-                if var_value == "":
-                    var_value = "<blank>"
-            else:
-                value_format = "0x%08x"
-        else:
-            value_format = "%s"
-        format_string = "%" + str(loc_col1_indent) + "s%-" \
-            + str(loc_col1_width) + "s" + value_format + trailing_char
-        return format_string % ("", str(var_name) + ":", var_value)
-    elif type(var_value) is type:
-        return sprint_varx(var_name, str(var_value).split("'")[1], hex,
-                           loc_col1_indent, loc_col1_width, trailing_char)
-    else:
-        # The data type is complex in the sense that it has subordinate parts.
-        format_string = "%" + str(loc_col1_indent) + "s%s\n"
-        buffer = format_string % ("", var_name + ":")
-        loc_col1_indent += 2
-        try:
-            length = len(var_value)
-        except TypeError:
-            length = 0
-        ix = 0
-        loc_trailing_char = "\n"
-        type_is_dict = 0
-        if type(var_value) is dict:
-            type_is_dict = 1
-        try:
-            if type(var_value) is collections.OrderedDict:
-                type_is_dict = 1
-        except AttributeError:
-            pass
-        try:
-            if type(var_value) is DotDict:
-                type_is_dict = 1
-        except NameError:
-            pass
-        try:
-            if type(var_value) is NormalizedDict:
-                type_is_dict = 1
-        except NameError:
-            pass
-        if type_is_dict:
-            for key, value in var_value.iteritems():
-                ix += 1
-                if ix == length:
-                    loc_trailing_char = trailing_char
-                if hex:
-                    # Since hex is being used as a format type, we want it
-                    # turned off when processing integer dictionary values so
-                    # it is not interpreted as a hex indicator.
-                    loc_hex = not (type(value) is int)
-                    buffer += sprint_varx(key, value,
-                                          loc_hex, loc_col1_indent,
-                                          loc_col1_width,
-                                          loc_trailing_char)
-                else:
-                    buffer += sprint_varx(var_name + "[" + key + "]", value,
-                                          hex, loc_col1_indent, loc_col1_width,
-                                          loc_trailing_char)
-        elif type(var_value) in (list, tuple, set):
-            for key, value in enumerate(var_value):
-                ix += 1
-                if ix == length:
-                    loc_trailing_char = trailing_char
-                buffer += sprint_varx(var_name + "[" + str(key) + "]", value,
-                                      hex, loc_col1_indent, loc_col1_width,
-                                      loc_trailing_char)
-        elif type(var_value) is argparse.Namespace:
-            for key in var_value.__dict__:
-                ix += 1
-                if ix == length:
-                    loc_trailing_char = trailing_char
-                cmd_buf = "buffer += sprint_varx(var_name + \".\" + str(key)" \
-                          + ", var_value." + key + ", hex, loc_col1_indent," \
-                          + " loc_col1_width, loc_trailing_char)"
-                exec(cmd_buf)
-        else:
-            var_type = type(var_value).__name__
-            func_name = sys._getframe().f_code.co_name
-            var_value = "<" + var_type + " type not supported by " + \
-                        func_name + "()>"
-            value_format = "%s"
-            loc_col1_indent -= 2
-            # Adjust loc_col1_width.
-            loc_col1_width = loc_col1_width - loc_col1_indent
-            format_string = "%" + str(loc_col1_indent) + "s%-" \
-                + str(loc_col1_width) + "s" + value_format + trailing_char
-            return format_string % ("", str(var_name) + ":", var_value)
+    return ''.join(iter_varx(var_name, var_value, hex, loc_col1_indent,
+                             loc_col1_width, trailing_char, max_depth,
+                             max_items, max_bytes))
 
-        return buffer
+###############################################################################
 
-    return ""
+
+###############################################################################
+def fprint_varx(file_obj,
+                var_name,
+                var_value,
+                hex=0,
+                loc_col1_indent=col1_indent,
+                loc_col1_width=col1_width,
+                trailing_char="\n",
+                max_depth=None,
+                max_items=None,
+                max_bytes=None):
+
+    r"""
+    Write the output of sprint_varx directly to the given file object one
+    line at a time rather than building it in memory.  Registered passwords
+    are hidden.
+
+    Example use:
+
+    with open(file_path, 'w') as file_obj:
+        fprint_varx(file_obj, "boot_table", boot_table)
+
+    Description of arguments:
+    file_obj                        A file object (e.g. sys.stdout or an
+                                    open file).
+    All remaining arguments are described in sprint_varx (above).
+    """
+
+    redactor = stream_redactor()
+    for buffer in iter_varx(var_name, var_value, hex, loc_col1_indent,
+                            loc_col1_width, trailing_char, max_depth,
+                            max_items, max_bytes):
+        file_obj.write(redactor.redact(buffer))
+    file_obj.write(redactor.flush())
 
 ###############################################################################
 
@@ -1193,6 +1454,329 @@ def sprint_issuing(cmd_buf,
 ###############################################################################
 
 
+###############################################################################
+def new_timing_node():
+
+    r"""
+    Return a new node for the timing tree (see start_timer).
+    """
+
+    return {'children': collections.OrderedDict(), 'count': 0, 'total': 0.0,
+            'min': None, 'max': None, 'sample': []}
+
+###############################################################################
+
+
+###############################################################################
+def add_timing_duration(node,
+                        duration):
+
+    r"""
+    Record a duration in the given timing node.  The node keeps the count,
+    total, min and max of its durations along with a bounded random sample
+    of them (see timing_sample_size) from which percentiles are estimated.
+    The node's size is therefore constant no matter how many times its
+    section runs (e.g. over a 1000-boot run).
+
+    Description of arguments:
+    node                            The timing node (see new_timing_node).
+    duration                        The duration in seconds.
+    """
+
+    node['count'] += 1
+    node['total'] += duration
+    if node['min'] is None or duration < node['min']:
+        node['min'] = duration
+    if node['max'] is None or duration > node['max']:
+        node['max'] = duration
+    # Keep a uniform random sample of the durations (reservoir sampling).
+    if len(node['sample']) < timing_sample_size:
+        node['sample'].append(duration)
+    else:
+        ix = random.randint(0, node['count'] - 1)
+        if ix < timing_sample_size:
+            node['sample'][ix] = duration
+
+###############################################################################
+
+
+# The maximum number of durations kept by each timing node for estimating
+# percentiles.
+timing_sample_size = 1000
+# The timing tree.  Each node holds the stats of the durations recorded for
+# one section along with the nodes for the sections nested within it.
+timing_root = new_timing_node()
+# The stack of active timers.  Each entry is a [section_name, node,
+# start_seconds] list.
+timing_stack = []
+
+
+###############################################################################
+def start_timer(section_name):
+
+    r"""
+    Start timing a section of code.  Sections may be nested (i.e. a section
+    started while another section is active will be reported as a child of
+    that section).  Call stop_timer to stop the timer.
+
+    Robot example:
+
+    Start Timer  Collect FFDC
+    ...
+    Stop Timer  Collect FFDC
+
+    Description of arguments:
+    section_name                    The name of the section being timed (e.g.
+                                    "wait_state").
+    """
+
+    if len(timing_stack):
+        parent_node = timing_stack[-1][1]
+    else:
+        parent_node = timing_root
+    node = parent_node['children'].setdefault(section_name,
+                                              new_timing_node())
+    timing_stack.append([section_name, node, monotonic_time()])
+
+###############################################################################
+
+
+###############################################################################
+def stop_timer(section_name=None):
+
+    r"""
+    Stop the timer for a section started by start_timer and return the number
+    of seconds that the section took.  Any timers started within the section
+    which are still active are stopped as well.
+
+    Description of arguments:
+    section_name                    The name of the section to be stopped.  If
+                                    this is None, the most recently started
+                                    section is stopped.
+    """
+
+    stop_seconds = monotonic_time()
+    if section_name is None:
+        if not len(timing_stack):
+            print_error("There are no active timers.\n")
+            return None
+        section_name = timing_stack[-1][0]
+
+    if section_name not in [entry[0] for entry in timing_stack]:
+        print_error("There is no active timer for the following section:\n" +
+                    sprint_varx("section_name", section_name))
+        return None
+
+    while True:
+        entry_section_name, node, start_seconds = timing_stack.pop()
+        duration = stop_seconds - start_seconds
+        add_timing_duration(node, duration)
+        if entry_section_name == section_name:
+            return duration
+
+###############################################################################
+
+
+###############################################################################
+class timer:
+
+    r"""
+    This class times a section of code using start_timer and stop_timer.  It
+    may be used either as a context manager or as a function decorator.
+
+    Example code:
+
+    with gp.timer("wait_state"):
+        st.wait_state(...)
+
+    @gp.timer()
+    def my_func():
+        ...
+    """
+
+    def __init__(self,
+                 section_name=None):
+
+        r"""
+        Create a timer object.
+
+        Description of arguments:
+        section_name                The name of the section being timed.  When
+                                    used as a decorator, this defaults to the
+                                    name of the decorated function.
+        """
+
+        self.section_name = section_name
+        self.duration = None
+
+    def __enter__(self):
+        start_timer(self.section_name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = stop_timer(self.section_name)
+        return False
+
+    def __call__(self, func):
+
+        r"""
+        Return a version of func which times each of its calls.
+
+        Description of arguments:
+        func                        The function to be timed.
+        """
+
+        section_name = self.section_name or func.__name__
+
+        @functools.wraps(func)
+        def timed_func(*args, **kwargs):
+            with timer(section_name):
+                return func(*args, **kwargs)
+
+        return timed_func
+
+###############################################################################
+
+
+###############################################################################
+def get_timing_stats(node):
+
+    r"""
+    Return a dictionary containing the count, total, min, max, mean and
+    percentiles (p50, p90, p99) of the durations recorded in the given timing
+    node.  The percentiles are exact until the node's sample is full and are
+    estimated from the sample thereafter.
+
+    Description of arguments:
+    node                            The timing node (see new_timing_node).
+    """
+
+    stats = collections.OrderedDict()
+    stats['count'] = node['count']
+    stats['total'] = node['total']
+    if not node['count']:
+        return stats
+
+    stats['min'] = node['min']
+    stats['max'] = node['max']
+    stats['mean'] = node['total'] / node['count']
+    sorted_durations = sorted(node['sample'])
+    # Use the nearest-rank method for percentiles.
+    for percentile in [50, 90, 99]:
+        ix = int(math.ceil(percentile / 100.0 * len(sorted_durations))) - 1
+        stats['p' + str(percentile)] = sorted_durations[max(ix, 0)]
+
+    return stats
+
+###############################################################################
+
+
+###############################################################################
+def sprint_timing_report(indent=0):
+
+    r"""
+    Return a tree-structured report of the timings recorded via start_timer,
+    stop_timer and timer.  If no timings have been recorded, an empty string
+    is returned.
+
+    Sample output:
+
+    Timing report:
+    Section                          Count       Total         Min         Max
+    ...
+    BMC Power On                         2  130.283112   62.018274   68.264838
+      wait_state                         4  118.114432   10.019821   49.031145
+
+    Description of arguments:
+    indent                          The number of characters to indent the
+                                    report.
+    """
+
+    if not len(timing_root['children']):
+        return ""
+
+    stat_names = ['count', 'total', 'min', 'max', 'mean', 'p50', 'p90',
+                  'p99']
+    section_width = 32
+    buffer = " " * indent + "Timing report:\n"
+    buffer += " " * indent + "Section".ljust(section_width) +\
+        "".join(["%12s" % x.title() for x in stat_names]) + "\n"
+
+    # An explicit stack is used rather than recursion.  Each entry is a
+    # [level, section_name, node] list.
+    node_stack = [[0, section_name, node] for section_name, node in
+                  reversed(timing_root['children'].items())]
+    while len(node_stack):
+        level, section_name, node = node_stack.pop()
+        stats = get_timing_stats(node)
+        buffer += " " * indent + ("  " * level + str(section_name))\
+            .ljust(section_width)
+        for stat_name in stat_names:
+            if stat_name == 'count':
+                buffer += "%12d" % stats[stat_name]
+            elif stat_name in stats:
+                buffer += "%12.6f" % stats[stat_name]
+        buffer += "\n"
+        node_stack.extend([[level + 1, child_name, child_node]
+                           for child_name, child_node in
+                           reversed(node['children'].items())])
+
+    return buffer
+
+###############################################################################
+
+
+###############################################################################
+def write_folded_stacks(file_path,
+                        append=0):
+
+    r"""
+    Write the timings recorded via start_timer, stop_timer and timer to a
+    file in the "folded stacks" format understood by flame graph tools (e.g.
+    flamegraph.pl).  Each line consists of a semicolon-delimited section path
+    followed by the section's self time (i.e. its time less that of the
+    sections nested within it) in microseconds.
+
+    Sample file contents:
+
+    BMC Power On 12151342
+    BMC Power On;wait_state 118114432
+
+    Description of arguments:
+    file_path                       The path of the file to be written.
+    append                          Append to the file rather than replacing
+                                    it.  Since flame graph tools sum the
+                                    values of identical stacks, this allows
+                                    several processes to share one file.
+    """
+
+    lines = []
+    node_stack = [[[str(section_name).replace(";", ":")], node]
+                  for section_name, node in
+                  reversed(timing_root['children'].items())]
+    while len(node_stack):
+        path, node = node_stack.pop()
+        self_time = node['total'] -\
+            sum([child_node['total']
+                 for child_node in node['children'].values()])
+        lines.append(";".join(path) + " " +
+                     str(max(int(round(self_time * 1000000)), 0)))
+        node_stack.extend([[path + [str(child_name).replace(";", ":")],
+                            child_node]
+                           for child_name, child_node in
+                           reversed(node['children'].items())])
+
+    if int(append):
+        mode = 'a'
+    else:
+        mode = 'w'
+    with open(file_path, mode) as file_obj:
+        for line in lines:
+            file_obj.write(line + "\n")
+
+###############################################################################
+
+
 ###############################################################################
 def sprint_pgm_footer():
 
@@ -1208,6 +1792,9 @@ def sprint_pgm_footer():
 
     buffer += sprint_varx(pgm_name_var_name + "_runtime", total_time_string)
     buffer += "\n"
+    timing_report = sprint_timing_report()
+    if timing_report != "":
+        buffer += timing_report + "\n"
 
     return buffer
 
@@ -1352,6 +1939,13 @@ def get_var_value(var_value=None,
 hidden_text = []
 # password_regex is created based on the contents of hidden_text.
 password_regex = ""
+# password_pattern is the compiled form of password_regex.  It is rebuilt only
+# when the set of registered passwords changes.
+password_pattern = None
+# max_password_len is the length of the longest registered password.  The
+# stream_redactor class uses it to decide how much of a chunk must be held
+# back in case a password straddles a chunk boundary.
+max_password_len = 0
 
 
 ###############################################################################
@@ -1371,19 +1965,35 @@ def register_passwords(*args):
 
     global hidden_text
     global password_regex
+    global password_pattern
+    global max_password_len
 
+    new_passwords = 0
     for password in args:
+        if password is None:
+            continue
+        password = str(password)
         if password == "":
-            break
+            continue
         if password in hidden_text:
-            break
+            continue
 
         # Place the password into the hidden_text list.
         hidden_text.append(password)
-        # Create a corresponding password regular expression.  Escape regex
-        # special characters too.
-        password_regex = '(' +\
-            '|'.join([re.escape(x) for x in hidden_text]) + ')'
+        new_passwords = 1
+
+    if not new_passwords:
+        return
+
+    # Create a corresponding password regular expression.  Escape regex
+    # special characters too.  Longer passwords are placed first so that a
+    # password which contains another registered password is hidden in its
+    # entirety.
+    password_regex = '(' +\
+        '|'.join([re.escape(x) for x in
+                  sorted(hidden_text, key=len, reverse=True)]) + ')'
+    password_pattern = re.compile(password_regex)
+    max_password_len = max([len(x) for x in hidden_text])
 
 ###############################################################################
 
@@ -1401,16 +2011,383 @@ def replace_passwords(buffer):
                                     passwords replaced.
     """
 
-    global password_regex
+    if password_pattern is None:
+        # No passwords to replace.
+        return buffer
 
     if int(os.environ.get("DEBUG_SHOW_PASSWORDS", "0")):
         return buffer
 
-    if password_regex == "":
-        # No passwords to replace.
+    # Substring searches are much cheaper than a regex substitution so we
+    # only run the regex when at least one password is actually present.
+    for password in hidden_text:
+        if password in buffer:
+            break
+    else:
         return buffer
 
-    return re.sub(password_regex, "********", buffer)
+    return password_pattern.sub("********", buffer)
+
+###############################################################################
+
+
+###############################################################################
+class stream_redactor:
+
+    r"""
+    This class replaces registered passwords in output which arrives in
+    chunks (e.g. the output of a shell command read from a pipe).  A password
+    which is split across two chunks will still be hidden.
+
+    Example code:
+
+    redactor = stream_redactor()
+    for chunk in chunks:
+        sys.stdout.write(redactor.redact(chunk))
+    sys.stdout.write(redactor.flush())
+    """
+
+    def __init__(self):
+
+        r"""
+        Create a stream_redactor object.
+        """
+
+        self.__pending = ""
+
+    def redact(self,
+               buffer):
+
+        r"""
+        Return as much of the buffer as can safely be released with all
+        registered passwords replaced.  Any trailing text which might be the
+        beginning of a password is held until the next call to redact or
+        flush.
+
+        Description of argument(s):
+        buffer                      The next chunk of output.
+        """
+
+        buffer = self.__pending + buffer
+        self.__pending = ""
+        if password_pattern is None or max_password_len < 2:
+            return replace_passwords(buffer)
+
+        # Any password which begins before cut_ix lies wholly within buffer.
+        cut_ix = len(buffer) - (max_password_len - 1)
+        if cut_ix <= 0:
+            self.__pending = buffer
+            return ""
+        for match in password_pattern.finditer(buffer):
+            if match.start() >= cut_ix:
+                break
+            cut_ix = max(cut_ix, match.end())
+
+        self.__pending = buffer[cut_ix:]
+        return replace_passwords(buffer[:cut_ix])
+
+    def flush(self):
+
+        r"""
+        Return any text being held by this object with all registered
+        passwords replaced.
+        """
+
+        buffer = self.__pending
+        self.__pending = ""
+
+        return replace_passwords(buffer)
+
+###############################################################################
+
+
+###############################################################################
+def json_default(value):
+
+    r"""
+    Return a JSON-serializable equivalent of value.  This function is passed
+    as the "default" argument to json.dumps which calls it for any value it
+    cannot otherwise serialize (e.g. a NormalizedDict or an argparse
+    Namespace).
+
+    Description of argument(s):
+    value                           The value to be converted.
+    """
+
+    if isinstance(value, argparse.Namespace):
+        return vars(value)
+    if hasattr(value, 'items'):
+        return collections.OrderedDict(value.items())
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+
+    return str(value)
+
+###############################################################################
+
+
+###############################################################################
+def replace_json_passwords(value):
+
+    r"""
+    Return a JSON-serializable copy of value with all registered passwords
+    replaced in each of the strings it contains (dictionary keys included).
+
+    The passwords must be replaced before the value is serialized since
+    json.dumps escapes some characters (e.g. quotes, backslashes and
+    non-ASCII characters) so that a password containing them no longer
+    appears verbatim in the JSON text.
+
+    Description of argument(s):
+    value                           The value whose passwords are to be
+                                    replaced.
+    """
+
+    if password_pattern is None:
+        return value
+
+    if isinstance(value, str):
+        return replace_passwords(value)
+    if isinstance(value, unicode):
+        return replace_passwords(value.encode('utf-8')).decode('utf-8',
+                                                               'replace')
+    if value is None or isinstance(value, (bool, int, long, float)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [replace_json_passwords(element) for element in value]
+    if isinstance(value, dict):
+        return collections.OrderedDict(
+            [(replace_json_passwords(key) if isinstance(key, basestring)
+              else key, replace_json_passwords(element))
+             for key, element in value.items()])
+
+    return replace_json_passwords(json_default(value))
+
+###############################################################################
+
+
+###############################################################################
+def sprint_caller():
+
+    r"""
+    Return a "<function> (<file>:<line>)" string describing the first stack
+    frame which is outside of the print machinery (i.e. outside of this
+    module, gen_robot_print.py and the print functions generated by them).
+    """
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        file_path = frame.f_code.co_filename
+        module_name = os.path.splitext(os.path.basename(file_path))[0]
+        if file_path != "<string>" and module_name not in ["gen_print",
+                                                           "gen_robot_print"]:
+            break
+        frame = frame.f_back
+
+    if frame is None:
+        return ""
+
+    return frame.f_code.co_name + " (" +\
+        os.path.basename(frame.f_code.co_filename) + ":" +\
+        str(frame.f_lineno) + ")"
+
+###############################################################################
+
+
+###############################################################################
+def sprint_json(func_name,
+                fields,
+                level="INFO",
+                caller=""):
+
+    r"""
+    Return a JSON-lines record (i.e. a one-line JSON object followed by a
+    linefeed) describing one call to a print function.  All registered
+    passwords are replaced.
+
+    Sample output (shown on multiple lines for readability):
+
+    {"time": 1477067862.6785, "mono": 8721.031245, "elapsed": 0.013478,
+     "delta": 0.000215, "level": "INFO", "pgm": "my_pgm", "pid": 1234,
+     "func": "print_var", "caller": "main (my_pgm:42)", "var_name": "rc",
+     "value": 0}
+
+    Description of argument(s):
+    func_name                       The name of the print function (e.g.
+                                    "print_var").
+    fields                          A dictionary of the fields which describe
+                                    what was printed (e.g. {"message": "..."}
+                                    or {"var_name": "rc", "value": 0}).
+    level                           The level of the record (e.g. "INFO",
+                                    "DEBUG", "ERROR").
+    caller                          A description of the calling function
+                                    (see sprint_caller).
+    """
+
+    global json_last_seconds
+
+    current_seconds = monotonic_time()
+    record = collections.OrderedDict()
+    record['time'] = round(time.time(), 6)
+    record['mono'] = round(current_seconds, 6)
+    record['elapsed'] = round(current_seconds - start_monotonic, 6)
+    record['delta'] = round(current_seconds - json_last_seconds, 6)
+    json_last_seconds = current_seconds
+    record['level'] = level
+    record['pgm'] = pgm_name
+    record['pid'] = os.getpid()
+    record['func'] = func_name
+    record['caller'] = caller
+    record.update(fields)
+    record = replace_json_passwords(record)
+
+    try:
+        buffer = json.dumps(record, default=json_default)
+    except UnicodeDecodeError:
+        # The record contains byte strings which are not valid utf-8 (e.g.
+        # binary command output).
+        buffer = json.dumps(record, default=json_default, encoding='latin-1')
+
+    return buffer + "\n"
+
+###############################################################################
+
+
+###############################################################################
+def get_json_fields(func_name,
+                    args,
+                    buffer):
+
+    r"""
+    Return a dictionary of the JSON fields which describe one call to a print
+    function.  See sprint_json for details.
+
+    Description of argument(s):
+    func_name                       The name of the print function (e.g.
+                                    "print_time").
+    args                            The arguments that were passed to the
+                                    print function.
+    buffer                          The text that the print function produced.
+                                    This is used for print functions whose
+                                    arguments have no natural structured
+                                    representation (e.g. print_pgm_header).
+    """
+
+    fields = collections.OrderedDict()
+    if func_name == "print_varx":
+        fields['var_name'] = args[0]
+        fields['value'] = args[1]
+    elif func_name in ["print_time", "print_timen", "print_error", "print",
+                       "printn"]:
+        fields['message'] = str(args[0]).rstrip("\n") if len(args) else ""
+    elif func_name == "print_error_report":
+        fields['message'] = str(args[0]).rstrip("\n") if len(args) else ""
+        fields['text'] = buffer
+    elif func_name == "print_issuing":
+        fields['command'] = args[0]
+        fields['test_mode'] = int(args[1]) if len(args) > 1 else 0
+    else:
+        fields['text'] = buffer
+
+    return fields
+
+###############################################################################
+
+
+###############################################################################
+def write_json(buffer,
+               stream="stdout"):
+
+    r"""
+    Write a JSON-lines record either to the file named by
+    GEN_PRINT_JSON_FILE_PATH or, if that is not set, to the indicated stream.
+
+    Description of argument(s):
+    buffer                          The JSON-lines record (see sprint_json).
+    stream                          The stream to which the record should be
+                                    written if GEN_PRINT_JSON_FILE_PATH is not
+                                    set (e.g. "stdout", "stderr", "STDIN").
+    """
+
+    global json_file_obj
+
+    if gen_print_json_file_path:
+        if json_file_obj is None:
+            json_file_obj = open(gen_print_json_file_path, 'a')
+        json_file_obj.write(buffer)
+        json_file_obj.flush()
+    elif robot_env:
+        BuiltIn().log_to_console(buffer, stream=stream, no_newline=True)
+    else:
+        # Robot callers use "STDIN" to mean stdout.
+        if stream.lower() == "stderr":
+            file_obj = sys.stderr
+        else:
+            file_obj = sys.stdout
+        file_obj.write(buffer)
+        file_obj.flush()
+
+###############################################################################
+
+
+###############################################################################
+def print_json(func_name,
+               stream,
+               args,
+               buffer):
+
+    r"""
+    Write a JSON-lines record describing one call to a print function.  This
+    function is called by the generated print functions (e.g. print_var,
+    qprint_var, dprint_var) when GEN_PRINT_FORMAT is "json" or "both".
+
+    Description of argument(s):
+    func_name                       The name of the print function (e.g.
+                                    "print_var").
+    stream                          The stream that the print function writes
+                                    to ("stdout" or "stderr").
+    args                            The arguments that were passed to the
+                                    print function.
+    buffer                          The text that the print function produced.
+    """
+
+    print_func_name = sys._getframe(1).f_code.co_name
+    if print_func_name.startswith("d"):
+        level = "DEBUG"
+    elif stream == "stderr":
+        level = "ERROR"
+    else:
+        level = "INFO"
+
+    if func_name == "print_var" or func_name == "print_vars":
+        # As with sprint_var, we must look at our caller's caller's source
+        # code to learn the variable names.
+        fields = collections.OrderedDict()
+        var_dict = collections.OrderedDict()
+        for parm_num in range(1, len(args) + 1):
+            var_name = get_arg_name(None, parm_num, 2)
+            try:
+                # Skip the optional integer "indent", "col1_width" and "hex"
+                # arguments.
+                int(var_name)
+                continue
+            except (TypeError, ValueError):
+                pass
+            var_dict[var_name] = args[parm_num - 1]
+        if func_name == "print_var" and len(var_dict) == 1:
+            fields['var_name'], fields['value'] = var_dict.items()[0]
+        else:
+            fields['vars'] = var_dict
+    else:
+        fields = get_json_fields(func_name, args, buffer)
+
+    json_buffer = sprint_json(func_name, fields, level, sprint_caller())
+    if gen_print_format == "both" and not gen_print_json_file_path\
+       and not str(buffer).endswith("\n"):
+        # Keep the record on its own line when it follows text that lacks a
+        # trailing linefeed (e.g. print_time("Hello")).
+        json_buffer = "\n" + json_buffer
+    write_json(json_buffer, stream)
 
 ###############################################################################
 
@@ -1427,14 +2404,19 @@ def replace_passwords(buffer):
 
 # def print_time(*args):
 #     s_func = getattr(sys.modules[__name__], "sprint_time")
-#     sys.stdout.write(s_func(*args))
-#     sys.stdout.flush()
-
-# Here are comments describing the 3 lines in the body of the created function.
+#     buffer = s_func(*args)
+#     if gen_print_format != "json":
+#         sys.stdout.write(replace_passwords(buffer))
+#         sys.stdout.flush()
+#     if gen_print_format != "text":
+#         print_json("print_time", "stdout", args, buffer)
+
+# Here are comments describing the lines in the body of the created function.
 # Create a reference to the "s" version of the given function in s_func (e.g.
 # if this function name is print_time, we want s_funcname to be "sprint_time").
 # Call the "s" version of this function passing it all of our arguments.
-# Write the result to stdout.
+# Write the result to stdout unless the user has asked for JSON output only.
+# Write a JSON-lines record if the user has asked for one.
 
 # func_names contains a list of all print functions which should be created
 # from their sprint counterparts.
@@ -1442,7 +2424,8 @@ func_names = ['print_time', 'print_timen', 'print_error', 'print_varx',
               'print_var', 'print_vars', 'print_dashes', 'indent',
               'print_call_stack', 'print_func_name', 'print_executing',
               'print_pgm_header', 'print_issuing', 'print_pgm_footer',
-              'print_error_report', 'print', 'printn']
+              'print_error_report', 'print_timing_report', 'print',
+              'printn']
 
 # stderr_func_names is a list of functions whose output should go to stderr
 # rather than stdout.
@@ -1463,18 +2446,27 @@ for func_name in func_names:
     if robot_env:
         func_print_lines = \
             [
-                "    BuiltIn().log_to_console(replace_passwords" +
-                "(s_func(*args)),"
+                "    buffer = s_func(*args)",
+                "    if gen_print_format != \"json\":",
+                "        BuiltIn().log_to_console(replace_passwords(buffer),"
                 " stream='" + output_stream + "',"
                 " no_newline=True)"
             ]
     else:
         func_print_lines = \
             [
-                "    sys." + output_stream +
-                ".write(replace_passwords(s_func(*args)))",
-                "    sys." + output_stream + ".flush()"
+                "    buffer = s_func(*args)",
+                "    if gen_print_format != \"json\":",
+                "        sys." + output_stream +
+                ".write(replace_passwords(buffer))",
+                "        sys." + output_stream + ".flush()"
             ]
+    func_print_lines += \
+        [
+            "    if gen_print_format != \"text\":",
+            "        print_json(\"" + func_name + "\", \"" + output_stream +
+            "\", args, buffer)"
+        ]
 
     # Create an array containing the lines of the function we wish to create.
     func_def = [func_def_line, s_func_line] + func_print_lines
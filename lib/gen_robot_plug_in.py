@@ -6,16 +6,15 @@ robot program.
 """
 
 import sys
-import subprocess
 from robot.libraries.BuiltIn import BuiltIn
+from robot.utils import DotDict
 import commands
 import os
-import tempfile
 
 import gen_print as gp
 import gen_robot_print as grp
-import gen_misc as gm
-import gen_cmd as gc
+import gen_plug_in as gpi
+import gen_plug_in_host as gpih
 
 
 ###############################################################################
@@ -64,13 +63,19 @@ def rprocess_plug_in_packages(plug_in_packages_list=None,
                               debug=None):
 
     r"""
-    Call the external process_plug_in_packages.py to process the plug-in
-    packages.  Return the following:
+    Process the plug-in packages by running the given call point program for
+    each (see gen_plug_in.process_plug_in_packages).  Return the following:
     rc                              The return code - 0 = PASS, 1 = FAIL.
-    shell_rc                        The shell return code returned by
-                                    process_plug_in_packages.py.
+    shell_rc                        The shell return code of the last call
+                                    point program run.
     failed_plug_in_name             The failed plug in name (if any).
 
+    In addition, global robot variable ${plug_in_results_list} is set to a
+    list containing the results of each call point program run (plug-in name,
+    rc, shell_rc, duration, output file path, etc.).  If environment variable
+    PLUG_IN_OUT_DIR_PATH is set, each call point program's output is written
+    to a file in that directory.
+
     Description of arguments:
     plug_in_packages_list           A python list of plug-in directory paths.
     call_point                      The call point program to be called for
@@ -150,83 +155,40 @@ def rprocess_plug_in_packages(plug_in_packages_list=None,
         except TypeError:
             debug = 0
 
-    # Create string from list.
-    plug_in_dir_paths = ':'.join(plug_in_packages_list)
-
-    temp = tempfile.NamedTemporaryFile()
-    temp_file_path = temp.name
-    temp2 = tempfile.NamedTemporaryFile()
-    temp_properties_file_path = temp2.name
-
     if int(debug) == 1:
         os.environ["PERF_TRACE"] = "1"
-        debug_string = " --quiet=0"
-    else:
-        debug_string = ""
-
-    loc_shell_rc = 0
-
-    sub_cmd_buf = "process_plug_in_packages.py" + debug_string +\
-                  " --call_point=" + call_point + " --allow_shell_rc=" +\
-                  str(shell_rc) + " --stop_on_plug_in_failure=" +\
-                  str(stop_on_plug_in_failure) + " --stop_on_non_zero_rc=" +\
-                  str(stop_on_non_zero_rc) + " " + plug_in_dir_paths
-    if int(quiet) == 1:
-        cmd_buf = sub_cmd_buf + " > " + temp_file_path + " 2>&1"
-    else:
-        cmd_buf = "set -o pipefail ; " + sub_cmd_buf + " 2>&1 | tee " +\
-                  temp_file_path
-
-        if int(debug) == 1:
-            grp.rpissuing(cmd_buf)
-        else:
-            grp.rprint_timen("Processing " + call_point +
-                             " call point programs.")
-
-    proc_plug_pkg_rc = subprocess.call(cmd_buf, shell=True)
-
-    # As process_plug_in_packages.py help text states, it will print the
-    # values of failed_plug_in_name and shell_rc in the following format:
-    # failed_plug_in_name:               <failed plug-in value, if any>
-    # shell_rc:                          <shell return code value of last
-    # call point program>
-
-    # We want to obtain those values from the output.  To make the task
-    # simpler, we'll start by grepping the output for lines that might fit
-    # such a format:
-    # A valid bash variable against the left margin
-    # - A colon
-    # - Zero or more spaces
-    bash_var_regex = "[_[:alpha:]][_[:alnum:]]*"
-    regex = "^" + bash_var_regex + ":[ ]*"
-    cmd_buf = "egrep '" + regex + "' " + temp_file_path + " > " +\
-              temp_properties_file_path
-    if int(debug) == 1:
-        grp.rpissuing(cmd_buf)
-    grep_rc = os.system(cmd_buf)
-
-    # Next we call my_parm_file to create a properties dictionary.
-    properties = gm.my_parm_file(temp_properties_file_path)
-
-    # Finally, we access the 2 values that we need.
-    try:
-        shell_rc = int(properties['shell_rc'], 16)
-    except KeyError:
-        shell_rc = 0
-    try:
-        failed_plug_in_name = properties['failed_plug_in_name']
-    except KeyError:
-        failed_plug_in_name = ""
-
-    if proc_plug_pkg_rc != 0:
+
+    if int(quiet) != 1 and int(debug) != 1:
+        grp.rprint_timen("Processing " + call_point + " call point programs.")
+
+    out_dir_path = os.environ.get("PLUG_IN_OUT_DIR_PATH", "")
+    rc, shell_rc, failed_plug_in_name, plug_in_results_list = \
+        gpi.process_plug_in_packages(plug_in_packages_list, call_point,
+                                     shell_rc, stop_on_plug_in_failure,
+                                     stop_on_non_zero_rc, quiet, debug,
+                                     out_dir_path)
+    BuiltIn().set_global_variable("${plug_in_results_list}",
+                                  [DotDict(plug_in_results) for
+                                   plug_in_results in plug_in_results_list])
+
+    if rc != 0:
         hex = 1
         grp.rprint_error("Call to process_plug_in_packages failed.\n")
-        grp.rprint_varx("grep_rc", grep_rc, hex)
-        grp.rprint_varx("proc_plug_pkg_rc", proc_plug_pkg_rc, hex)
         # Show all of the failed plug in names and shell_rcs.
-        gc.cmd_fnc_u("egrep -A 1 '^failed_plug_in_name:[ ]+' " +
-                     temp_properties_file_path, quiet=1, show_err=0)
-        rc = 1
+        for plug_in_results in plug_in_results_list:
+            if plug_in_results['rc'] == 0:
+                continue
+            grp.rprint_varx("failed_plug_in_name",
+                            plug_in_results['plug_in_name'])
+            grp.rprint_varx("shell_rc", plug_in_results['shell_rc'], hex)
+
+    if call_point == "cleanup":
+        # The cleanup call point is the last one run so this is where we
+        # report the resources used by each plug-in over the whole run and
+        # stop the plug-in host processes.
+        if int(quiet) != 1:
+            grp.rprint(gpi.sprint_plug_in_cost_report())
+        gpih.stop_plug_in_hosts()
 
     return rc, shell_rc, failed_plug_in_name
 
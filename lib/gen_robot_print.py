@@ -334,6 +334,68 @@ def sprint_auto_vars(headers=0):
 ###############################################################################
 
 
+###############################################################################
+def rprint_json(func_name,
+                stream,
+                args,
+                buffer):
+
+    r"""
+    Write a JSON-lines record describing one call to a robot print function.
+    This is the robot counterpart of gen_print's print_json and is called by
+    the generated robot print functions (e.g. rprint_vars, rqprint_vars,
+    rdprint_vars) when GEN_PRINT_FORMAT is "json" or "both".
+
+    Description of arguments:
+    func_name                       The name of the print function (e.g.
+                                    "print_vars").
+    stream                          The stream that the print function writes
+                                    to ("STDIN" or "STDERR").
+    args                            The arguments that were passed to the
+                                    print function.
+    buffer                          The text that the print function produced.
+    """
+
+    # The "q" and "d" functions call the plain robot print functions so the
+    # name of interest is 2 frames up.
+    print_func_name = sys._getframe(2).f_code.co_name
+    if print_func_name.startswith("rd"):
+        level = "DEBUG"
+    elif stream == "STDERR":
+        level = "ERROR"
+    else:
+        level = "INFO"
+
+    if func_name == "print_vars":
+        # Robot callers pass variable names rather than values.
+        var_dict = my_ord_dict()
+        for var_name in args:
+            try:
+                # Skip the optional integer "hex", "indent" and "col1_width"
+                # arguments.
+                int(var_name)
+                continue
+            except (TypeError, ValueError):
+                pass
+            var_dict[str(var_name)] = \
+                BuiltIn().get_variable_value("${" + str(var_name) + "}")
+        fields = my_ord_dict([('vars', var_dict)])
+    elif func_name == "print_issuing_keyword":
+        fields = my_ord_dict()
+        fields['command'] = '  '.join([str(element) for element in args[0]])
+        fields['test_mode'] = int(args[1]) if len(args) > 1 else 0
+    else:
+        fields = gp.get_json_fields(func_name, args, buffer)
+
+    json_buffer = gp.sprint_json(func_name, fields, level, gp.sprint_caller())
+    if gp.gen_print_format == "both" and not gp.gen_print_json_file_path\
+       and not str(buffer).endswith("\n"):
+        json_buffer = "\n" + json_buffer
+    gp.write_json(json_buffer, stream)
+
+###############################################################################
+
+
 ###############################################################################
 # In the following section of code, we will dynamically create robot versions
 # of print functions for each of the sprint functions defined in the
@@ -348,14 +410,20 @@ def sprint_auto_vars(headers=0):
 
 # def rprint_time(*args):
 #   s_func = getattr(gp, "sprint_time")
-#   BuiltIn().log_to_console(s_func(*args),
-#                            stream='STDIN',
-#                            no_newline=True)
+#   buffer = s_func(*args)
+#   if gp.gen_print_format != "json":
+#       BuiltIn().log_to_console(gp.replace_passwords(buffer),
+#                                stream='STDIN',
+#                                no_newline=True)
+#   if gp.gen_print_format != "text":
+#       rprint_json("print_time", "STDIN", args, buffer)
 
 # Here are comments describing the lines in the body of the created function.
 # Put a reference to the "s" version of this function in s_func.
 # Call the "s" version of this function passing it all of our arguments.  Log
-# the result to the console.
+# the result to the console unless the user has asked for JSON output only
+# (see GEN_PRINT_FORMAT in gen_print.py).  Write a JSON-lines record if the
+# user has asked for one.
 
 robot_prefix = "r"
 robot_func_names =\
@@ -393,10 +461,15 @@ for func_name in func_names:
                 "def " + robot_prefix + func_name + "(*args):",
                 "    s_func = getattr(" + object_name + ", \"s" + func_name +
                 "\")",
-                "    BuiltIn().log_to_console" +
-                "(gp.replace_passwords(s_func(*args)),"
+                "    buffer = s_func(*args)",
+                "    if gp.gen_print_format != \"json\":",
+                "        BuiltIn().log_to_console" +
+                "(gp.replace_passwords(buffer),"
                 " stream='" + output_stream + "',"
-                " no_newline=True)"
+                " no_newline=True)",
+                "    if gp.gen_print_format != \"text\":",
+                "        rprint_json(\"" + func_name + "\", \"" +
+                output_stream + "\", args, buffer)"
             ]
 
         pgm_definition_string = '\n'.join(func_def)
@@ -146,6 +146,7 @@ def process_pgm_parms():
     global boot_stack
     global boot_results_file_path
     global boot_results
+    global timing_file_path
     global ffdc_list_file_path
     global ffdc_report_list_path
     global ffdc_summary_list_path
@@ -159,6 +160,8 @@ def process_pgm_parms():
 
     boot_results_file_path = "/tmp/" + openbmc_nickname + ":pid_" +\
                              str(master_pid) + ":boot_results"
+    timing_file_path = "/tmp/" + openbmc_nickname + ":pid_" +\
+        str(master_pid) + ":timing.folded"
 
     if os.path.isfile(boot_results_file_path):
         # We've been called before in this run so we'll load the saved
@@ -591,21 +594,18 @@ def print_defect_report():
     # named in FFDC_LIST_FILE_PATH so I will refrain from printing those
     # out (so we don't see duplicates in the list).
 
-    # Get additional header data which may have been created by ffdc plug-ins.
-    # Also, delete the individual header files to cleanup.
-    cmd_buf = "file_list=$(cat " + ffdc_report_list_path + " 2>/dev/null)" +\
-              " ; [ ! -z \"${file_list}\" ] && cat ${file_list}" +\
-              " 2>/dev/null ; rm -rf ${file_list} 2>/dev/null || :"
-    shell_rc, more_header_info = gc.cmd_fnc_u(cmd_buf, print_output=0,
-                                              show_err=0)
-
-    # Get additional header data which may have been created by ffdc plug-ins.
-    # Also, delete the individual header files to cleanup.
-    cmd_buf = "file_list=$(cat " + ffdc_summary_list_path + " 2>/dev/null)" +\
-              " ; [ ! -z \"${file_list}\" ] && cat ${file_list}" +\
-              " 2>/dev/null ; rm -rf ${file_list} 2>/dev/null || :"
-    shell_rc, ffdc_summary_info = gc.cmd_fnc_u(cmd_buf, print_output=0,
-                                               show_err=0)
+    # Get additional header and summary data which may have been created by
+    # ffdc plug-ins.  Also, delete the individual files to cleanup.  The two
+    # commands are independent so they are run concurrently.
+    cmd_bufs = []
+    for list_path in [ffdc_report_list_path, ffdc_summary_list_path]:
+        cmd_bufs.append("file_list=$(cat " + list_path + " 2>/dev/null)" +
+                        " ; [ ! -z \"${file_list}\" ] && cat ${file_list}" +
+                        " 2>/dev/null ; rm -rf ${file_list} 2>/dev/null || :")
+    cmd_results = gc.run_cmds(cmd_bufs, test_mode=0, print_output=0,
+                              show_err=0)
+    more_header_info = cmd_results[0]['out_buf']
+    ffdc_summary_info = cmd_results[1]['out_buf']
 
     LOG_PREFIX = BuiltIn().get_variable_value("${LOG_PREFIX}")
 
@@ -811,7 +811,8 @@ def test_loop_body():
     pre_boot_plug_in_setup()
 
     cmd_buf = ["run_boot", next_boot]
-    boot_status, msg = BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
+    with gp.timer(next_boot):
+        boot_status, msg = BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
     if boot_status == "FAIL":
         gp.qprint(msg)
 
@@ -836,7 +837,8 @@ def test_loop_body():
         call_point='ffdc_check', shell_rc=0x00000200,
         stop_on_plug_in_failure=1, stop_on_non_zero_rc=1)
     if boot_status != "PASS" or ffdc_check == "All" or shell_rc == 0x00000200:
-        status, ret_values = grk.run_key_u("my_ffdc", ignore=1)
+        with gp.timer("my_ffdc"):
+            status, ret_values = grk.run_key_u("my_ffdc", ignore=1)
         if status != 'PASS':
             gp.print_error("Call to my_ffdc failed.\n")
 
@@ -881,6 +883,13 @@ def obmc_boot_test_teardown():
         pickle.dump(boot_results, open(boot_results_file_path, 'wb'),
                     pickle.HIGHEST_PROTOCOL)
 
+    if 'timing_file_path' in globals():
+        # Each process appends its timings so that the file describes the
+        # entire run.  The file may be fed to a flame graph tool.
+        gp.qprint_timen("Saving timing data to the following path.")
+        gp.qprint_var(timing_file_path)
+        gp.write_folded_stacks(timing_file_path, append=1)
+
 ###############################################################################
 
 
@@ -6,9 +6,13 @@ This module is the python counterpart to openbmc_ffdc.robot..
 
 import os
 
+import gen_print as gp
 import gen_robot_print as grp
 import gen_valid as gv
 import gen_robot_keyword as grk
+import openbmc_ffdc_engine as ffdc_engine
+import openbmc_ffdc_store as ffdc_store
+import ssh_pool
 
 from robot.libraries.BuiltIn import BuiltIn
 
@@ -43,14 +47,18 @@ def ffdc(ffdc_dir_path=None,
     status, status_ping = grk.run_key("Ping Host  " + OPENBMC_HOST)
     grp.rprint_var(status_ping)
     if status_ping:
-        status_ssh = \
-            BuiltIn().run_keyword_and_return_status("Open Connection And" +
-                                                    " Log In")
+        # Check with the pooled SSH connection (see ssh_pool.py), which is
+        # reused if it is still healthy.
+        try:
+            ssh_pool.open_pooled_connection()
+            status_ssh = True
+        except Exception as exception:
+            grp.rprint_var(exception)
+            status_ssh = False
         grp.rprint_var(status_ssh)
         if not status_ssh:
             grp.rprint_error("BMC is not communicating. \
                               Aborting FFDC collection.\n")
-            BuiltIn().run_keyword_and_return_status("Close All Connections")
             return
 
     grp.rprint_timen("Collecting FFDC.")
@@ -79,11 +87,53 @@ def ffdc(ffdc_dir_path=None,
 
     grk.run_key("Header Message")
 
-    grk.run_key_u("Call FFDC Methods  ffdc_function_list=" +
-                  ffdc_function_list)
+    # If FFDC_ENGINE is set, the FFDC is collected concurrently by
+    # openbmc_ffdc_engine rather than by the "Call FFDC Methods" keyword.
+    FFDC_ENGINE = int(get_ffdc_parm("FFDC_ENGINE", 0))
+    with gp.timer("Call FFDC Methods"):
+        if FFDC_ENGINE:
+            call_ffdc_engine(ffdc_dir_path, ffdc_prefix, ffdc_function_list)
+        else:
+            grk.run_key_u("Call FFDC Methods  ffdc_function_list=" +
+                          ffdc_function_list)
 
     grp.rprint_timen("Finished collecting FFDC.")
 
+    # If FFDC_STORE_DIR_PATH is set, the FFDC files are added to a
+    # content-addressed store (see openbmc_ffdc_store.py).
+    FFDC_STORE_DIR_PATH = get_ffdc_parm("FFDC_STORE_DIR_PATH")
+    if FFDC_STORE_DIR_PATH:
+        store_ffdc(FFDC_STORE_DIR_PATH, ffdc_dir_path, ffdc_prefix)
+
+###############################################################################
+
+
+###############################################################################
+def store_ffdc(store_dir_path,
+               ffdc_dir_path,
+               ffdc_prefix):
+
+    r"""
+    Add the FFDC files for the given prefix to the content-addressed FFDC store
+    and print the store's report.
+
+    By default, the FFDC files are removed once they are stored and may be
+    recreated with "ffdc_store.py materialize".  If FFDC_STORE_KEEP is set to
+    1, copies of them are left in place.
+
+    Description of arguments:
+    store_dir_path                  The store directory path.
+    ffdc_dir_path                   The dir path where FFDC data was put.
+    ffdc_prefix                     The prefix given to each FFDC file name.
+    """
+
+    store = ffdc_store.ffdc_store(store_dir_path)
+    manifest = store.store_ffdc(ffdc_dir_path, ffdc_prefix,
+                                keep=int(get_ffdc_parm("FFDC_STORE_KEEP", 0)))
+    ffdc_store_stats = manifest['stats']
+    grp.rprint_var(ffdc_store_stats)
+    grp.rprint(store.sprint_report())
+
 ###############################################################################
 
 
@@ -162,3 +212,119 @@ def set_ffdc_defaults(ffdc_dir_path=None,
     return ffdc_dir_path, ffdc_prefix
 
 ###############################################################################
+
+
+###############################################################################
+def call_ffdc_engine(ffdc_dir_path,
+                     ffdc_prefix,
+                     ffdc_function_list=""):
+
+    r"""
+    Collect FFDC with openbmc_ffdc_engine.  This is the concurrent counterpart
+    of the "Call FFDC Methods" keyword.  Any FFDC_METHOD_CALL keyword which the
+    engine does not implement is run afterward in the usual way.
+
+    The engine is tuned by the following parms, each of which may be set as a
+    Robot variable or in the environment (see get_ffdc_parm):
+    FFDC_BUNDLE                     Run the BMC commands as a single bundle
+                                    (see openbmc_ffdc_bundle.py).
+    FFDC_COMPRESSION                The compression ("", "gz" or "xz") to be
+                                    used for the FFDC files.
+    FFDC_MAX_FILE_BYTES             The maximum number of bytes to be stored
+                                    in each FFDC file.
+    FFDC_MAX_BYTES                  The maximum number of bytes to be stored
+                                    in all of the FFDC files of one
+                                    collection.
+    FFDC_JOURNAL_DIR_PATH           The journal store directory path.  If
+                                    this is set, the BMC journal is
+                                    collected incrementally (see
+                                    openbmc_ffdc_journal.py).
+    FFDC_DEADLINE                   The maximum number of seconds that the
+                                    engine may take.  The highest priority
+                                    collectors are run first and those which
+                                    do not fit are skipped (see
+                                    FFDC_COLLECTOR_PRIORITY in
+                                    openbmc_ffdc_list.py).
+    FFDC_STATE_DIR_PATH             The directory in which state kept from
+                                    one FFDC collection to the next (e.g. the
+                                    registry of core files retrieved) is
+                                    stored.  Defaults to the FFDC directory.
+    FFDC_MAX_CORE_BYTES             The maximum total number of bytes of core
+                                    files to be retrieved.
+    FFDC_REMOVE_CORE_FILES          Remove core files from the BMC once they
+                                    have been retrieved (the default).
+
+    Description of arguments:
+    ffdc_dir_path                   The dir path where FFDC data should be
+                                    put.
+    ffdc_prefix                     The prefix to be given to each FFDC file
+                                    name generated.
+    ffdc_function_list              See ffdc (above).
+    """
+
+    def get_var(var_name):
+        return BuiltIn().get_variable_value("${" + var_name + "}", "")
+
+    engine = ffdc_engine.ffdc_engine(ffdc_dir_path, ffdc_prefix,
+                                     get_var("OPENBMC_HOST"),
+                                     get_var("OPENBMC_USERNAME"),
+                                     get_var("OPENBMC_PASSWORD"),
+                                     get_var("SSH_PORT") or 22,
+                                     get_var("HTTPS_PORT"),
+                                     get_var("DBUS_PREFIX"),
+                                     get_var("OS_HOST"),
+                                     get_var("OS_USERNAME"),
+                                     get_var("OS_PASSWORD"),
+                                     bundle=get_ffdc_parm("FFDC_BUNDLE", 0),
+                                     compression=get_ffdc_parm(
+                                         "FFDC_COMPRESSION"),
+                                     max_file_bytes=get_ffdc_parm(
+                                         "FFDC_MAX_FILE_BYTES", 0),
+                                     max_ffdc_bytes=get_ffdc_parm(
+                                         "FFDC_MAX_BYTES", 0),
+                                     journal_dir_path=get_ffdc_parm(
+                                         "FFDC_JOURNAL_DIR_PATH"),
+                                     deadline=get_ffdc_parm(
+                                         "FFDC_DEADLINE", 0),
+                                     state_dir_path=get_ffdc_parm(
+                                         "FFDC_STATE_DIR_PATH"),
+                                     max_core_bytes=get_ffdc_parm(
+                                         "FFDC_MAX_CORE_BYTES", 0),
+                                     remove_core_files=get_ffdc_parm(
+                                         "FFDC_REMOVE_CORE_FILES", 1))
+    results_list, other_keywords = \
+        ffdc_engine.run_ffdc_methods(engine, ffdc_function_list)
+    grp.rprint(ffdc_engine.sprint_collector_results(results_list))
+
+    if not len(other_keywords):
+        return
+    grk.run_key_u("Open Connection And Log In")
+    for keyword_name in other_keywords:
+        grk.run_key(keyword_name, ignore=1)
+    grk.run_key_u("SSHLibrary.Close All Connections")
+
+###############################################################################
+
+
+###############################################################################
+def get_ffdc_parm(parm_name,
+                  default=""):
+
+    r"""
+    Return the value of the given FFDC parm.  The value is taken from the
+    Robot variable of the same name, then from the environment variable of
+    the same name and finally from default.
+
+    Description of arguments:
+    parm_name                       The name of the parm (e.g. "FFDC_ENGINE").
+    default                         The value to be returned if the parm is
+                                    not set.
+    """
+
+    value = BuiltIn().get_variable_value("${" + parm_name + "}")
+    if value is None:
+        value = os.environ.get(parm_name, default)
+
+    return value
+
+###############################################################################
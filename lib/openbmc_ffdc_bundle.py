@@ -0,0 +1,429 @@
+#!/usr/bin/env python
+
+r"""
+This module collects the BMC's FFDC_BMC_CMD and FFDC_BMC_FILE data (see
+openbmc_ffdc_list.py) as a single bundle.
+
+Rather than running one remote command per entry, a single shell script
+which runs every command is generated (see create_bundle_script).  The
+script is run on the BMC in one exec and writes a (possibly gzipped) tar
+stream containing each command's stdout, stderr, return code and duration.
+Each command's stdout is streamed out in chunks as it is produced so that no
+more than one chunk is ever held in the BMC's /tmp (which is in RAM).  The
+stream is unpacked locally into the usual <prefix><name>.txt FFDC files as
+it arrives (see unpack_bundle).
+"""
+
+import os
+import tarfile
+import tempfile
+import shutil
+import StringIO
+import collections
+
+import gen_misc as gm
+import openbmc_ffdc_list as ffdc_list
+
+# Text used by openbmc_ffdc_utils.robot to format the FFDC report.
+footer_msg = "\n" + "-" * 72 + " \n"
+
+# The maximum number of bytes of a command's stdout which the bundle script
+# holds in the BMC's /tmp at once (see bundle_script_prolog).
+bundle_chunk_bytes = 1024 * 1024
+# The size of each read which the bundle script makes of a command's stdout.
+bundle_block_bytes = 64 * 1024
+
+# The shell functions used by the bundle script.  run_entry runs a command
+# and writes a tar archive to stdout for each chunk of its stdout
+# (<entry ID>.out.<part number>) as the chunk is produced.  Once the command
+# has finished, it writes a tar archive of its stderr (<entry ID>.err) and
+# "<rc> <start uptime> <end uptime>" (<entry ID>.meta).  Each file is removed
+# as soon as it has been written to the stream.
+# Each chunk is read with dd, which reads at most one block per read call.
+# A tool which reads through stdio (e.g. busybox's head) may read past the end
+# of a chunk and so lose the data it has buffered when it exits.  Where dd
+# supports iflag=fullblock, each chunk is exactly block_count blocks long.
+# Otherwise a short read from the pipe counts as a block and the chunk is
+# merely shorter.
+bundle_script_prolog = r"""
+if dd if=/dev/null of=/dev/null iflag=fullblock 2> /dev/null ; then
+    dd_flags="iflag=fullblock"
+else
+    dd_flags=""
+fi
+bundle_dir_path=$(mktemp -d /tmp/ffdc_bundle.XXXXXX) || exit 1
+trap 'rm -rf ${bundle_dir_path}' EXIT
+cd ${bundle_dir_path} || exit 1
+
+get_uptime() {
+    read uptime idle_time < /proc/uptime
+    echo ${uptime}
+}
+
+run_entry() {
+    start_time=$(get_uptime)
+    { sh -c "$2" 2> $1.err < /dev/null ; echo $? > $1.rc ; } | {
+        part=0
+        while dd of=$1.out.${part} bs=${block_bytes} count=${block_count} \
+                 ${dd_flags} 2> /dev/null && [ -s $1.out.${part} ] ; do
+            tar -cf - $1.out.${part}
+            rm -f $1.out.${part}
+            part=$((part + 1))
+        done
+        rm -f $1.out.${part}
+    }
+    echo "$(cat $1.rc) ${start_time} $(get_uptime)" > $1.meta
+    tar -cf - $1.err $1.meta
+    rm -f $1.err $1.meta $1.rc
+}
+"""
+
+
+###############################################################################
+def create_bundle_entries(include_manifest=1,
+                          include_files=1,
+                          exclude_names=()):
+
+    r"""
+    Return a list of bundle entry dictionaries for the FFDC_BMC_CMD (manifest)
+    and/or FFDC_BMC_FILE commands.
+
+    Each dictionary contains the following keys:
+    entry_id                        A unique ID which is safe to use in a
+                                    file name (e.g. "e3").
+    kind                            "manifest" or "file".
+    index                           The dictionary index (e.g. "BMC DATA").
+    name                            The entry name (e.g. "BMC Uptime" or
+                                    "BMC_journalctl").
+    cmd_buf                         The command to be run.
+
+    Description of arguments:
+    include_manifest                Include the FFDC_BMC_CMD commands.
+    include_files                   Include the FFDC_BMC_FILE commands.
+    exclude_names                   The names of any entries to be left out
+                                    (e.g. because they are collected some
+                                    other way).
+    """
+
+    entries = []
+    sources = []
+    if include_manifest:
+        sources.append(('manifest', ffdc_list.FFDC_BMC_CMD))
+    if include_files:
+        sources.append(('file', ffdc_list.FFDC_BMC_FILE))
+    for kind, cmd_dict in sources:
+        for index in cmd_dict.keys():
+            for name, cmd_buf in cmd_dict[index].items():
+                if name in exclude_names:
+                    continue
+                entries.append(collections.OrderedDict(
+                    [('entry_id', "e" + str(len(entries) + 1)),
+                     ('kind', kind), ('index', index), ('name', name),
+                     ('cmd_buf', cmd_buf)]))
+
+    return entries
+
+###############################################################################
+
+
+###############################################################################
+def quote_shell_arg(buffer):
+
+    r"""
+    Return the given buffer quoted so that the shell will treat it as a single
+    literal argument.
+
+    Description of arguments:
+    buffer                          The string to be quoted.
+    """
+
+    return "'" + buffer.replace("'", "'\\''") + "'"
+
+###############################################################################
+
+
+###############################################################################
+def create_bundle_script(entries,
+                         compress=1):
+
+    r"""
+    Return a shell script which runs the command of each of the given bundle
+    entries and writes a stream of tar archives of the results to stdout (see
+    bundle_script_prolog).  The archives of each entry are written as soon as
+    its command has finished, with <entry_id>.err and <entry_id>.meta last.
+
+    Description of arguments:
+    entries                         A list of bundle entry dictionaries (see
+                                    create_bundle_entries).
+    compress                        Compress the stream with gzip if gzip is
+                                    available on the BMC.
+    """
+
+    buffer = "block_bytes=" + str(bundle_block_bytes) + "\n" +\
+        "block_count=" +\
+        str(max(bundle_chunk_bytes // bundle_block_bytes, 1)) + "\n" +\
+        bundle_script_prolog
+    if compress:
+        buffer += "if which gzip > /dev/null 2>&1 ; then\n" +\
+            "    compress() { gzip -c ; }\n" +\
+            "else\n" +\
+            "    compress() { cat ; }\n" +\
+            "fi\n"
+    buffer += "{\n"
+    for entry in entries:
+        buffer += "run_entry " + entry['entry_id'] + " " +\
+            quote_shell_arg(entry['cmd_buf']) + "\n"
+    if compress:
+        buffer += "} | compress\n"
+    else:
+        buffer += "}\n"
+
+    return buffer
+
+###############################################################################
+
+
+class stream_reader:
+
+    r"""
+    This class provides a file-like read method for a stream whose reads must
+    honor a deadline (e.g. an SSH channel).
+    """
+
+    def __init__(self,
+                 recv_func,
+                 time_left_func=None,
+                 set_timeout_func=None):
+
+        r"""
+        Create a stream_reader object.
+
+        Description of arguments:
+        recv_func                   A function which takes a maximum number of
+                                    bytes and returns up to that many bytes
+                                    or "" at the end of the stream (e.g. a
+                                    paramiko channel's recv method).
+        time_left_func              A function which returns the number of
+                                    seconds left before the deadline (and
+                                    which raises an exception once it has
+                                    passed).
+        set_timeout_func            A function which sets the timeout for the
+                                    next call to recv_func (e.g. a paramiko
+                                    channel's settimeout method).
+        """
+
+        self.__recv_func = recv_func
+        self.__time_left_func = time_left_func
+        self.__set_timeout_func = set_timeout_func
+        self.num_bytes = 0
+
+    def read(self,
+             num_bytes=65536):
+
+        r"""
+        Return up to num_bytes bytes, returning fewer only at the end of the
+        stream.
+
+        Description of arguments:
+        num_bytes                   The number of bytes to be read.
+        """
+
+        chunks = []
+        num_bytes_left = num_bytes
+        while num_bytes_left > 0:
+            if self.__time_left_func is not None:
+                time_left = self.__time_left_func()
+                if self.__set_timeout_func is not None:
+                    self.__set_timeout_func(time_left)
+            chunk = self.__recv_func(min(num_bytes_left, 65536))
+            if chunk == "":
+                break
+            chunks.append(chunk)
+            num_bytes_left -= len(chunk)
+        buffer = "".join(chunks)
+        self.num_bytes += len(buffer)
+
+        return buffer
+
+
+###############################################################################
+def write_entry_output(file_obj,
+                       member_obj,
+                       stderr):
+
+    r"""
+    Copy an entry's stdout from the given file object to the given file in the
+    same format as "Execute Command and Write FFDC" in
+    openbmc_ffdc_methods.robot.  Like SSHLibrary's "Execute Command", one
+    trailing newline is stripped from the stdout.  Return the number of bytes
+    of stdout.
+
+    Description of arguments:
+    file_obj                        The file object to be written.
+    member_obj                      A file object from which the entry's
+                                    stdout may be read.
+    stderr                          The entry's stderr.
+    """
+
+    if stderr != "":
+        file_obj.write("ERROR output:\n" + stderr + "\nOutput:\n")
+    num_bytes = 0
+    # The last byte is held back until we know whether it is the final one.
+    last_byte = ""
+    for chunk in iter(lambda: member_obj.read(65536), ""):
+        file_obj.write(last_byte + chunk[:-1])
+        last_byte = chunk[-1]
+        num_bytes += len(chunk)
+    if last_byte != "\n":
+        file_obj.write(last_byte)
+    file_obj.write("\n")
+
+    return num_bytes
+
+###############################################################################
+
+
+###############################################################################
+def unpack_bundle(fileobj,
+                  entries,
+                  log_prefix,
+                  ffdc_file_path,
+                  open_file_func=None):
+
+    r"""
+    Unpack the tar stream produced by a bundle script (see
+    create_bundle_script) and return a list of entry results dictionaries.
+
+    The stdout of each entry is spooled (to disk if it is large) as it is
+    read since its stderr, which precedes it in the FFDC file, arrives after
+    it.  Once the entry's command has finished, the output of a "file" entry
+    is written to <log_prefix><name>.txt (via open_file_func if given).  The
+    output of the "manifest" entries is appended to ffdc_file_path in the
+    same format as "BMC FFDC Manifest" once the stream has been read.
+
+    Each dictionary returned contains the keys of the bundle entry (see
+    create_bundle_entries) and the following:
+    rc                              The command's return code (or None if the
+                                    command's results were not found in the
+                                    stream).
+    duration                        The number of seconds the command ran on
+                                    the BMC.
+    stdout_bytes                    The number of bytes of stdout.
+    stderr_bytes                    The number of bytes of stderr.
+    file_path                       The path of the file the output was
+                                    written to.  This may differ from
+                                    <log_prefix><name>.txt if open_file_func
+                                    compresses the data (see
+                                    openbmc_ffdc_writer.py).
+
+    Description of arguments:
+    fileobj                         A file-like object from which the
+                                    stream of tar archives may be read (e.g.
+                                    a stream_reader).
+    entries                         The bundle entries which were passed to
+                                    create_bundle_script.
+    log_prefix                      The FFDC directory path and prefix.
+    ffdc_file_path                  The path of the FFDC report file.
+    open_file_func                  A function which takes a file path and
+                                    returns a writable file-like object
+                                    having close and file_path attributes
+                                    (e.g. ffdc_engine.open_ffdc_file).  If
+                                    this is None, the built-in open function
+                                    is used.
+    """
+
+    entry_results = collections.OrderedDict()
+    for entry in entries:
+        results = collections.OrderedDict(entry)
+        results['rc'] = None
+        results['duration'] = 0.0
+        results['stdout_bytes'] = 0
+        results['stderr_bytes'] = 0
+        if entry['kind'] == 'manifest':
+            results['file_path'] = ffdc_file_path
+        else:
+            results['file_path'] = log_prefix + entry['name'] + ".txt"
+        entry_results[entry['entry_id']] = results
+
+    stderrs = {}
+    manifest_outputs = {}
+    spool_file_objs = {}
+    # The stream is a series of tar archives so the end-of-archive blocks
+    # between them must be skipped (ignore_zeros).
+    tar_obj = tarfile.open(fileobj=fileobj, mode='r|*', ignore_zeros=True)
+    try:
+        for member in tar_obj:
+            # The member names are <entry_id>.out.<part number>,
+            # <entry_id>.err and <entry_id>.meta.
+            name_parts = os.path.basename(member.name).split(".")
+            entry_id = name_parts[0]
+            ext = "." + name_parts[1] if len(name_parts) > 1 else ""
+            if entry_id not in entry_results or not member.isfile():
+                continue
+            results = entry_results[entry_id]
+            member_obj = tar_obj.extractfile(member)
+            if ext == ".out":
+                if entry_id not in spool_file_objs:
+                    spool_file_objs[entry_id] = \
+                        tempfile.SpooledTemporaryFile(1024 * 1024)
+                shutil.copyfileobj(member_obj, spool_file_objs[entry_id],
+                                   65536)
+            elif ext == ".err":
+                stderrs[entry_id] =\
+                    gm.strip_trailing_newline(member_obj.read())
+                results['stderr_bytes'] = len(stderrs[entry_id])
+            elif ext == ".meta":
+                rc, start_time, end_time = member_obj.read().split()
+                results['rc'] = int(rc)
+                results['duration'] = round(float(end_time) -
+                                            float(start_time), 2)
+                # The .meta member is the entry's last so its stdout is
+                # complete.
+                spool_file_obj = spool_file_objs.pop(entry_id, None)
+                if spool_file_obj is None:
+                    spool_file_obj = StringIO.StringIO()
+                spool_file_obj.seek(0)
+                try:
+                    if results['kind'] == 'manifest':
+                        manifest_outputs[entry_id] = \
+                            gm.strip_trailing_newline(spool_file_obj.read())
+                        results['stdout_bytes'] = \
+                            len(manifest_outputs[entry_id])
+                    else:
+                        if open_file_func is None:
+                            file_obj = open(results['file_path'], 'w')
+                        else:
+                            file_obj = open_file_func(results['file_path'])
+                            results['file_path'] = file_obj.file_path
+                        try:
+                            results['stdout_bytes'] = \
+                                write_entry_output(file_obj, spool_file_obj,
+                                                   stderrs.get(entry_id, ""))
+                        finally:
+                            file_obj.close()
+                finally:
+                    spool_file_obj.close()
+    finally:
+        for spool_file_obj in spool_file_objs.values():
+            spool_file_obj.close()
+        tar_obj.close()
+
+    manifest_results = [results for results in entry_results.values()
+                        if results['kind'] == 'manifest']
+    if len(manifest_results):
+        with open(ffdc_file_path, 'a') as file_obj:
+            for results in manifest_results:
+                file_obj.write(footer_msg + results['index'].upper() +
+                               " : " + results['name'] + "\t" +
+                               "Executed : " + results['cmd_buf'] +
+                               footer_msg)
+                stderr = stderrs.get(results['entry_id'], "")
+                if stderr != "":
+                    file_obj.write("ERROR output:\n" + stderr +
+                                   "\nOutput:\n")
+                file_obj.write(manifest_outputs.get(results['entry_id'], "") +
+                               "\n")
+
+    return entry_results.values()
+
+###############################################################################
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+
+r"""
+This module retrieves the BMC's core files for FFDC.
+
+- The core files are listed with their sizes and modification times.
+- A core file which has already been retrieved (same name, size and SHA-256
+  digest) is not retrieved again.  A registry of retrieved core files is
+  kept for each BMC host.
+- Each core file is streamed through "gzip -c" on the BMC (when gzip is
+  available) and decompressed and hashed locally as it arrives.
+- If the stream is cut off (e.g. the SSH connection drops), the transfer is
+  resumed from the last byte received rather than restarted.
+- The total number of bytes retrieved is limited by a size budget.  The
+  newest core files are retrieved first.
+"""
+
+import os
+import socket
+import zlib
+import hashlib
+import StringIO
+import collections
+
+import openbmc_ffdc_bundle as ffdc_bundle
+import openbmc_ffdc_journal as ffdc_journal
+
+# The BMC's core files.
+core_file_glob = "/tmp/core_*"
+
+
+class core_stream_sink:
+
+    r"""
+    This class takes the (possibly gzipped) stream of a core file as it
+    arrives, decompresses it, hashes it and writes it to a file object.
+    """
+
+    def __init__(self,
+                 file_obj,
+                 compressed=1):
+
+        r"""
+        Create a core_stream_sink object.
+
+        Description of arguments:
+        file_obj                    The file object to which the core file
+                                    data is to be written.
+        compressed                  The stream is gzipped.
+        """
+
+        self.file_obj = file_obj
+        self.compressed = compressed
+        self.sha = hashlib.sha256()
+        self.num_bytes = 0
+        self.wire_bytes = 0
+        self.__decompress_obj = None
+        self.new_stream()
+
+    def new_stream(self):
+
+        r"""
+        Prepare for a new stream (i.e. a resumed transfer).
+        """
+
+        if self.compressed:
+            # 16 + MAX_WBITS tells zlib to expect a gzip header.
+            self.__decompress_obj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def write(self,
+              buffer):
+
+        r"""
+        Process the given part of the stream.
+
+        Description of arguments:
+        buffer                      The data received.
+        """
+
+        self.wire_bytes += len(buffer)
+        if self.compressed:
+            buffer = self.__decompress_obj.decompress(buffer)
+        self.file_obj.write(buffer)
+        self.sha.update(buffer)
+        self.num_bytes += len(buffer)
+
+
+###############################################################################
+def parse_core_list(buffer):
+
+    r"""
+    Return a list of core file dictionaries (with path, name, size and mtime
+    keys) from the output of the command returned by get_list_cmd, newest
+    first.
+
+    Description of arguments:
+    buffer                          The command's output.
+    """
+
+    cores = []
+    for line in buffer.splitlines():
+        fields = line.split()
+        if len(fields) != 3 or not fields[1].isdigit():
+            continue
+        cores.append(collections.OrderedDict(
+            [('path', fields[0]), ('name', os.path.basename(fields[0])),
+             ('size', int(fields[1])), ('mtime', int(fields[2]))]))
+
+    return sorted(cores, key=lambda core: core['mtime'], reverse=True)
+
+###############################################################################
+
+
+###############################################################################
+def get_list_cmd():
+
+    r"""
+    Return a command which lists the BMC's core files, one per line, as
+    "<path> <size> <mtime>".
+    """
+
+    return "for file_path in " + core_file_glob + " ; do" +\
+        " [ -f ${file_path} ] && stat -c '%n %s %Y' ${file_path} ; done"
+
+###############################################################################
+
+
+###############################################################################
+def get_stream_cmd(core_path,
+                   offset=0,
+                   compress=1):
+
+    r"""
+    Return a command which writes the given core file, starting at the given
+    offset, to stdout.
+
+    Description of arguments:
+    core_path                       The path of the core file on the BMC.
+    offset                          The number of bytes to be skipped.
+    compress                        Gzip the output.
+    """
+
+    cmd_buf = "tail -c +" + str(offset + 1) + " " +\
+        ffdc_bundle.quote_shell_arg(core_path)
+    if compress:
+        cmd_buf += " | gzip -c"
+
+    return cmd_buf
+
+###############################################################################
+
+
+###############################################################################
+def run_cmd(exec_func,
+            cmd_buf):
+
+    r"""
+    Run the given command with exec_func and return its stdout, stderr and
+    return code.
+
+    Description of arguments:
+    exec_func                       See collect_core_files.
+    cmd_buf                         The command to be run.
+    """
+
+    stdout_file_obj = StringIO.StringIO()
+    stderr, rc = exec_func(cmd_buf, stdout_file_obj)
+
+    return stdout_file_obj.getvalue(), stderr, rc
+
+###############################################################################
+
+
+###############################################################################
+def get_remote_digest(exec_func,
+                      core_path):
+
+    r"""
+    Return the SHA-256 hex digest of the given core file on the BMC (or "" if
+    it cannot be computed).
+
+    Description of arguments:
+    exec_func                       See collect_core_files.
+    core_path                       The path of the core file on the BMC.
+    """
+
+    stdout, stderr, rc = run_cmd(exec_func, "sha256sum " +
+                                 ffdc_bundle.quote_shell_arg(core_path))
+    if rc != 0 or stdout == "":
+        return ""
+
+    return stdout.split()[0]
+
+###############################################################################
+
+
+###############################################################################
+def retrieve_core_file(exec_func,
+                       core,
+                       file_obj,
+                       compress=1,
+                       max_attempts=3):
+
+    r"""
+    Stream the given core file from the BMC to file_obj, resuming from the
+    last byte received if the stream is cut off.  Return a dictionary with
+    the following keys:
+    digest                          The SHA-256 hex digest of the data
+                                    received.
+    bytes                           The number of bytes received.
+    wire_bytes                      The number of bytes sent by the BMC
+                                    (after compression).
+    attempts                        The number of streams needed.
+
+    Raise IOError if the whole file has not been received after max_attempts
+    streams.
+
+    Description of arguments:
+    exec_func                       See collect_core_files.
+    core                            A core file dictionary (see
+                                    parse_core_list).
+    file_obj                        The file object to which the core file is
+                                    to be written.
+    compress                        Gzip the core file on the BMC.
+    max_attempts                    The maximum number of streams to be run.
+    """
+
+    sink = core_stream_sink(file_obj, compress)
+    attempts = 0
+    error = ""
+    while sink.num_bytes < core['size'] and attempts < max_attempts:
+        attempts += 1
+        sink.new_stream()
+        num_bytes = sink.num_bytes
+        try:
+            stderr, rc = exec_func(get_stream_cmd(core['path'],
+                                                  sink.num_bytes, compress),
+                                   sink)
+            error = stderr
+        except socket.timeout:
+            # The collector's budget has been exhausted.
+            raise
+        except zlib.error as exception:
+            # A stream which was cut off mid-block.  The data decompressed so
+            # far is good.
+            error = str(exception)
+        except EnvironmentError as exception:
+            error = str(exception)
+        if sink.num_bytes == num_bytes and error != "":
+            # No progress was made so the BMC (rather than the connection)
+            # is at fault.
+            break
+    if sink.num_bytes < core['size']:
+        raise IOError("Only " + str(sink.num_bytes) + " of the " +
+                      str(core['size']) + " bytes of " + core['path'] +
+                      " were received after " + str(attempts) +
+                      " attempts.  " + error)
+
+    return collections.OrderedDict([('digest', sink.sha.hexdigest()),
+                                    ('bytes', sink.num_bytes),
+                                    ('wire_bytes', sink.wire_bytes),
+                                    ('attempts', attempts)])
+
+###############################################################################
+
+
+###############################################################################
+def collect_core_files(exec_func,
+                       registry_file_path,
+                       log_prefix,
+                       open_file_func=None,
+                       max_bytes=0,
+                       remove=1):
+
+    r"""
+    Retrieve the BMC's core files and return a list of core results
+    dictionaries, one per core file found.
+
+    Each dictionary contains the keys of the core file dictionary (see
+    parse_core_list) and the following:
+    status                          "retrieved", "duplicate" (already
+                                    retrieved by an earlier FFDC
+                                    collection), "over_budget" or "failed".
+    file_path                       The path of the local copy of the core
+                                    file (or "").  For a duplicate, this is
+                                    the path of the earlier copy.
+    digest                          The SHA-256 hex digest of the core file.
+    wire_bytes                      The number of bytes sent by the BMC.
+    attempts                        The number of streams needed.
+    error                           A description of any failure.
+
+    Description of arguments:
+    exec_func                       A function which runs a command on the
+                                    BMC.  It is called with the command and a
+                                    file-like object for the command's stdout
+                                    and must return the command's stderr and
+                                    return code.  It should raise an
+                                    EnvironmentError (e.g. socket.error) if
+                                    the connection fails.
+    registry_file_path              The path of the JSON file in which the
+                                    retrieved core files are recorded.
+    log_prefix                      The FFDC directory path and prefix.
+    open_file_func                  A function which takes a file path and
+                                    returns a writable file-like object
+                                    having close and file_path attributes
+                                    (e.g. an openbmc_ffdc_writer
+                                    .ffdc_file_writer).  If this is None,
+                                    the built-in open function is used.
+    max_bytes                       The maximum total number of bytes of core
+                                    files to be retrieved.  0 means no limit.
+    remove                          Remove each core file from the BMC once it
+                                    has been retrieved (or found to be a
+                                    duplicate).
+    """
+
+    stdout, stderr, rc = run_cmd(exec_func, get_list_cmd())
+    cores = parse_core_list(stdout)
+    if not len(cores):
+        return []
+
+    registry = ffdc_journal.read_json_file(registry_file_path,
+                                           collections.OrderedDict())
+    compress = run_cmd(exec_func, "which gzip")[2] == 0
+    num_bytes_left = max_bytes
+    core_results_list = []
+    for core in cores:
+        core_results = collections.OrderedDict(core)
+        core_results.update([('status', ""), ('file_path', ""),
+                             ('digest', ""), ('wire_bytes', 0),
+                             ('attempts', 0), ('error', "")])
+        core_results_list.append(core_results)
+
+        previous = registry.get(core['name'])
+        if previous is not None and previous['size'] == core['size']:
+            digest = get_remote_digest(exec_func, core['path'])
+            if digest == previous['digest']:
+                core_results['status'] = "duplicate"
+                core_results['file_path'] = previous['file_path']
+                core_results['digest'] = digest
+                if remove:
+                    run_cmd(exec_func, "rm -f " +
+                            ffdc_bundle.quote_shell_arg(core['path']))
+                continue
+
+        if max_bytes and core['size'] > num_bytes_left:
+            core_results['status'] = "over_budget"
+            core_results['error'] = "The core file's " + str(core['size']) +\
+                " bytes exceed the " + str(num_bytes_left) + " bytes left" +\
+                " in the core file budget."
+            continue
+
+        file_path = log_prefix + core['name']
+        if open_file_func is None:
+            file_obj = open(file_path, 'wb')
+        else:
+            file_obj = open_file_func(file_path)
+            file_path = file_obj.file_path
+        # The file is left in place, even if incomplete, for analysis.
+        core_results['file_path'] = file_path
+        try:
+            transfer = retrieve_core_file(exec_func, core, file_obj,
+                                          compress)
+        except socket.timeout:
+            raise
+        except IOError as exception:
+            core_results['status'] = "failed"
+            core_results['error'] = str(exception)
+            continue
+        finally:
+            file_obj.close()
+        num_bytes_left -= transfer['bytes']
+        core_results['status'] = "retrieved"
+        core_results['digest'] = transfer['digest']
+        core_results['wire_bytes'] = transfer['wire_bytes']
+        core_results['attempts'] = transfer['attempts']
+        registry[core['name']] = collections.OrderedDict(
+            [('size', core['size']), ('mtime', core['mtime']),
+             ('digest', core_results['digest']), ('file_path', file_path)])
+        ffdc_journal.write_json_file(registry_file_path, registry)
+        if remove:
+            # Remove the file from the BMC to avoid re-copying it on the next
+            # FFDC call.
+            run_cmd(exec_func, "rm -f " +
+                    ffdc_bundle.quote_shell_arg(core['path']))
+
+    return core_results_list
+
+###############################################################################
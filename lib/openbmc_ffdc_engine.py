@@ -0,0 +1,1290 @@
+#!/usr/bin/env python
+
+r"""
+This module provides an FFDC (First Failure Data Capture) engine which runs
+the collectors described by the dictionaries in openbmc_ffdc_list.py
+concurrently rather than one keyword at a time.
+
+- BMC commands are run on separate SSH channels of a single SSH transport.
+- REST GET requests share one logged-in, connection-pooled session (see
+  rest_session.py).
+- OS commands are run on their own SSH transport alongside the BMC
+  collectors.
+- Optionally, all of the BMC commands are run as a single bundle (see
+  openbmc_ffdc_bundle.py).
+- Optionally, the BMC journal is collected incrementally (see
+  openbmc_ffdc_journal.py).
+
+Command output is streamed to disk through openbmc_ffdc_writer.py which can
+compress it and which enforces the per-file and per-FFDC byte budgets.
+
+Each collector runs in its own thread with its own time budget and any
+failure is confined to that collector.  Collectors are started in priority
+order (see FFDC_COLLECTOR_PRIORITY in openbmc_ffdc_list.py) and, if an
+overall deadline is given, any collector which no longer fits in the time
+left is skipped.  A summary of every collector is
+written to the FFDC index file (<ffdc_prefix>ffdc_index.json).
+
+This module does not depend on Robot Framework so that its collectors may
+run in worker threads.  See openbmc_ffdc.py for the Robot interface.
+"""
+
+import os
+import time
+import contextlib
+import tempfile
+import json
+import socket
+import threading
+import Queue
+import heapq
+import collections
+
+import paramiko
+
+import gen_print as gp
+import gen_cmd as gc
+import openbmc_ffdc_list as ffdc_list
+import openbmc_ffdc_bundle as ffdc_bundle
+import openbmc_ffdc_writer as ffdc_writer
+import openbmc_ffdc_journal as ffdc_journal
+import openbmc_ffdc_cores as ffdc_cores
+import rest_session
+import ssh_pool
+
+# The FFDC_METHOD_CALL keywords which this engine implements.  Any other
+# keyword must be run by the caller (see run_ffdc_methods).
+engine_keywords = ['BMC FFDC Manifest', 'BMC FFDC Files',
+                   'BMC FFDC Get Requests', 'OS FFDC Files',
+                   'SCP Coredump Files', 'Collect eSEL Log']
+
+# The FFDC_METHOD_CALL keywords whose work is done by a single bundle
+# collector when bundle mode is in effect (see ffdc_engine).
+bundle_keywords = ['BMC FFDC Manifest', 'BMC FFDC Files']
+
+# The default number of seconds that each kind of collector may run.
+default_budgets = {'bmc': 120, 'os': 120, 'rest': 30, 'core': 300,
+                   'bundle': 300}
+
+# The default priority and estimated cost in seconds of each kind of
+# collector (see FFDC_COLLECTOR_PRIORITY in openbmc_ffdc_list.py).
+default_priorities = {'bmc': 4, 'os': 6, 'rest': 5, 'core': 7, 'bundle': 1}
+default_costs = {'bmc': 2, 'os': 5, 'rest': 5, 'core': 60, 'bundle': 20}
+
+# Text used by openbmc_ffdc_utils.robot to format the FFDC report.
+print_line = "-" * 72
+footer_msg = "\n" + print_line + " \n"
+
+# The URI of the BMC's error log entries (see data/variables.py).
+logging_entry_uri = '/xyz/openbmc_project/logging/entry/'
+
+
+class ffdc_collector:
+
+    r"""
+    This class describes one unit of FFDC collection work.
+    """
+
+    def __init__(self,
+                 name,
+                 description,
+                 channel,
+                 function,
+                 args=(),
+                 budget=None,
+                 priority=None,
+                 cost=None):
+
+        r"""
+        Create an ffdc_collector object.
+
+        Description of arguments:
+        name                        The name of the collector (e.g.
+                                    "BMC_journalctl").  This normally
+                                    matches the name of the FFDC file it
+                                    writes.
+        description                 The FFDC_METHOD_CALL description to which
+                                    the collector belongs (e.g. "BMC Specific
+                                    Files").
+        channel                     The resource the collector uses:
+                                    "bmc", "os", "rest", "core" or
+                                    "bundle".  This selects the default
+                                    budget.
+        function                    The function which does the work.  It is
+                                    called with the ffdc_engine object, this
+                                    collector object and then args and
+                                    returns a list of the paths of the files
+                                    it wrote.
+        args                        Additional arguments for function.
+        budget                      The maximum number of seconds the
+                                    collector may run.  Defaults to
+                                    default_budgets[channel].
+        priority                    The collector's priority (1 is the
+                                    highest).  Defaults to the value in
+                                    FFDC_COLLECTOR_PRIORITY or to
+                                    default_priorities[channel].
+        cost                        The estimated number of seconds the
+                                    collector will take.  Defaults to the
+                                    value in FFDC_COLLECTOR_PRIORITY or to
+                                    default_costs[channel].
+        """
+
+        self.name = name
+        self.description = description
+        self.channel = channel
+        self.function = function
+        self.args = args
+        if budget is None:
+            budget = default_budgets[channel]
+        self.budget = budget
+        default_priority, default_cost = \
+            ffdc_list.FFDC_COLLECTOR_PRIORITY.get(
+                name, (default_priorities[channel], default_costs[channel]))
+        if priority is None:
+            priority = default_priority
+        self.priority = priority
+        if cost is None:
+            cost = default_cost
+        self.cost = cost
+        self.deadline = None
+        # The collector's budget before it was cut to fit the FFDC deadline
+        # (see ffdc_engine.skip_reason).
+        self.original_budget = None
+        # The collector function may record details of its work here (e.g.
+        # per-command results).  They are copied to the FFDC index.
+        self.details = []
+
+    def time_left(self):
+
+        r"""
+        Return the number of seconds left in this collector's budget.
+        Raise socket.timeout if the budget has been exhausted.
+        """
+
+        time_left = self.deadline - gp.monotonic_time()
+        if time_left <= 0:
+            raise socket.timeout(self.name + " exceeded its budget of " +
+                                 str(self.budget) + " seconds.")
+
+        return time_left
+
+
+class ffdc_engine:
+
+    r"""
+    This class runs FFDC collectors concurrently and owns the SSH transports
+    and REST session they share.
+    """
+
+    def __init__(self,
+                 ffdc_dir_path,
+                 ffdc_prefix,
+                 openbmc_host,
+                 openbmc_username,
+                 openbmc_password,
+                 ssh_port=22,
+                 https_port="",
+                 dbus_prefix="",
+                 os_host="",
+                 os_username="",
+                 os_password="",
+                 max_workers=8,
+                 max_ssh_channels=4,
+                 bundle=0,
+                 compression="",
+                 max_file_bytes=0,
+                 max_ffdc_bytes=0,
+                 journal_dir_path="",
+                 deadline=0,
+                 state_dir_path="",
+                 max_core_bytes=0,
+                 remove_core_files=1):
+
+        r"""
+        Create an ffdc_engine object.
+
+        Description of arguments:
+        ffdc_dir_path               The directory path where the FFDC files
+                                    are to be written.
+        ffdc_prefix                 The prefix to be given to each FFDC file
+                                    name.
+        openbmc_host                The BMC host name or IP address.
+        openbmc_username            The BMC user name.
+        openbmc_password            The BMC password.
+        ssh_port                    The BMC SSH port.
+        https_port                  The BMC HTTPS port ("" for the default).
+        dbus_prefix                 A prefix for REST URIs (see
+                                    rest_client.robot).
+        os_host                     The OS host name or IP address.  If this
+                                    is "", no OS FFDC is collected.
+        os_username                 The OS user name.
+        os_password                 The OS password.
+        max_workers                 The maximum number of collectors which may
+                                    run at once.
+        max_ssh_channels            The maximum number of SSH channels which
+                                    may be open at once on each SSH
+                                    transport.
+        bundle                      Collect the "BMC FFDC Manifest" and "BMC
+                                    FFDC Files" data with a single bundle
+                                    script (see openbmc_ffdc_bundle.py)
+                                    rather than one command at a time.
+        compression                 The compression to be used for FFDC files
+                                    ("", "gz" or "xz").  See
+                                    openbmc_ffdc_writer.get_compression.
+        max_file_bytes              The maximum number of bytes of data to be
+                                    stored in each FFDC file.  The head and
+                                    tail of larger data are kept.  0 means no
+                                    limit.
+        max_ffdc_bytes              The maximum number of bytes of data to be
+                                    stored in all of the FFDC files written
+                                    by this engine.  0 means no limit.
+        journal_dir_path            The journal store directory path.  If
+                                    this is not "", the BMC journal is
+                                    collected incrementally (see
+                                    openbmc_ffdc_journal.py) rather than by
+                                    the "BMC_journalctl" command.
+        deadline                    The maximum number of seconds that all of
+                                    the collectors together may take.
+                                    Collectors whose budgets extend beyond
+                                    the deadline have their budgets cut and
+                                    collectors whose estimated costs do not
+                                    fit in the time left are skipped.  0
+                                    means no deadline.
+        state_dir_path              The directory in which state kept from
+                                    one FFDC collection to the next (e.g.
+                                    the registry of the core files already
+                                    retrieved) is stored.  Defaults to
+                                    ffdc_dir_path.
+        max_core_bytes              The maximum total number of bytes of core
+                                    files to be retrieved.  0 means no limit.
+        remove_core_files           Remove the core files from the BMC once
+                                    they have been retrieved.
+        """
+
+        self.ffdc_dir_path = ffdc_dir_path
+        self.ffdc_prefix = ffdc_prefix
+        self.log_prefix = ffdc_dir_path + ffdc_prefix
+        self.hosts = {'bmc': (openbmc_host, int(ssh_port or 22),
+                              openbmc_username, openbmc_password),
+                      'os': (os_host, 22, os_username, os_password)}
+        self.base_url = "https://" + openbmc_host
+        if https_port:
+            self.base_url += ":" + str(https_port)
+        self.dbus_prefix = dbus_prefix
+        self.max_workers = max_workers
+        self.bundle = int(bundle)
+        self.compression = ffdc_writer.get_compression(compression)
+        self.max_file_bytes = int(max_file_bytes)
+        self.byte_budget = ffdc_writer.ffdc_byte_budget(int(max_ffdc_bytes))
+        self.journal_dir_path = journal_dir_path
+        self.deadline = float(deadline or 0)
+        self.state_dir_path = os.path.normpath(state_dir_path or
+                                               ffdc_dir_path) + os.sep
+        self.max_core_bytes = int(max_core_bytes or 0)
+        self.remove_core_files = int(remove_core_files)
+        self.__writers = {}
+        self.ffdc_file_path = self.log_prefix + "BMC_general.txt"
+        self.index_file_path = self.log_prefix + "ffdc_index.json"
+
+        # Each host and the REST session has its own lock so that, for
+        # example, an OS host which is slow to connect does not hold up the
+        # BMC collectors.
+        self.__locks = {'bmc': threading.Lock(), 'os': threading.Lock(),
+                        'rest': threading.Lock(), 'writers': threading.Lock()}
+        self.__transports = {}
+        # The exception raised by the last failed attempt to connect to each
+        # host.  Once a host has failed to connect, its remaining collectors
+        # fail at once rather than each waiting for a connection timeout.
+        self.__connect_errors = {}
+        self.__channel_slots = {
+            'bmc': threading.BoundedSemaphore(max_ssh_channels),
+            'os': threading.BoundedSemaphore(max_ssh_channels)}
+        self.__rest_session = None
+        self.__queue = Queue.Queue()
+
+    def get_transport(self,
+                      host_key,
+                      timeout=30):
+
+        r"""
+        Return the SSH transport for the given host, connecting and logging in
+        if necessary.
+
+        Description of arguments:
+        host_key                    "bmc" or "os".
+        timeout                     The number of seconds to allow for
+                                    connecting.
+        """
+
+        with self.__locks[host_key]:
+            transport = self.__transports.get(host_key)
+            if transport is not None and transport.is_active():
+                return transport
+            if host_key in self.__connect_errors:
+                raise self.__connect_errors[host_key]
+            host, port, username, password = self.hosts[host_key]
+            try:
+                sock = socket.create_connection((host, port), timeout)
+                transport = paramiko.Transport(sock)
+                transport.connect(username=username, password=password)
+            except Exception as exception:
+                self.__connect_errors[host_key] = exception
+                raise
+            transport.set_keepalive(30)
+            self.__transports[host_key] = transport
+
+            return transport
+
+    @contextlib.contextmanager
+    def ssh_channel(self,
+                    host_key,
+                    collector):
+
+        r"""
+        Return a context manager which opens (and finally closes) a session
+        channel on the given host's SSH transport.  The number of channels
+        open at once on each transport is limited by max_ssh_channels.
+
+        Description of arguments:
+        host_key                    "bmc" or "os".
+        collector                   The ffdc_collector on whose behalf the
+                                    channel is opened.
+        """
+
+        transport = self.get_transport(host_key,
+                                       min(collector.time_left(), 30))
+        with self.__channel_slots[host_key]:
+            channel = transport.open_session()
+            try:
+                yield channel
+            finally:
+                channel.close()
+
+    def ssh_exec(self,
+                 host_key,
+                 cmd_buf,
+                 collector,
+                 stdout_file_obj=None):
+
+        r"""
+        Run the given command on its own channel of the given host's SSH
+        transport and return its stdout, stderr and exit status (see
+        ssh_pool.execute_channel_command).
+
+        Description of arguments:
+        host_key                    "bmc" or "os".
+        cmd_buf                     The command to be run.
+        collector                   The ffdc_collector on whose behalf the
+                                    command is run.  socket.timeout is raised
+                                    if its budget is exhausted.
+                                    socket.error (an EnvironmentError) is
+                                    raised if the connection is lost before
+                                    the command finishes.
+        stdout_file_obj             A file object for the stdout.
+        """
+
+        with self.ssh_channel(host_key, collector) as channel:
+            return ssh_pool.execute_channel_command(channel, cmd_buf,
+                                                    collector.time_left,
+                                                    stdout_file_obj)
+
+    def open_ffdc_file(self,
+                       file_path):
+
+        r"""
+        Return an openbmc_ffdc_writer.ffdc_file_writer for the given FFDC file
+        which applies the engine's compression and byte budgets.  Note that
+        the writer's file_path attribute has the compression extension (if
+        any) appended.
+
+        Description of arguments:
+        file_path                   The path of the FFDC file.
+        """
+
+        writer = ffdc_writer.ffdc_file_writer(file_path, self.compression,
+                                              self.max_file_bytes,
+                                              self.byte_budget)
+        with self.__locks['writers']:
+            self.__writers[writer.file_path] = writer
+
+        return writer
+
+    def get_file_stats(self,
+                       file_path):
+
+        r"""
+        Return a dictionary describing the given FFDC file (see
+        openbmc_ffdc_writer.ffdc_file_writer.close).
+
+        Description of arguments:
+        file_path                   The path of an FFDC file.
+        """
+
+        with self.__locks['writers']:
+            writer = self.__writers.get(file_path)
+        if writer is not None:
+            return writer.close()
+
+        return file_stats(file_path)
+
+    def get_rest_session(self,
+                         timeout=20):
+
+        r"""
+        Return a logged-in REST session which may be shared by all of the
+        collectors, logging in if necessary.
+
+        Description of arguments:
+        timeout                     The number of seconds to allow for
+                                    logging in.
+        """
+
+        with self.__locks['rest']:
+            if self.__rest_session is not None:
+                return self.__rest_session
+            session = rest_session.rest_session(
+                self.base_url, self.hosts['bmc'][2], self.hosts['bmc'][3],
+                pool_maxsize=self.max_workers)
+            session.login(timeout=timeout, attempts=1)
+            self.__rest_session = session
+
+            return session
+
+    def rest_get(self,
+                 uri,
+                 collector,
+                 stream=False):
+
+        r"""
+        Do a REST GET of the given URI and return the response.
+
+        Description of arguments:
+        uri                         The URI to be gotten (e.g.
+                                    "/org/openbmc/sensors/enumerate").
+        collector                   The ffdc_collector on whose behalf the
+                                    request is made.
+        stream                      Return as soon as the response headers
+                                    have been received.  The caller must
+                                    then read (or close) the response.
+        """
+
+        session = self.get_rest_session(min(collector.time_left(), 20))
+
+        return session.request("GET", self.dbus_prefix + uri,
+                               timeout=collector.time_left(), stream=stream)
+
+    def add_collector(self,
+                      collector):
+
+        r"""
+        Schedule the given collector.  This may be called by a running
+        collector (e.g. to add collectors whose work depends on what it has
+        discovered).  The collector will be started in priority order.
+
+        Description of arguments:
+        collector                   An ffdc_collector object.
+        """
+
+        self.__queue.put(collector)
+
+    def run_collector(self,
+                      collector,
+                      ix,
+                      done_queue):
+
+        r"""
+        Run the given collector and put an (ix, results dictionary) tuple on
+        done_queue.
+
+        Description of arguments:
+        collector                   An ffdc_collector object.
+        ix                          The index of the collector's results in
+                                    the list returned by run.
+        done_queue                  A Queue.Queue object.
+        """
+
+        results = new_collector_results(collector)
+        start_seconds = gp.monotonic_time()
+        try:
+            results['files'] = \
+                [self.get_file_stats(file_path) for file_path in
+                 collector.function(self, collector, *collector.args) or []]
+        except Exception as exception:
+            if gp.monotonic_time() >= collector.deadline:
+                results['status'] = "TIMEOUT"
+            else:
+                results['status'] = "FAIL"
+            results['error'] = exception.__class__.__name__ + ": " +\
+                str(exception)
+        results['duration'] = round(gp.monotonic_time() - start_seconds, 3)
+        results['details'] = collector.details
+        done_queue.put((ix, results))
+
+    def skip_reason(self,
+                    collector,
+                    end_time):
+
+        r"""
+        Return a tuple consisting of the reason the given collector must be
+        skipped (or "" if it may be run) and, if the collector's budget had to
+        be cut to end by end_time, its original budget (or None).
+
+        Description of arguments:
+        collector                   An ffdc_collector object.
+        end_time                    The monotonic time at which the FFDC
+                                    deadline expires (or None).
+        """
+
+        if end_time is None:
+            return "", None
+        time_left = end_time - gp.monotonic_time()
+        if time_left <= 0:
+            return "The FFDC deadline of " + str(self.deadline) +\
+                " seconds had passed.", None
+        if collector.cost > time_left:
+            return "Its estimated cost of " + str(collector.cost) +\
+                " seconds exceeded the " + str(round(time_left, 1)) +\
+                " seconds left before the FFDC deadline.", None
+        if collector.budget > time_left:
+            original_budget = collector.budget
+            collector.budget = round(time_left, 1)
+            return "", original_budget
+
+        return "", None
+
+    def run(self,
+            collectors,
+            grace_period=10):
+
+        r"""
+        Run the given collectors (and any collectors they add) concurrently
+        and return a list of their results dictionaries (see
+        new_collector_results) in the order in which they were started (or
+        skipped).
+
+        Waiting collectors are started in priority order, ties going to the
+        collector scheduled first.  If the engine has a deadline, each
+        collector's budget is cut to fit within it and any collector whose
+        estimated cost does not fit in the time left is skipped (see
+        skip_reason).
+
+        A collector which is still running grace_period seconds after its
+        budget has been exhausted is abandoned and reported as having timed
+        out.
+
+        Description of arguments:
+        collectors                  A list of ffdc_collector objects.
+        grace_period                See above.
+        """
+
+        for collector in collectors:
+            self.add_collector(collector)
+
+        if self.deadline:
+            end_time = gp.monotonic_time() + self.deadline
+        else:
+            end_time = None
+        done_queue = Queue.Queue()
+        results_list = []
+        running = collections.OrderedDict()
+        # A heap of (priority, sequence number, collector) tuples.
+        waiting = []
+        while True:
+            while True:
+                try:
+                    collector = self.__queue.get_nowait()
+                except Queue.Empty:
+                    break
+                heapq.heappush(waiting, (collector.priority,
+                                         len(results_list) + len(waiting),
+                                         collector))
+            while len(running) < self.max_workers and len(waiting):
+                collector = heapq.heappop(waiting)[2]
+                reason, original_budget = self.skip_reason(collector,
+                                                           end_time)
+                if reason:
+                    results = new_collector_results(collector)
+                    results['status'] = "SKIPPED"
+                    results['error'] = reason
+                    results_list.append(results)
+                    continue
+                collector.deadline = gp.monotonic_time() + collector.budget
+                collector.original_budget = original_budget
+                results_list.append(None)
+                running[collector] = len(results_list) - 1
+                thread = threading.Thread(target=self.run_collector,
+                                          args=(collector, running[collector],
+                                                done_queue))
+                thread.daemon = True
+                thread.start()
+            if not len(running):
+                if self.__queue.empty():
+                    break
+                continue
+
+            # Abandon any collector which has overstayed its budget.
+            now = gp.monotonic_time()
+            for collector, ix in running.items():
+                if now >= collector.deadline + grace_period:
+                    results = new_collector_results(collector)
+                    results['status'] = "TIMEOUT"
+                    results['error'] = "Abandoned after exceeding its" +\
+                        " budget of " + str(collector.budget) + " seconds."
+                    results['duration'] = collector.budget + grace_period
+                    results_list[ix] = results
+                    del running[collector]
+            if not len(running):
+                continue
+
+            wait_seconds = min([collector.deadline + grace_period
+                                for collector in running]) - now
+            try:
+                ix, results = done_queue.get(timeout=max(wait_seconds, 0.1))
+            except Queue.Empty:
+                continue
+            for collector, running_ix in running.items():
+                if running_ix == ix:
+                    results_list[ix] = results
+                    del running[collector]
+                    break
+
+        return results_list
+
+    def close(self):
+
+        r"""
+        Close the SSH transports and the REST session.
+        """
+
+        for transport in self.__transports.values():
+            transport.close()
+        self.__transports = {}
+        with self.__locks['rest']:
+            if self.__rest_session is not None:
+                self.__rest_session.logout()
+                self.__rest_session = None
+
+
+###############################################################################
+def new_collector_results(collector):
+
+    r"""
+    Return a collector results dictionary with default values.
+
+    The dictionary contains the following keys:
+    name                            The name of the collector.
+    description                     The FFDC_METHOD_CALL description to which
+                                    the collector belongs.
+    channel                         The collector's channel.
+    priority                        The collector's priority.
+    cost                            The collector's estimated cost in
+                                    seconds.
+    budget                          The collector's budget in seconds.
+    original_budget                 The collector's budget before it was cut
+                                    to fit the FFDC deadline (or None).
+    status                          "PASS", "FAIL", "TIMEOUT" or "SKIPPED".
+    duration                        The number of seconds the collector ran.
+    error                           A description of the error which ended
+                                    the collector or the reason it was
+                                    skipped (or "").
+    files                           A list of dictionaries describing the
+                                    files written by the collector (see
+                                    ffdc_engine.get_file_stats).
+    details                         A list of any details recorded by the
+                                    collector (see ffdc_collector).
+
+    Description of arguments:
+    collector                       An ffdc_collector object.
+    """
+
+    return collections.OrderedDict([('name', collector.name),
+                                    ('description', collector.description),
+                                    ('channel', collector.channel),
+                                    ('priority', collector.priority),
+                                    ('cost', collector.cost),
+                                    ('budget', collector.budget),
+                                    ('original_budget',
+                                     collector.original_budget),
+                                    ('status', "PASS"),
+                                    ('duration', 0.0),
+                                    ('error', ""),
+                                    ('files', []),
+                                    ('details', [])])
+
+###############################################################################
+
+
+###############################################################################
+def file_stats(file_path):
+
+    r"""
+    Return a dictionary describing the given FFDC file which was not written
+    by an openbmc_ffdc_writer.ffdc_file_writer.  The dictionary has the same
+    keys as that returned by ffdc_file_writer.close.
+
+    Description of arguments:
+    file_path                       The path of an FFDC file.
+    """
+
+    try:
+        num_bytes = os.path.getsize(file_path)
+    except OSError:
+        num_bytes = 0
+
+    return collections.OrderedDict([('file_path', file_path),
+                                    ('original_bytes', num_bytes),
+                                    ('stored_bytes', num_bytes),
+                                    ('file_bytes', num_bytes),
+                                    ('compression', ""),
+                                    ('omitted_bytes', 0)])
+
+###############################################################################
+
+
+###############################################################################
+def write_cmd_output(file_path,
+                     stdout,
+                     stderr,
+                     mode='w'):
+
+    r"""
+    Write a command's output to the given FFDC file in the same format as
+    "Execute Command and Write FFDC" in openbmc_ffdc_methods.robot.
+
+    Description of arguments:
+    file_path                       The path of the FFDC file.
+    stdout                          The command's stdout.
+    stderr                          The command's stderr.
+    mode                            The mode in which the file is to be
+                                    opened ("w" or "a").
+    """
+
+    with open(file_path, mode) as file_obj:
+        if stderr == "":
+            file_obj.write(stdout + "\n")
+        else:
+            file_obj.write("ERROR output:\n" + stderr + "\nOutput:\n" +
+                           stdout + "\n")
+
+###############################################################################
+
+
+###############################################################################
+def collect_manifest(engine,
+                     collector):
+
+    r"""
+    Run each FFDC_BMC_CMD command on the BMC and append its output to the FFDC
+    report file (as "BMC FFDC Manifest" does).
+
+    Description of arguments:
+    engine                          An ffdc_engine object.
+    collector                       The ffdc_collector being run.
+    """
+
+    for index in ffdc_list.FFDC_BMC_CMD.keys():
+        for name, cmd_buf in ffdc_list.FFDC_BMC_CMD[index].items():
+            stdout, stderr, rc = engine.ssh_exec('bmc', cmd_buf, collector)
+            with open(engine.ffdc_file_path, 'a') as file_obj:
+                file_obj.write(footer_msg + index.upper() + " : " + name +
+                               "\t" + "Executed : " + cmd_buf + footer_msg)
+            write_cmd_output(engine.ffdc_file_path, stdout, stderr, 'a')
+
+    return [engine.ffdc_file_path]
+
+###############################################################################
+
+
+###############################################################################
+def collect_cmd_file(engine,
+                     collector,
+                     host_key,
+                     cmd_buf):
+
+    r"""
+    Run the given command on the given host and write its output to the FFDC
+    file named after the collector.
+
+    Description of arguments:
+    engine                          An ffdc_engine object.
+    collector                       The ffdc_collector being run.
+    host_key                        "bmc" or "os".
+    cmd_buf                         The command to be run.
+    """
+
+    # The stdout is spooled (to disk if it is large) because the stderr, which
+    # precedes it in the FFDC file, is not known until the command finishes.
+    spool_file_obj = tempfile.SpooledTemporaryFile(1024 * 1024)
+    try:
+        stdout, stderr, rc = engine.ssh_exec(host_key, cmd_buf, collector,
+                                             spool_file_obj)
+        spool_file_obj.seek(0)
+        with engine.open_ffdc_file(engine.log_prefix + collector.name +
+                                   ".txt") as writer:
+            ffdc_bundle.write_entry_output(writer, spool_file_obj, stderr)
+    finally:
+        spool_file_obj.close()
+
+    return [writer.file_path]
+
+###############################################################################
+
+
+###############################################################################
+def collect_bmc_bundle(engine,
+                       collector,
+                       include_manifest=1,
+                       include_files=1):
+
+    r"""
+    Run the "BMC FFDC Manifest" and/or "BMC FFDC Files" commands on the BMC as
+    a single bundle script and unpack the resulting tar stream into the usual
+    FFDC files (see openbmc_ffdc_bundle.py).  The results of each command
+    (return code, duration, etc.) are recorded in the collector's details.
+
+    Description of arguments:
+    engine                          An ffdc_engine object.
+    collector                       The ffdc_collector being run.
+    include_manifest                Include the FFDC_BMC_CMD commands.
+    include_files                   Include the FFDC_BMC_FILE commands.
+    """
+
+    if engine.journal_dir_path:
+        exclude_names = [ffdc_journal.journal_file_name]
+    else:
+        exclude_names = []
+    entries = ffdc_bundle.create_bundle_entries(include_manifest,
+                                                include_files, exclude_names)
+    with engine.ssh_channel('bmc', collector) as channel:
+        channel.exec_command("sh -s")
+        channel.sendall(ffdc_bundle.create_bundle_script(entries))
+        channel.shutdown_write()
+        reader = ffdc_bundle.stream_reader(channel.recv, collector.time_left,
+                                           channel.settimeout)
+        try:
+            collector.details = ffdc_bundle.unpack_bundle(
+                reader, entries, engine.log_prefix, engine.ffdc_file_path,
+                engine.open_ffdc_file)
+        except ffdc_bundle.tarfile.TarError:
+            stderr = ""
+            while channel.recv_stderr_ready():
+                stderr += channel.recv_stderr(65536)
+            raise IOError("The bundle script failed: " + stderr.strip())
+
+    return list(collections.OrderedDict.fromkeys(
+        [results['file_path'] for results in collector.details]))
+
+###############################################################################
+
+
+###############################################################################
+def collect_journal(engine,
+                    collector):
+
+    r"""
+    Write the BMC journal entries which are new since the last FFDC
+    collection to the journal FFDC file and append them to the journal store
+    (see openbmc_ffdc_journal.collect_journal).  The collection's results
+    (boot ID, mode, cursor, etc.) are recorded in the collector's details.
+
+    Description of arguments:
+    engine                          An ffdc_engine object.
+    collector                       The ffdc_collector being run.
+    """
+
+    def exec_func(cmd_buf, stdout_file_obj):
+        stdout, stderr, rc = engine.ssh_exec('bmc', cmd_buf, collector,
+                                             stdout_file_obj)
+        return stderr, rc
+
+    with engine.open_ffdc_file(engine.log_prefix + collector.name +
+                               ".txt") as writer:
+        collector.details = [ffdc_journal.collect_journal(
+            exec_func, engine.journal_dir_path, engine.hosts['bmc'][0],
+            writer, engine.ffdc_prefix)]
+
+    return [writer.file_path]
+
+###############################################################################
+
+
+###############################################################################
+def collect_get_request(engine,
+                        collector,
+                        uri):
+
+    r"""
+    Do a REST GET of the given URI and write the pretty-printed JSON response
+    to the FFDC file named after the collector (as "Log FFDC Get Requests"
+    does).  Nothing is written if the request does not succeed.
+
+    The response body is spooled (to disk if it is large) as it arrives and
+    the pretty-printed JSON is written to the FFDC file piece by piece.  The
+    URI, HTTP status, latency (time to the response headers), duration and
+    number of bytes received are recorded in the collector's details.
+
+    Description of arguments:
+    engine                          An ffdc_engine object.
+    collector                       The ffdc_collector being run.
+    uri                             The URI to get.
+    """
+
+    request_results = collections.OrderedDict(
+        [('uri', uri), ('status_code', None), ('latency', 0.0),
+         ('duration', 0.0), ('bytes', 0)])
+    collector.details = [request_results]
+    start_seconds = gp.monotonic_time()
+    resp = engine.rest_get(uri, collector, stream=True)
+    request_results['status_code'] = resp.status_code
+    request_results['latency'] = round(resp.elapsed.total_seconds(), 3)
+    spool_file_obj = tempfile.SpooledTemporaryFile(1024 * 1024)
+    try:
+        for chunk in resp.iter_content(65536):
+            spool_file_obj.write(chunk)
+            request_results['bytes'] += len(chunk)
+            collector.time_left()
+        request_results['duration'] = \
+            round(gp.monotonic_time() - start_seconds, 3)
+        resp.raise_for_status()
+        spool_file_obj.seek(0)
+        json_obj = json.load(spool_file_obj,
+                             object_pairs_hook=collections.OrderedDict)
+    finally:
+        resp.close()
+        spool_file_obj.close()
+    encoder = json.JSONEncoder(indent=4, separators=(',', ': '))
+    with engine.open_ffdc_file(engine.log_prefix + collector.name +
+                               ".txt") as writer:
+        # iterencode yields many small pieces so they are written in
+        # batches.
+        chunks = ["\n"]
+        num_bytes = 0
+        for chunk in encoder.iterencode(json_obj):
+            chunks.append(chunk)
+            num_bytes += len(chunk)
+            if num_bytes >= 65536:
+                writer.write("".join(chunks))
+                chunks = []
+                num_bytes = 0
+        chunks.append("\n")
+        writer.write("".join(chunks))
+
+    return [writer.file_path]
+
+###############################################################################
+
+
+###############################################################################
+def collect_os_files(engine,
+                     collector):
+
+    r"""
+    Verify that the OS can be reached and then schedule a collector for each
+    of the FFDC_OS_ALL_DISTROS_FILE commands and for each of the commands
+    specific to the OS's Linux distribution (as "OS FFDC Files" does).
+
+    Description of arguments:
+    engine                          An ffdc_engine object.
+    collector                       The ffdc_collector being run.
+    """
+
+    stdout, stderr, rc = engine.ssh_exec('os', "uptime", collector)
+    if rc != 0:
+        raise IOError("Could not connect to OS.")
+
+    file_dicts = [ffdc_list.FFDC_OS_ALL_DISTROS_FILE]
+    linux_distro, stderr, rc = \
+        engine.ssh_exec('os', ". /etc/os-release; echo $ID", collector)
+    linux_distro = linux_distro.strip()
+    distro_file_dict = getattr(ffdc_list, "FFDC_OS_" + linux_distro.upper() +
+                               "_FILE", None)
+    if distro_file_dict is not None:
+        file_dicts.append(distro_file_dict)
+    for file_dict in file_dicts:
+        for index in file_dict.keys():
+            for name, cmd_buf in file_dict[index].items():
+                engine.add_collector(ffdc_collector(
+                    name, collector.description, 'os', collect_cmd_file,
+                    ('os', cmd_buf)))
+
+    return []
+
+###############################################################################
+
+
+###############################################################################
+def collect_core_files(engine,
+                       collector):
+
+    r"""
+    Retrieve any core files from the BMC's /tmp directory and then remove
+    them from the BMC (as "SCP Coredump Files" does).  Core files already
+    retrieved by an earlier FFDC collection are not retrieved again, the
+    transfers are compressed and resumable and the total size is limited by
+    the engine's max_core_bytes (see openbmc_ffdc_cores.py).  The results
+    for each core file are recorded in the collector's details.
+
+    Description of arguments:
+    engine                          An ffdc_engine object.
+    collector                       The ffdc_collector being run.
+    """
+
+    def exec_func(cmd_buf, stdout_file_obj):
+        try:
+            stdout, stderr, rc = engine.ssh_exec('bmc', cmd_buf, collector,
+                                                 stdout_file_obj)
+        except paramiko.SSHException as exception:
+            # Let openbmc_ffdc_cores resume the transfer.
+            raise IOError(str(exception))
+        return stderr, rc
+
+    # The core files are not subject to the per-file budget since a partial
+    # core file is of no use.
+    def open_file_func(file_path):
+        return ffdc_writer.ffdc_file_writer(file_path, engine.compression)
+
+    registry_file_path = engine.state_dir_path + engine.hosts['bmc'][0] +\
+        ".core_files.json"
+    collector.details = ffdc_cores.collect_core_files(
+        exec_func, registry_file_path, engine.log_prefix, open_file_func,
+        engine.max_core_bytes, engine.remove_core_files)
+
+    return [core_results['file_path'] for core_results in collector.details
+            if core_results['status'] in ["retrieved", "failed"]]
+
+###############################################################################
+
+
+###############################################################################
+def collect_esel(engine,
+                 collector):
+
+    r"""
+    Write the eSEL data of each BMC error log entry to the "esel" FFDC file
+    and, if the eSEL.pl parser is available, convert it to elog format (as
+    "Collect eSEL Log" does).
+
+    Description of arguments:
+    engine                          An ffdc_engine object.
+    collector                       The ffdc_collector being run.
+    """
+
+    resp = engine.rest_get(logging_entry_uri + "enumerate", collector)
+    resp.raise_for_status()
+
+    file_path = engine.log_prefix + "esel"
+    with open(file_path, 'w') as file_obj:
+        for entry_path, entry in sorted(resp.json()['data'].items()):
+            esel_data = entry.get('AdditionalData', [])
+            # Skip entries whose AdditionalData is empty.
+            if not len(esel_data):
+                continue
+            file_obj.write('"' + esel_data[0] + '"\n')
+
+    if gc.exec_cmd("which eSEL.pl")['rc'] == 0:
+        # Note: The only way to get eSEL.pl to put the output in a particular
+        # directory is to cd to that directory.
+        gc.exec_cmd("cd " + engine.ffdc_dir_path + " ; eSEL.pl -l " +
+                    file_path + " -p decode_obmc_data",
+                    timeout=collector.time_left())
+
+    return [file_path]
+
+###############################################################################
+
+
+###############################################################################
+def get_ffdc_collectors(keyword_name,
+                        description,
+                        os_host="",
+                        journal=0):
+
+    r"""
+    Return a list of the collectors which do the work of the given
+    FFDC_METHOD_CALL keyword.
+
+    Description of arguments:
+    keyword_name                    One of the keywords in engine_keywords
+                                    (e.g. "BMC FFDC Files").
+    description                     The keyword's FFDC_METHOD_CALL
+                                    description (e.g. "BMC Specific Files").
+    os_host                         The OS host.  If this is "", no OS
+                                    collectors are returned.
+    journal                         Collect the BMC journal incrementally
+                                    (see collect_journal).
+    """
+
+    collectors = []
+    if keyword_name == 'BMC FFDC Manifest':
+        collectors.append(ffdc_collector("BMC_general", description, 'bmc',
+                                         collect_manifest))
+    elif keyword_name == 'BMC FFDC Files':
+        for index in ffdc_list.FFDC_BMC_FILE.keys():
+            for name, cmd_buf in ffdc_list.FFDC_BMC_FILE[index].items():
+                if journal and name == ffdc_journal.journal_file_name:
+                    collectors.append(ffdc_collector(name, description,
+                                                     'bmc', collect_journal))
+                    continue
+                collectors.append(ffdc_collector(name, description, 'bmc',
+                                                 collect_cmd_file,
+                                                 ('bmc', cmd_buf)))
+    elif keyword_name == 'BMC FFDC Get Requests':
+        for index in ffdc_list.FFDC_GET_REQUEST.keys():
+            for name, uri in ffdc_list.FFDC_GET_REQUEST[index].items():
+                collectors.append(ffdc_collector(name, description, 'rest',
+                                                 collect_get_request,
+                                                 (uri,)))
+    elif keyword_name == 'OS FFDC Files':
+        if os_host != "":
+            collectors.append(ffdc_collector("OS_setup", description, 'os',
+                                             collect_os_files))
+    elif keyword_name == 'SCP Coredump Files':
+        collectors.append(ffdc_collector("core_files", description, 'core',
+                                         collect_core_files))
+    elif keyword_name == 'Collect eSEL Log':
+        collectors.append(ffdc_collector("esel", description, 'rest',
+                                         collect_esel))
+
+    return collectors
+
+###############################################################################
+
+
+###############################################################################
+def run_ffdc_methods(engine,
+                     ffdc_function_list=""):
+
+    r"""
+    Collect the FFDC described by FFDC_METHOD_CALL using the given engine,
+    write the FFDC index file and return a tuple consisting of the list of
+    collector results (see new_collector_results) and a list of the
+    FFDC_METHOD_CALL keywords which this engine does not implement and
+    which must therefore be run by the caller.
+
+    Description of arguments:
+    engine                          An ffdc_engine object.
+    ffdc_function_list              A colon-delimited list of the
+                                    FFDC_METHOD_CALL descriptions of the
+                                    FFDC to be collected.  A blank value
+                                    means that all FFDC is to be collected.
+    """
+
+    collectors = []
+    other_keywords = []
+    bundle_descriptions = collections.OrderedDict()
+    for index in ffdc_list.FFDC_METHOD_CALL.keys():
+        if ffdc_function_list == "":
+            descriptions = ffdc_list.FFDC_METHOD_CALL[index].keys()
+        else:
+            descriptions = ffdc_function_list.split(":")
+        for description, keyword_name in \
+                ffdc_list.FFDC_METHOD_CALL[index].items():
+            if description not in descriptions:
+                continue
+            if engine.bundle and keyword_name in bundle_keywords:
+                bundle_descriptions[keyword_name] = description
+            elif keyword_name in engine_keywords:
+                collectors += get_ffdc_collectors(keyword_name, description,
+                                                  engine.hosts['os'][0],
+                                                  engine.journal_dir_path)
+            else:
+                other_keywords.append(keyword_name)
+    if len(bundle_descriptions):
+        collectors.insert(0, ffdc_collector(
+            "BMC_bundle", ":".join(bundle_descriptions.values()), 'bundle',
+            collect_bmc_bundle,
+            ('BMC FFDC Manifest' in bundle_descriptions,
+             'BMC FFDC Files' in bundle_descriptions)))
+        if engine.journal_dir_path and \
+                'BMC FFDC Files' in bundle_descriptions:
+            # The bundle leaves the journal to its own collector.
+            collectors.insert(1, ffdc_collector(
+                ffdc_journal.journal_file_name,
+                bundle_descriptions['BMC FFDC Files'], 'bmc',
+                collect_journal))
+
+    start_time = time.time()
+    try:
+        results_list = engine.run(collectors)
+    finally:
+        engine.close()
+
+    ffdc_index = collections.OrderedDict()
+    ffdc_index['ffdc_prefix'] = engine.ffdc_prefix
+    ffdc_index['start_time'] = start_time
+    ffdc_index['duration'] = round(time.time() - start_time, 3)
+    ffdc_index['compression'] = engine.compression
+    ffdc_index['max_file_bytes'] = engine.max_file_bytes
+    ffdc_index['max_ffdc_bytes'] = engine.byte_budget.max_bytes
+    ffdc_index['deadline'] = engine.deadline
+    ffdc_index['original_bytes'] = \
+        sum([file_stats['original_bytes'] for results in results_list
+             for file_stats in results['files']])
+    ffdc_index['stored_bytes'] = \
+        sum([file_stats['stored_bytes'] for results in results_list
+             for file_stats in results['files']])
+    skipped_list = [collections.OrderedDict(
+        [('name', results['name']), ('reason', results['error'])])
+        for results in results_list if results['status'] == "SKIPPED"]
+    ffdc_index['skipped'] = skipped_list
+    # A summary of the REST requests made (see collect_get_request).
+    ffdc_index['rest_requests'] = \
+        [request_results for results in results_list
+         if results['channel'] == 'rest' for request_results in
+         results['details'] if 'status_code' in request_results]
+    ffdc_index['collectors'] = results_list
+    with open(engine.index_file_path, 'w') as file_obj:
+        json.dump(ffdc_index, file_obj, indent=4, separators=(',', ': '))
+
+    if len(skipped_list):
+        # Record what was not collected (and why) in the FFDC report file.
+        with open(engine.ffdc_file_path, 'a') as file_obj:
+            file_obj.write(footer_msg + "SKIPPED FFDC : " +
+                           str(len(skipped_list)) + " collectors" +
+                           footer_msg)
+            for skipped in skipped_list:
+                file_obj.write(skipped['name'] + ": " + skipped['reason'] +
+                               "\n")
+
+    return results_list, other_keywords
+
+###############################################################################
+
+
+###############################################################################
+def sprint_collector_results(results_list):
+
+    r"""
+    Return a report with one line for each of the given collector results.
+
+    Example result:
+
+    PASS      1.203 P2 BMC Specific Files: BMC_journalctl
+    TIMEOUT  50.001 P7 Core Files: core_files
+      Its budget was cut from 300 seconds to 50.0 to fit the FFDC deadline.
+      timeout: core_files exceeded its budget of 50.0 seconds.
+    SKIPPED   0.000 P6 OS FFDC: OS_setup
+      The FFDC deadline of 60.0 seconds had passed.
+
+    Description of arguments:
+    results_list                    A list of collector results dictionaries
+                                    (see new_collector_results).
+    """
+
+    buffer = ""
+    for results in results_list:
+        buffer += "%-7s %7.3f P%d %s: %s\n" % (results['status'],
+                                               results['duration'],
+                                               results['priority'],
+                                               results['description'],
+                                               results['name'])
+        if results['original_budget'] is not None:
+            buffer += "  Its budget was cut from " +\
+                str(results['original_budget']) + " seconds to " +\
+                str(results['budget']) + " to fit the FFDC deadline.\n"
+        if results['error']:
+            buffer += "  " + results['error'] + "\n"
+
+    return buffer
+
+###############################################################################
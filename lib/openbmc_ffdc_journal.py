@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+
+r"""
+This module collects the BMC's journal incrementally for FFDC.
+
+Rather than dumping the entire journal on every failure, the journal cursor
+reached by each collection is remembered (per BMC host) and the next
+collection asks only for the entries after it (journalctl --after-cursor).
+The full journal is dumped only the first time a BMC host is seen.  Because
+journal cursors remain valid across BMC reboots, the collection following a
+BMC reboot gets both the end of the previous boot's journal and the new
+boot's journal.  If the cursor is no longer valid (e.g. the journal has been
+rotated), the current boot's journal (journalctl -b) is dumped.
+
+The entries collected are also kept in a journal store: for each BMC boot ID
+there is a gzip file to which each collection appends a new gzip member and
+a small JSON index of those members.  This allows the journal for any part
+of a boot to be extracted quickly (see extract_journal).
+
+Journal store layout:
+<journal dir path>/<BMC host>/state.json         The last boot ID and cursor.
+<journal dir path>/<BMC host>/<boot ID>.gz       The journal segments.
+<journal dir path>/<BMC host>/<boot ID>.json     The segment index.
+"""
+
+import os
+import json
+import gzip
+import fcntl
+import zlib
+import StringIO
+import collections
+
+import openbmc_ffdc_bundle as ffdc_bundle
+
+# The name of the FFDC file (and openbmc_ffdc_list.FFDC_BMC_FILE entry) which
+# holds the journal.
+journal_file_name = "BMC_journalctl"
+
+# The prefix of the line written by journalctl --show-cursor.
+cursor_line_prefix = "-- cursor: "
+
+
+class journal_splitter:
+
+    r"""
+    This class takes journalctl --show-cursor output as it arrives, passes
+    the journal entries on to any number of file-like objects and captures
+    the cursor line (which is always the last line).
+    """
+
+    def __init__(self,
+                 file_objs):
+
+        r"""
+        Create a journal_splitter object.
+
+        Description of arguments:
+        file_objs                   A list of file-like objects to which the
+                                    journal entries are to be written.
+        """
+
+        self.file_objs = file_objs
+        self.cursor = None
+        self.num_bytes = 0
+        self.num_lines = 0
+        self.__pending = ""
+
+    def __emit(self,
+               buffer):
+
+        for file_obj in self.file_objs:
+            file_obj.write(buffer)
+        self.num_bytes += len(buffer)
+        self.num_lines += buffer.count("\n")
+
+    def write(self,
+              buffer):
+
+        r"""
+        Process the given journalctl output.
+
+        Description of arguments:
+        buffer                      The output to be processed.
+        """
+
+        self.__pending += buffer
+        # Hold back the last complete line (which may be the cursor line) and
+        # any partial line which follows it.
+        end_ix = self.__pending.rfind("\n", 0, max(len(self.__pending) - 1,
+                                                   0))
+        if end_ix < 0:
+            return
+        self.__emit(self.__pending[:end_ix + 1])
+        self.__pending = self.__pending[end_ix + 1:]
+
+    def close(self):
+
+        r"""
+        Process any held back output and set the cursor attribute.
+        """
+
+        if self.__pending.startswith(cursor_line_prefix):
+            self.cursor = self.__pending[len(cursor_line_prefix):].strip()
+        elif self.__pending != "":
+            self.__emit(self.__pending)
+        self.__pending = ""
+
+
+###############################################################################
+def get_host_dir_path(journal_dir_path,
+                      openbmc_host):
+
+    r"""
+    Return the path of the journal store directory for the given BMC host,
+    creating it if necessary.
+
+    Description of arguments:
+    journal_dir_path                The journal store directory path.
+    openbmc_host                    The BMC host name or IP address.
+    """
+
+    host_dir_path = os.path.normpath(journal_dir_path) + os.sep +\
+        openbmc_host + os.sep
+    if not os.path.isdir(host_dir_path):
+        try:
+            os.makedirs(host_dir_path)
+        except OSError:
+            # Another process may have created it.
+            if not os.path.isdir(host_dir_path):
+                raise
+
+    return host_dir_path
+
+###############################################################################
+
+
+###############################################################################
+def read_json_file(file_path,
+                   default):
+
+    r"""
+    Return the object stored in the given JSON file or default if there is no
+    such file.
+
+    Description of arguments:
+    file_path                       The path of the JSON file.
+    default                         The value to be returned if the file does
+                                    not exist.
+    """
+
+    try:
+        with open(file_path) as file_obj:
+            return json.load(file_obj,
+                             object_pairs_hook=collections.OrderedDict)
+    except IOError:
+        return default
+
+###############################################################################
+
+
+###############################################################################
+def write_json_file(file_path,
+                    obj):
+
+    r"""
+    Write the given object to the given JSON file.  A temporary file is
+    written and renamed so that readers never see a partial file.
+
+    Description of arguments:
+    file_path                       The path of the JSON file.
+    obj                             The object to be written.
+    """
+
+    temp_file_path = file_path + ".tmp"
+    with open(temp_file_path, 'w') as file_obj:
+        json.dump(obj, file_obj, indent=4, separators=(',', ': '))
+    os.rename(temp_file_path, file_path)
+
+###############################################################################
+
+
+###############################################################################
+def get_journal_cmd(cursor=None,
+                    current_boot=0):
+
+    r"""
+    Return the journalctl command to be used to collect the journal entries
+    following the given cursor.
+
+    Description of arguments:
+    cursor                          The cursor of the last entry already
+                                    collected.  If this is None, all entries
+                                    are collected.
+    current_boot                    Collect only the current boot's entries.
+    """
+
+    cmd_buf = "journalctl --no-pager --show-cursor"
+    if cursor is not None:
+        cmd_buf += " --after-cursor=" + ffdc_bundle.quote_shell_arg(cursor)
+    if current_boot:
+        cmd_buf += " -b"
+
+    return cmd_buf
+
+###############################################################################
+
+
+###############################################################################
+def collect_journal(exec_func,
+                    journal_dir_path,
+                    openbmc_host,
+                    ffdc_file_obj,
+                    ffdc_prefix=""):
+
+    r"""
+    Collect the BMC journal entries which are new since the last collection,
+    write them to ffdc_file_obj, append them to the journal store and return
+    a dictionary describing the collection.
+
+    The dictionary returned contains the following keys:
+    boot_id                         The BMC's boot ID.
+    mode                            "full" (the entire journal), "boot" (the
+                                    current boot's journal) or "incremental"
+                                    (the entries after the last cursor).
+    cmd_buf                         The journalctl command which was run.
+    cursor                          The cursor of the last entry collected.
+    num_bytes                       The number of bytes of journal entries
+                                    collected.
+    num_lines                       The number of lines collected.
+    journal_file_path               The path of the journal store file to
+                                    which the entries were appended.
+
+    Description of arguments:
+    exec_func                       A function which runs a command on the
+                                    BMC.  It is called with the command and a
+                                    file-like object for the command's
+                                    stdout and must return the command's
+                                    stderr and return code (see
+                                    openbmc_ffdc_engine.collect_journal).
+    journal_dir_path                The journal store directory path.
+    openbmc_host                    The BMC host name or IP address.
+    ffdc_file_obj                   A file-like object to which the journal
+                                    entries are to be written (e.g. an
+                                    openbmc_ffdc_writer.ffdc_file_writer).
+    ffdc_prefix                     The FFDC prefix, which is recorded in the
+                                    segment index.
+    """
+
+    host_dir_path = get_host_dir_path(journal_dir_path, openbmc_host)
+    with open(host_dir_path + "lock", 'w') as lock_file_obj:
+        # Serialize collections for this BMC host (possibly by several
+        # processes) so that each one sees the previous one's cursor.
+        fcntl.flock(lock_file_obj, fcntl.LOCK_EX)
+        state = read_json_file(host_dir_path + "state.json",
+                               collections.OrderedDict())
+
+        boot_info = StringIO.StringIO()
+        stderr, rc = exec_func("cat /proc/sys/kernel/random/boot_id ;"
+                               " date +%s", boot_info)
+        try:
+            boot_id, bmc_time = boot_info.getvalue().split()[:2]
+            bmc_time = int(bmc_time)
+        except ValueError:
+            raise ValueError("Unable to get the BMC's boot ID and time."
+                             "  stderr: " + stderr)
+
+        journal_file_path = host_dir_path + boot_id + ".gz"
+        index_file_path = host_dir_path + boot_id + ".json"
+        index = read_json_file(index_file_path, collections.OrderedDict(
+            [('openbmc_host', openbmc_host), ('boot_id', boot_id),
+             ('segments', [])]))
+
+        if 'cursor' not in state:
+            mode = "full"
+        else:
+            mode = "incremental"
+        results = None
+        while results is None:
+            if mode == "full":
+                cmd_buf = get_journal_cmd()
+            elif mode == "boot":
+                cmd_buf = get_journal_cmd(current_boot=1)
+            else:
+                cmd_buf = get_journal_cmd(state['cursor'])
+            if os.path.exists(journal_file_path):
+                offset = os.path.getsize(journal_file_path)
+            else:
+                offset = 0
+            journal_file_obj = gzip.open(journal_file_path, 'ab')
+            splitter = journal_splitter([ffdc_file_obj, journal_file_obj])
+            try:
+                stderr, rc = exec_func(cmd_buf, splitter)
+                splitter.close()
+            finally:
+                journal_file_obj.close()
+            if rc != 0 and mode == "incremental" and splitter.num_bytes == 0:
+                # The cursor is no longer valid.  Discard the empty gzip
+                # member and dump the current boot's journal instead.
+                with open(journal_file_path, 'ab') as file_obj:
+                    file_obj.truncate(offset)
+                mode = "boot"
+                continue
+            results = collections.OrderedDict(
+                [('boot_id', boot_id), ('mode', mode), ('cmd_buf', cmd_buf),
+                 ('cursor', splitter.cursor or state.get('cursor')),
+                 ('num_bytes', splitter.num_bytes),
+                 ('num_lines', splitter.num_lines),
+                 ('journal_file_path', journal_file_path)])
+
+        index['segments'].append(collections.OrderedDict(
+            [('offset', offset),
+             ('length', os.path.getsize(journal_file_path) - offset),
+             ('collected_at', bmc_time),
+             ('ffdc_prefix', ffdc_prefix),
+             ('mode', mode),
+             ('num_bytes', splitter.num_bytes),
+             ('num_lines', splitter.num_lines),
+             ('cursor', results['cursor'])]))
+        write_json_file(index_file_path, index)
+        state['boot_id'] = boot_id
+        state['cursor'] = results['cursor']
+        state['collected_at'] = bmc_time
+        write_json_file(host_dir_path + "state.json", state)
+
+    return results
+
+###############################################################################
+
+
+###############################################################################
+def extract_journal(journal_dir_path,
+                    openbmc_host,
+                    boot_id,
+                    start_time=0,
+                    end_time=None,
+                    file_obj=None):
+
+    r"""
+    Return the journal entries collected for the given BMC boot which were
+    collected in the given window.  Only the segments whose collection
+    intervals overlap the window are decompressed.  A segment's collection
+    interval runs from the previous segment's collected_at time (exclusive)
+    to its own (inclusive).
+
+    Description of arguments:
+    journal_dir_path                The journal store directory path.
+    openbmc_host                    The BMC host name or IP address.
+    boot_id                         The BMC boot ID.
+    start_time                      The start of the window in seconds since
+                                    the epoch (BMC time).
+    end_time                        The end of the window in seconds since
+                                    the epoch (BMC time).  None means no end.
+    file_obj                        A file-like object to which the entries
+                                    are to be written.  If this is given, ""
+                                    is returned.
+    """
+
+    host_dir_path = os.path.normpath(journal_dir_path) + os.sep +\
+        openbmc_host + os.sep
+    index = read_json_file(host_dir_path + boot_id + ".json", None)
+    if index is None:
+        raise ValueError("No journal has been collected for boot ID " +
+                         boot_id + " of " + openbmc_host + ".")
+
+    chunks = []
+    previous_collected_at = 0
+    with open(host_dir_path + boot_id + ".gz", 'rb') as journal_file_obj:
+        for segment in index['segments']:
+            interval_start = previous_collected_at
+            previous_collected_at = segment['collected_at']
+            if segment['collected_at'] < start_time or\
+               (end_time is not None and interval_start >= end_time):
+                continue
+            journal_file_obj.seek(segment['offset'])
+            # 16 + MAX_WBITS tells zlib to expect a gzip header.
+            buffer = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(
+                journal_file_obj.read(segment['length']))
+            if file_obj is None:
+                chunks.append(buffer)
+            else:
+                file_obj.write(buffer)
+
+    return "".join(chunks)
+
+###############################################################################
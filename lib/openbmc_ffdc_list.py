@@ -124,6 +124,30 @@ FFDC_GET_REQUEST = {
 }
 
 
+# The priority (1 is the highest) and estimated cost in seconds of each FFDC
+# collector run by openbmc_ffdc_engine.py.  When time is short, the
+# collectors with the highest priority are run first and those whose cost
+# does not fit in the time left are skipped.  Collectors not listed here get
+# the default priority and cost of their channel (see openbmc_ffdc_engine).
+FFDC_COLLECTOR_PRIORITY = {
+    # Collector name     (Priority, Cost)
+    'BMC_general': (1, 5),
+    'BMC_bundle': (1, 20),
+    'BMC_journalctl': (2, 10),
+    'BMC_elog': (3, 3),
+    'esel': (3, 5),
+    'BMC_proc_list': (4, 2),
+    'BMC_dmesg': (4, 2),
+    'BMC_procinfo': (4, 1),
+    'BMC_meminfo': (4, 1),
+    'BMC_sensor_list': (5, 5),
+    'BMC_led': (5, 3),
+    'BMC_record_log': (5, 3),
+    'BMC_inventory': (6, 10),
+    'OS_setup': (6, 5),
+    'core_files': (7, 60),
+}
+
 # Define your keywords in method/utils and call here
 FFDC_METHOD_CALL = {
     'BMC LOGS':
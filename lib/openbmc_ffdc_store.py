@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+
+r"""
+This module provides a content-addressed store for FFDC files.
+
+Much of the FFDC collected for one failure is identical to that collected for
+the previous one (e.g. /proc/cpuinfo, /etc/os-release, the inventory).  The
+store keeps each distinct file content (blob) once, named after its SHA-256
+digest, and records the files of each FFDC collection in a manifest.  The
+classic flat FFDC directory can be recreated from a manifest at any time (see
+ffdc_store.materialize).
+
+Store layout:
+<store dir path>/blobs/<first 2 hex digits>/<sha256 hex digest>
+<store dir path>/manifests/<ffdc_prefix>manifest.json
+<store dir path>/store_stats.json
+
+Blobs are never hard-linked into FFDC directories.  The suites usually run
+as root, which may write to a read-only file, so a later write through such
+a link would silently change the blob and thereby every FFDC collection
+whose manifest refers to it.  Files are instead copied out of the store and
+each copy is checked against its digest.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import fcntl
+import glob
+import collections
+
+import gen_print as gp
+import tally_sheet
+
+# The fields kept in store_stats.json for each FFDC collection stored.
+stats_fields = ['files', 'bytes', 'new_bytes', 'saved_bytes', 'write_msecs']
+
+
+###############################################################################
+def hash_file(file_path):
+
+    r"""
+    Return the SHA-256 hex digest and the size of the given file.
+
+    Description of arguments:
+    file_path                       The path of the file to be hashed.
+    """
+
+    sha = hashlib.sha256()
+    num_bytes = 0
+    with open(file_path, 'rb') as file_obj:
+        for chunk in iter(lambda: file_obj.read(1024 * 1024), ""):
+            sha.update(chunk)
+            num_bytes += len(chunk)
+
+    return sha.hexdigest(), num_bytes
+
+###############################################################################
+
+
+class ffdc_store:
+
+    r"""
+    This class manages one content-addressed FFDC store directory.
+    """
+
+    def __init__(self,
+                 store_dir_path):
+
+        r"""
+        Create an ffdc_store object, creating its directories if necessary.
+
+        Description of arguments:
+        store_dir_path              The store directory path.
+        """
+
+        self.store_dir_path = os.path.normpath(store_dir_path) + os.sep
+        self.blob_dir_path = self.store_dir_path + "blobs" + os.sep
+        self.manifest_dir_path = self.store_dir_path + "manifests" + os.sep
+        self.stats_file_path = self.store_dir_path + "store_stats.json"
+        for dir_path in [self.blob_dir_path, self.manifest_dir_path]:
+            if not os.path.isdir(dir_path):
+                try:
+                    os.makedirs(dir_path)
+                except OSError:
+                    # Another process may have created it.
+                    if not os.path.isdir(dir_path):
+                        raise
+
+    def get_blob_path(self,
+                      digest):
+
+        r"""
+        Return the path of the blob with the given digest.
+
+        Description of arguments:
+        digest                      A SHA-256 hex digest.
+        """
+
+        return self.blob_dir_path + digest[:2] + os.sep + digest
+
+    def get_manifest_path(self,
+                          ffdc_prefix):
+
+        r"""
+        Return the path of the manifest for the given FFDC prefix.
+
+        Description of arguments:
+        ffdc_prefix                 The FFDC prefix (e.g.
+                                    "bmc1.170101.123456.").
+        """
+
+        return self.manifest_dir_path + ffdc_prefix + "manifest.json"
+
+    def add_file(self,
+                 file_path,
+                 keep=0):
+
+        r"""
+        Add the given file to the store and return its digest, its size and
+        whether its content was new to the store.
+
+        The file is moved into the store (if its content is new) or removed
+        (if not).  If keep is set, it is then recreated as a copy of its blob.
+
+        Description of arguments:
+        file_path                   The path of the file to be added.
+        keep                        Leave a copy of the file in place.
+        """
+
+        digest, num_bytes = hash_file(file_path)
+        blob_path = self.get_blob_path(digest)
+        new = not os.path.exists(blob_path)
+        if new:
+            blob_dir_path = os.path.dirname(blob_path)
+            if not os.path.isdir(blob_dir_path):
+                try:
+                    os.mkdir(blob_dir_path)
+                except OSError:
+                    if not os.path.isdir(blob_dir_path):
+                        raise
+            try:
+                # Renaming is atomic so a concurrent reader never sees a
+                # partial blob.  If another process stores the same content
+                # at the same time, the content is identical either way.
+                os.rename(file_path, blob_path)
+            except OSError:
+                # The store is on another file system.
+                temp_file_path = blob_path + "." + str(os.getpid())
+                shutil.copyfile(file_path, temp_file_path)
+                os.rename(temp_file_path, blob_path)
+                os.remove(file_path)
+            os.chmod(blob_path, 0o444)
+        else:
+            os.remove(file_path)
+        if keep:
+            self.copy_blob(digest, file_path)
+
+        return digest, num_bytes, new
+
+    def copy_blob(self,
+                  digest,
+                  file_path):
+
+        r"""
+        Create the given file as a copy of the blob with the given digest.
+        Raise ValueError (leaving no file) if the copy's content does not
+        match the digest (i.e. if the blob has been corrupted).
+
+        Description of arguments:
+        digest                      A SHA-256 hex digest.
+        file_path                   The path of the file to be created.
+        """
+
+        temp_file_path = file_path + "." + str(os.getpid()) + ".tmp"
+        shutil.copyfile(self.get_blob_path(digest), temp_file_path)
+        if hash_file(temp_file_path)[0] != digest:
+            os.remove(temp_file_path)
+            raise ValueError("The store's blob for \"" + file_path + "\" does"
+                             " not match its digest (" + digest + ").")
+        os.rename(temp_file_path, file_path)
+
+    def store_ffdc(self,
+                   ffdc_dir_path,
+                   ffdc_prefix,
+                   file_paths=None,
+                   keep=0):
+
+        r"""
+        Add the files of one FFDC collection to the store, write its manifest
+        and return the manifest.
+
+        The manifest is a dictionary with the following keys:
+        ffdc_dir_path               The FFDC directory path.
+        ffdc_prefix                 The FFDC prefix.
+        stats                       A dictionary with the stats_fields keys
+                                    describing this collection.
+        files                       A list of dictionaries, each with the
+                                    file's name (relative to ffdc_dir_path),
+                                    digest, bytes and whether it was new.
+
+        Description of arguments:
+        ffdc_dir_path               The FFDC directory path.
+        ffdc_prefix                 The FFDC prefix.
+        file_paths                  The paths of the files to be stored.  By
+                                    default, all of the files whose paths
+                                    begin with ffdc_dir_path + ffdc_prefix
+                                    are stored.
+        keep                        Leave copies of the files in the FFDC
+                                    directory (see add_file).  If this is 0,
+                                    the files are removed and may be
+                                    recreated with materialize.
+        """
+
+        start_time = gp.monotonic_time()
+        ffdc_dir_path = os.path.normpath(ffdc_dir_path) + os.sep
+        if file_paths is None:
+            file_paths = [file_path for file_path in
+                          sorted(glob.glob(ffdc_dir_path + ffdc_prefix + "*"))
+                          if os.path.isfile(file_path)]
+
+        files = []
+        stats = collections.OrderedDict([(field, 0) for field in
+                                         stats_fields])
+        for file_path in file_paths:
+            digest, num_bytes, new = self.add_file(file_path, keep)
+            files.append(collections.OrderedDict(
+                [('name', os.path.relpath(file_path, ffdc_dir_path)),
+                 ('digest', digest), ('bytes', num_bytes), ('new', new)]))
+            stats['files'] += 1
+            stats['bytes'] += num_bytes
+            if new:
+                stats['new_bytes'] += num_bytes
+            else:
+                stats['saved_bytes'] += num_bytes
+
+        stats['write_msecs'] = \
+            int((gp.monotonic_time() - start_time) * 1000)
+        manifest = collections.OrderedDict(
+            [('ffdc_dir_path', ffdc_dir_path), ('ffdc_prefix', ffdc_prefix),
+             ('stats', stats), ('files', files)])
+        manifest_path = self.get_manifest_path(ffdc_prefix)
+        with open(manifest_path + ".tmp", 'w') as file_obj:
+            json.dump(manifest, file_obj, indent=4, separators=(',', ': '))
+        os.rename(manifest_path + ".tmp", manifest_path)
+        self.__add_stats(ffdc_prefix, stats)
+
+        return manifest
+
+    def __add_stats(self,
+                    ffdc_prefix,
+                    stats):
+
+        r"""
+        Add the given FFDC collection's stats to store_stats.json.
+
+        Description of arguments:
+        ffdc_prefix                 The FFDC prefix.
+        stats                       The collection's stats.
+        """
+
+        with open(self.stats_file_path + ".lock", 'w') as lock_file_obj:
+            fcntl.flock(lock_file_obj, fcntl.LOCK_EX)
+            all_stats = self.get_stats()
+            all_stats[ffdc_prefix] = stats
+            with open(self.stats_file_path + ".tmp", 'w') as file_obj:
+                json.dump(all_stats, file_obj, indent=4,
+                          separators=(',', ': '))
+            os.rename(self.stats_file_path + ".tmp", self.stats_file_path)
+
+    def get_stats(self):
+
+        r"""
+        Return an ordered dictionary of the stats of each FFDC collection
+        stored, keyed by FFDC prefix.
+        """
+
+        try:
+            with open(self.stats_file_path) as file_obj:
+                return json.load(file_obj,
+                                 object_pairs_hook=collections.OrderedDict)
+        except IOError:
+            return collections.OrderedDict()
+
+    def get_manifest(self,
+                     ffdc_prefix):
+
+        r"""
+        Return the manifest for the given FFDC prefix (see store_ffdc).
+
+        Description of arguments:
+        ffdc_prefix                 The FFDC prefix.
+        """
+
+        try:
+            with open(self.get_manifest_path(ffdc_prefix)) as file_obj:
+                return json.load(file_obj,
+                                 object_pairs_hook=collections.OrderedDict)
+        except IOError:
+            raise ValueError("The store has no manifest for FFDC prefix \"" +
+                             ffdc_prefix + "\".")
+
+    def get_ffdc_prefixes(self):
+
+        r"""
+        Return a sorted list of the FFDC prefixes of the manifests in the
+        store.
+        """
+
+        suffix = "manifest.json"
+        return sorted([file_name[:-len(suffix)] for file_name in
+                       os.listdir(self.manifest_dir_path)
+                       if file_name.endswith(suffix)])
+
+    def materialize(self,
+                    ffdc_prefix,
+                    ffdc_dir_path=None):
+
+        r"""
+        Recreate the flat FFDC directory for the given FFDC prefix and return
+        a list of the paths of the files created.  Files which already exist
+        are left alone.  Each file is a copy of its blob which has been
+        checked against its digest (see copy_blob).
+
+        Description of arguments:
+        ffdc_prefix                 The FFDC prefix.
+        ffdc_dir_path               The directory in which the files are to
+                                    be created.  This defaults to the FFDC
+                                    directory path recorded in the manifest.
+        """
+
+        manifest = self.get_manifest(ffdc_prefix)
+        if ffdc_dir_path is None:
+            ffdc_dir_path = manifest['ffdc_dir_path']
+        ffdc_dir_path = os.path.normpath(ffdc_dir_path) + os.sep
+
+        file_paths = []
+        for file_dict in manifest['files']:
+            file_path = ffdc_dir_path + file_dict['name']
+            if os.path.exists(file_path):
+                continue
+            dir_path = os.path.dirname(file_path)
+            if not os.path.isdir(dir_path):
+                os.makedirs(dir_path)
+            self.copy_blob(file_dict['digest'], file_path)
+            file_paths.append(file_path)
+
+        return file_paths
+
+    def sprint_report(self):
+
+        r"""
+        Return a report showing, for each FFDC collection stored, the number
+        of bytes stored and the number saved by deduplication, or an empty
+        string if nothing has been stored.
+
+        Example result:
+
+        Ffdc Prefix                    Files Bytes New_Bytes Saved_Bytes ...
+        ------------------------------ ----- ----- --------- ----------- ...
+        bmc1.170101.123456.               31 88812     88812           0 ...
+        bmc1.170101.130102.               31 88870     13004       75866 ...
+        ==================================================================...
+        Totals                            62 177682   101816       75866 ...
+        """
+
+        all_stats = self.get_stats()
+        if not len(all_stats):
+            return ""
+
+        store_sheet = tally_sheet.tally_sheet(
+            'ffdc prefix', collections.OrderedDict(
+                [(field, 0) for field in stats_fields]), 'ffdc_store_stats')
+        store_sheet.set_sum_fields(stats_fields)
+        for ffdc_prefix, stats in all_stats.items():
+            store_sheet.add_row(ffdc_prefix, collections.OrderedDict(
+                [(field, int(stats.get(field, 0))) for field in
+                 stats_fields]))
+        store_sheet.calc()
+
+        return store_sheet.sprint_report()
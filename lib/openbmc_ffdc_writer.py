@@ -0,0 +1,313 @@
+#!/usr/bin/env python
+
+r"""
+This module provides a writer which streams FFDC data to disk with optional
+compression while enforcing per-file and per-FFDC byte budgets.
+
+When a file's data exceeds its budget, the head and the tail of the data are
+kept and the middle is replaced by a note stating how many bytes were
+omitted.  The writer reports both the original size of the data and the size
+actually stored so that the FFDC index can record them.
+"""
+
+import os
+import collections
+import gzip
+import threading
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+# The file name extension for each supported compression type.
+compression_extensions = {'': "", 'gz': ".gz", 'xz': ".xz"}
+
+
+###############################################################################
+def get_compression(compression):
+
+    r"""
+    Return the given compression type if it is supported.  "xz" falls back to
+    "gz" when no lzma module is available.  Raise ValueError for an unknown
+    type.
+
+    Description of arguments:
+    compression                     "", "gz" or "xz".
+    """
+
+    compression = str(compression or "").lower()
+    if compression not in compression_extensions:
+        raise ValueError("Invalid compression type \"" + compression +
+                         "\".  Valid types: " +
+                         str(sorted(compression_extensions.keys())) + ".")
+    if compression == 'xz' and lzma is None:
+        return 'gz'
+
+    return compression
+
+###############################################################################
+
+
+class ffdc_byte_budget:
+
+    r"""
+    This class tracks the number of bytes which may still be stored for one
+    FFDC collection.  It may be shared by writers in multiple threads.
+    """
+
+    def __init__(self,
+                 max_bytes=0):
+
+        r"""
+        Create an ffdc_byte_budget object.
+
+        Description of arguments:
+        max_bytes                   The maximum number of bytes of data to be
+                                    stored.  0 means no limit.
+        """
+
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.__lock = threading.Lock()
+
+    def take(self,
+             num_bytes):
+
+        r"""
+        Take up to num_bytes bytes from the budget and return the number of
+        bytes taken.
+
+        Description of arguments:
+        num_bytes                   The number of bytes wanted.
+        """
+
+        with self.__lock:
+            if self.max_bytes:
+                num_bytes = max(min(num_bytes,
+                                    self.max_bytes - self.used_bytes), 0)
+            self.used_bytes += num_bytes
+
+        return num_bytes
+
+    def take_share(self,
+                   num_bytes):
+
+        r"""
+        Take up to num_bytes bytes from the budget, but no more than half of
+        the bytes left, and return the number of bytes taken.  This lets a
+        writer reserve room for its tail while leaving room for its head.
+
+        Description of arguments:
+        num_bytes                   The number of bytes wanted.
+        """
+
+        with self.__lock:
+            if self.max_bytes:
+                num_bytes = max(min(num_bytes,
+                                    (self.max_bytes - self.used_bytes) // 2),
+                                0)
+            self.used_bytes += num_bytes
+
+        return num_bytes
+
+    def give(self,
+             num_bytes):
+
+        r"""
+        Return the given number of bytes, which were taken but not used, to
+        the budget.
+
+        Description of arguments:
+        num_bytes                   The number of bytes to be returned.
+        """
+
+        with self.__lock:
+            self.used_bytes -= num_bytes
+
+
+class ffdc_file_writer:
+
+    r"""
+    This class writes one FFDC file.  Data is written to disk as it is
+    received (compressed if requested) until the file's budget is used.
+    After that, only the most recent tail_bytes bytes are kept (in memory)
+    and they are written when the file is closed.  Room for the tail is
+    reserved in the FFDC's budget when the file is opened.
+    """
+
+    def __init__(self,
+                 file_path,
+                 compression="",
+                 max_bytes=0,
+                 byte_budget=None,
+                 tail_bytes=None):
+
+        r"""
+        Create an ffdc_file_writer object and open its file.
+
+        Description of arguments:
+        file_path                   The path of the file to be written.  The
+                                    compression type's extension (e.g.
+                                    ".gz") is appended to this (see the
+                                    file_path attribute).
+        compression                 "", "gz" or "xz" (see get_compression).
+        max_bytes                   The maximum number of bytes of data to be
+                                    stored in this file (before compression).
+                                    0 means no limit.
+        byte_budget                 An ffdc_byte_budget object shared by all
+                                    the files of an FFDC collection.
+        tail_bytes                  The number of bytes at the end of the
+                                    data which are to be kept when the budget
+                                    is exceeded.  This defaults to half of
+                                    max_bytes or, if there is no max_bytes,
+                                    to 1 MB.
+        """
+
+        self.compression = get_compression(compression)
+        self.file_path = file_path + compression_extensions[self.compression]
+        self.max_bytes = max_bytes
+        self.byte_budget = byte_budget
+        if tail_bytes is None:
+            if max_bytes:
+                tail_bytes = max_bytes // 2
+            else:
+                tail_bytes = 1024 * 1024
+        self.tail_bytes = tail_bytes
+        # The tail's share of the FFDC's budget is reserved now so that the
+        # head cannot use the whole budget.  Any of it not needed for the
+        # tail is returned when the file is closed.
+        if byte_budget is not None:
+            self.__tail_reserve = byte_budget.take_share(tail_bytes)
+        else:
+            self.__tail_reserve = tail_bytes
+
+        self.original_bytes = 0
+        self.__head_bytes = 0
+        self.__head_full = False
+        self.__tail_chunks = collections.deque()
+        self.__num_tail_bytes = 0
+        self.__stats = None
+
+        self.__raw_file_obj = None
+        if self.compression == 'gz':
+            # The gzip header is given no file name or time stamp so that
+            # identical data always produces an identical file (see
+            # openbmc_ffdc_store.py).
+            self.__raw_file_obj = open(self.file_path, 'wb')
+            self.__file_obj = gzip.GzipFile("", 'wb',
+                                            fileobj=self.__raw_file_obj,
+                                            mtime=0)
+        elif self.compression == 'xz':
+            self.__file_obj = lzma.LZMAFile(self.file_path, 'wb')
+        else:
+            self.__file_obj = open(self.file_path, 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __take(self,
+               num_bytes):
+
+        r"""
+        Return the number of the next num_bytes bytes which may be written to
+        disk, taking them from the file's and the FFDC's budgets.
+
+        Description of arguments:
+        num_bytes                   The number of bytes wanted.
+        """
+
+        if self.max_bytes:
+            num_bytes = max(min(num_bytes, self.max_bytes - self.tail_bytes -
+                                self.__head_bytes), 0)
+        if self.byte_budget is not None:
+            num_bytes = self.byte_budget.take(num_bytes)
+
+        return num_bytes
+
+    def write(self,
+              buffer):
+
+        r"""
+        Write the given buffer to the file.
+
+        Description of arguments:
+        buffer                      The data to be written.
+        """
+
+        self.original_bytes += len(buffer)
+        if not self.__head_full:
+            num_bytes = self.__take(len(buffer))
+            if num_bytes:
+                self.__file_obj.write(buffer[:num_bytes])
+                self.__head_bytes += num_bytes
+            if num_bytes == len(buffer):
+                return
+            self.__head_full = True
+            buffer = buffer[num_bytes:]
+
+        # Keep only the last tail_bytes bytes.
+        self.__tail_chunks.append(buffer)
+        self.__num_tail_bytes += len(buffer)
+        while self.__num_tail_bytes > self.tail_bytes:
+            excess_bytes = self.__num_tail_bytes - self.tail_bytes
+            if len(self.__tail_chunks[0]) <= excess_bytes:
+                self.__num_tail_bytes -= len(self.__tail_chunks.popleft())
+            else:
+                self.__tail_chunks[0] = self.__tail_chunks[0][excess_bytes:]
+                self.__num_tail_bytes -= excess_bytes
+
+    def close(self):
+
+        r"""
+        Write the kept tail (if any), close the file and return a dictionary
+        describing it with the following keys:
+        file_path                   The path of the file written.
+        original_bytes              The number of bytes of data received.
+        stored_bytes                The number of bytes of data stored (before
+                                    compression).
+        file_bytes                  The size of the file on disk.
+        compression                 The compression type.
+        omitted_bytes               The number of bytes of data which were
+                                    omitted because of the byte budgets.
+        """
+
+        if self.__stats is not None:
+            return self.__stats
+
+        stored_bytes = self.__head_bytes
+        tail = ""
+        if self.__head_full:
+            tail = "".join(self.__tail_chunks)
+            tail = tail[len(tail) - min(len(tail), self.__tail_reserve):]
+            if self.original_bytes > stored_bytes + len(tail):
+                # Data was dropped between the head and the tail so start the
+                # tail at a line boundary for readability.
+                tail = tail[tail.find("\n") + 1:]
+            omitted_bytes = self.original_bytes - stored_bytes - len(tail)
+            if omitted_bytes:
+                self.__file_obj.write("\n[" + str(omitted_bytes) +
+                                      " bytes omitted by the FFDC writer]\n")
+            self.__file_obj.write(tail)
+            stored_bytes += len(tail)
+        if self.byte_budget is not None:
+            self.byte_budget.give(self.__tail_reserve - len(tail))
+        self.__file_obj.close()
+        if self.__raw_file_obj is not None:
+            self.__raw_file_obj.close()
+
+        self.__stats = collections.OrderedDict(
+            [('file_path', self.file_path),
+             ('original_bytes', self.original_bytes),
+             ('stored_bytes', stored_bytes),
+             ('file_bytes', os.path.getsize(self.file_path)),
+             ('compression', self.compression),
+             ('omitted_bytes', self.original_bytes - stored_bytes)])
+
+        return self.__stats
@@ -0,0 +1,508 @@
+#!/usr/bin/env python
+
+r"""
+This module is a python REST client for the BMC with the same semantics as
+the REST keywords in rest_client.robot (DBUS_PREFIX, AUTH_URI, "/attr/",
+"/action/", "/enumerate", "/list").
+
+Python modules (e.g. state.py, code_update.py) may call these functions
+directly rather than running the REST keywords through BuiltIn().run_keyword.
+The functions are also available to robot programs as keywords (e.g.
+"Rest Read Attribute").
+
+Requests are made with the BMC's persistent session (see rest_session.py),
+which logs in once and keeps its HTTPS connections alive.  A request which
+fails with a 502, 503 or 504 status, or with a connection error or a timeout
+when it may safely be sent again (see rest_session.request_may_be_resent),
+is retried after a randomized ("jittered"), exponentially increasing delay.
+The jitter keeps many test processes sharing one BMC from retrying in
+lockstep.  This is the only layer which retries: the session makes a single
+attempt at each login and request.
+"""
+
+import os
+import time
+import random
+import json
+import collections
+
+import requests
+
+import rest_session
+import rest_cache
+
+robot_env = 1
+try:
+    from robot.libraries.BuiltIn import BuiltIn
+except ImportError:
+    robot_env = 0
+
+
+# The status codes of responses which are worth retrying.
+retry_status_codes = [requests.codes.bad_gateway,
+                      requests.codes.service_unavailable,
+                      requests.codes.gateway_timeout]
+
+
+###############################################################################
+def get_dbus_prefix():
+
+    r"""
+    Return the D-Bus URI prefix, which is the value of the DBUS_PREFIX robot
+    variable or environment variable (or "").
+    """
+
+    if robot_env:
+        dbus_prefix = BuiltIn().get_variable_value("${DBUS_PREFIX}")
+        if dbus_prefix is not None:
+            return dbus_prefix
+
+    return os.environ.get('DBUS_PREFIX', "")
+
+###############################################################################
+
+
+###############################################################################
+def get_retry_delay(attempt,
+                    base_delay=1.0,
+                    max_delay=10.0):
+
+    r"""
+    Return the number of seconds to wait before the given retry.  The delay
+    is chosen at random from 0 to base_delay * 2 ** (attempt - 1) seconds,
+    capped at max_delay ("full jitter").
+
+    Description of arguments:
+    attempt                         The number of the attempt which has just
+                                    failed (1 for the first).
+    base_delay                      The maximum delay after the first
+                                    attempt.
+    max_delay                       The maximum delay after any attempt.
+    """
+
+    return random.uniform(0, min(max_delay,
+                                 base_delay * 2 ** (attempt - 1)))
+
+###############################################################################
+
+
+###############################################################################
+def rest_request(method,
+                 uri,
+                 timeout=10,
+                 attempts=3,
+                 base_delay=1.0,
+                 cache=1,
+                 **kwargs):
+
+    r"""
+    Make a REST request of the BMC and return the requests.Response,
+    retrying with jittered exponential backoff if the request fails with a
+    transient error (see the module prolog).  The response of the last
+    attempt is returned even if its status is not 200.  If the last attempt
+    fails with a connection error or a timeout, the exception is raised.
+
+    GET responses are cached if the REST cache is enabled for the URI (see
+    rest_cache.py).
+
+    Description of arguments:
+    method                          The HTTP method (e.g. "GET").
+    uri                             The URI (e.g.
+                                    "/xyz/openbmc_project/state/bmc0").  The
+                                    D-Bus prefix (see get_dbus_prefix) is
+                                    prepended to it.
+    timeout                         The number of seconds to allow for each
+                                    attempt.
+    attempts                        The maximum number of attempts to be
+                                    made.
+    base_delay                      The maximum delay in seconds after the
+                                    first attempt (see get_retry_delay).
+    cache                           Use the REST cache.  Set this to 0 to get
+                                    live data.
+    kwargs                          Any other arguments for
+                                    requests.Session.request (e.g. json,
+                                    headers).
+    """
+
+    method = method.upper()
+    uri = get_dbus_prefix() + uri
+    attempts = int(attempts)
+    session = rest_session.get_rest_session()
+
+    def send_func(extra_headers):
+        send_kwargs = dict(kwargs)
+        if len(extra_headers):
+            send_kwargs['headers'] = dict(kwargs.get('headers') or {},
+                                          **extra_headers)
+        for attempt in range(1, attempts + 1):
+            try:
+                resp = session.request(method, uri, timeout=float(timeout),
+                                       reconnect=0, **send_kwargs)
+                if resp.status_code not in retry_status_codes or\
+                   attempt == attempts:
+                    return resp
+            except (requests.exceptions.Timeout,
+                    requests.exceptions.ConnectionError) as exception:
+                if attempt == attempts or\
+                   not rest_session.request_may_be_resent(method, exception,
+                                                          uri):
+                    raise
+            time.sleep(get_retry_delay(attempt, float(base_delay)))
+
+    return rest_cache.cached_request(session.base_url, method, uri,
+                                     send_func, cache, **kwargs)
+
+###############################################################################
+
+
+###############################################################################
+def get_response_data(resp):
+
+    r"""
+    Return the "data" of the given response's JSON content.  Raise
+    requests.HTTPError if the response's status is not 200.
+
+    Description of arguments:
+    resp                            A requests.Response from the BMC.
+    """
+
+    if resp.status_code != requests.codes.ok:
+        message = str(resp.status_code) + " " + str(resp.reason) +\
+            " for " + resp.url
+        try:
+            # The BMC describes most errors in the JSON content.
+            message += ": " + str(resp.json()['data']['description'])
+        except (ValueError, KeyError, TypeError):
+            pass
+        raise requests.HTTPError(message, response=resp)
+
+    return json.loads(resp.content,
+                      object_pairs_hook=collections.OrderedDict)['data']
+
+###############################################################################
+
+
+###############################################################################
+def rest_read_attribute(uri,
+                        attr,
+                        timeout=10):
+
+    r"""
+    Return the value of the given attribute (as "Read Attribute" does).
+
+    Description of arguments:
+    uri                             The object's URI (e.g.
+                                    "/xyz/openbmc_project/state/bmc0/").
+    attr                            The attribute name (e.g.
+                                    "CurrentBMCState").
+    timeout                         The number of seconds to allow for each
+                                    attempt.
+    """
+
+    return get_response_data(rest_request(
+        "GET", uri.rstrip("/") + "/attr/" + attr, timeout=timeout))
+
+###############################################################################
+
+
+###############################################################################
+def rest_write_attribute(uri,
+                         attr,
+                         value,
+                         timeout=10):
+
+    r"""
+    Set the given attribute to the given value (as "Write Attribute" does).
+
+    Description of arguments:
+    uri                             The object's URI.
+    attr                            The attribute name (e.g.
+                                    "RequestedBMCTransition").
+    value                           The value to be written.
+    timeout                         The number of seconds to allow for each
+                                    attempt.
+    """
+
+    return get_response_data(rest_request(
+        "PUT", uri.rstrip("/") + "/attr/" + attr, timeout=timeout,
+        json={'data': value}))
+
+###############################################################################
+
+
+###############################################################################
+def rest_read_properties(uri,
+                         timeout=10):
+
+    r"""
+    Return an ordered dictionary of the given object's properties (as "Read
+    Properties" does).
+
+    Description of arguments:
+    uri                             The object's URI.
+    timeout                         The number of seconds to allow for each
+                                    attempt.
+    """
+
+    return get_response_data(rest_request("GET", uri, timeout=timeout))
+
+###############################################################################
+
+
+###############################################################################
+def rest_call_method(uri,
+                     method,
+                     args=[],
+                     timeout=10):
+
+    r"""
+    Call the given D-Bus method of the given object and return the data it
+    returns (as "Call Method" does, but raising requests.HTTPError if the
+    call fails).
+
+    Description of arguments:
+    uri                             The object's URI.
+    method                          The method name (e.g. "DeleteAll").
+    args                            A list of the method's arguments.
+    timeout                         The number of seconds to allow for each
+                                    attempt.
+    """
+
+    return get_response_data(rest_request(
+        "POST", uri.rstrip("/") + "/action/" + method, timeout=timeout,
+        json={'data': args}))
+
+###############################################################################
+
+
+###############################################################################
+def rest_enumerate(uri,
+                   timeout=10):
+
+    r"""
+    Return an ordered dictionary of the properties of every object under the
+    given URI, keyed by object URI.
+
+    Description of arguments:
+    uri                             The URI under which objects are to be
+                                    enumerated (e.g.
+                                    "/xyz/openbmc_project/software/").
+    timeout                         The number of seconds to allow for each
+                                    attempt.
+    """
+
+    return get_response_data(rest_request(
+        "GET", uri.rstrip("/") + "/enumerate", timeout=timeout))
+
+###############################################################################
+
+
+###############################################################################
+def rest_list(uri,
+              timeout=10):
+
+    r"""
+    Return a list of the URIs of the objects under the given URI.
+
+    Description of arguments:
+    uri                             The URI under which objects are to be
+                                    listed.
+    timeout                         The number of seconds to allow for each
+                                    attempt.
+    """
+
+    return get_response_data(rest_request(
+        "GET", uri.rstrip("/") + "/list", timeout=timeout))
+
+###############################################################################
+
+
+###############################################################################
+def get_subtree_groups(uris,
+                       subtree_depth=3):
+
+    r"""
+    Group the given object URIs by subtree and return an ordered dictionary
+    mapping the root of each subtree to a list of its object URIs.
+
+    The URIs are grouped by their first subtree_depth path components (e.g.
+    "/xyz/openbmc_project/state").  The root of each group is the longest
+    path which all of its URIs share.  For example, the URIs of the BMC,
+    chassis and host state objects are grouped under
+    "/xyz/openbmc_project/state".
+
+    Description of arguments:
+    uris                            A list of object URIs (without trailing
+                                    slashes).
+    subtree_depth                   The number of leading path components
+                                    which URIs must share to be grouped.
+                                    This keeps very large subtrees (e.g.
+                                    "/xyz/openbmc_project") from being
+                                    enumerated.
+    """
+
+    groups = collections.OrderedDict()
+    for uri in uris:
+        key = "/".join(uri.split("/")[:subtree_depth + 1])
+        groups.setdefault(key, [])
+        if uri not in groups[key]:
+            groups[key].append(uri)
+
+    subtree_groups = collections.OrderedDict()
+    for group_uris in groups.values():
+        path_lists = [uri.split("/") for uri in group_uris]
+        common_path_list = path_lists[0]
+        for path_list in path_lists[1:]:
+            ix = 0
+            while ix < min(len(common_path_list), len(path_list)) and\
+                    common_path_list[ix] == path_list[ix]:
+                ix += 1
+            common_path_list = common_path_list[:ix]
+        subtree_groups["/".join(common_path_list)] = group_uris
+
+    return subtree_groups
+
+###############################################################################
+
+
+###############################################################################
+def rest_read_objects(uris,
+                      timeout=10,
+                      subtree_depth=3):
+
+    r"""
+    Return an ordered dictionary mapping each of the given object URIs to an
+    ordered dictionary of its properties.  Objects which do not exist are
+    left out.
+
+    Each subtree (see get_subtree_groups) having more than one of the objects
+    is read with a single "/enumerate" request.  Each subtree which has only
+    one object, or whose enumeration fails, is read one object at a time.
+
+    An error reading one subtree does not prevent the others from being
+    read: the objects of that subtree are simply left out.  Only if every
+    subtree fails is the last error raised.
+
+    Description of arguments:
+    uris                            A list of object URIs.
+    timeout                         The number of seconds to allow for each
+                                    attempt of each request.
+    subtree_depth                   See get_subtree_groups.
+    """
+
+    uris = [uri.rstrip("/") for uri in uris]
+    objects = collections.OrderedDict()
+    groups = get_subtree_groups(uris, int(subtree_depth))
+    num_failed_groups = 0
+    for subtree_uri, group_uris in groups.items():
+        try:
+            if len(group_uris) > 1:
+                try:
+                    subtree = rest_enumerate(subtree_uri, timeout=timeout)
+                    for uri in group_uris:
+                        if uri in subtree:
+                            objects[uri] = subtree[uri]
+                    continue
+                except requests.HTTPError:
+                    pass
+            for uri in group_uris:
+                try:
+                    objects[uri] = rest_read_properties(uri, timeout=timeout)
+                except requests.HTTPError as exception:
+                    if exception.response is None or\
+                       exception.response.status_code !=\
+                       requests.codes.not_found:
+                        raise
+        except (requests.exceptions.RequestException, ValueError,
+                KeyError):
+            num_failed_groups += 1
+            if num_failed_groups == len(groups):
+                raise
+
+    return objects
+
+###############################################################################
+
+
+###############################################################################
+def rest_read_attributes(uri_attrs,
+                         timeout=10,
+                         subtree_depth=3):
+
+    r"""
+    Read the given attributes with as few requests as possible (see
+    rest_read_objects) and return a tuple of the values read and the
+    attributes which were missing (including those which could not be read
+    because of an error).
+
+    The values are returned as an ordered dictionary mapping each (URI,
+    attribute name) pair to the attribute's value.  The missing attributes
+    (including those of objects which do not exist) are returned as a list
+    of (URI, attribute name) pairs.
+
+    Example:
+
+    values, missing = rest_read_attributes(
+        [(BMC_STATE_URI, "CurrentBMCState"),
+         (HOST_STATE_URI, "CurrentHostState")])
+
+    Description of arguments:
+    uri_attrs                       A list of (URI, attribute name) pairs.
+    timeout                         The number of seconds to allow for each
+                                    attempt of each request.
+    subtree_depth                   See get_subtree_groups.
+    """
+
+    objects = rest_read_objects([uri for uri, attr in uri_attrs], timeout,
+                                subtree_depth)
+    values = collections.OrderedDict()
+    missing = []
+    for uri, attr in uri_attrs:
+        properties = objects.get(uri.rstrip("/"), {})
+        if attr in properties:
+            values[(uri, attr)] = properties[attr]
+        else:
+            missing.append((uri, attr))
+
+    return values, missing
+
+###############################################################################
+
+
+###############################################################################
+def read_attributes(**uri_attr_map):
+
+    r"""
+    Read the given attributes with as few requests as possible and return a
+    dictionary of the values read, keyed by URI and then by attribute name,
+    and a list of the "<URI> <attribute name>" of each attribute which was
+    missing.  This is the robot keyword form of rest_read_attributes.
+
+    Example robot code:
+
+    ${uri_attr_map}=  Create Dictionary  ${BMC_STATE_URI}=CurrentBMCState
+    ...  ${HOST_STATE_URI}=CurrentHostState
+    ${values}  ${missing}=  Read Attributes  &{uri_attr_map}
+    ${bmc_values}=  Get From Dictionary  ${values}  ${BMC_STATE_URI}
+    ${bmc_state}=  Get From Dictionary  ${bmc_values}  CurrentBMCState
+
+    Description of arguments:
+    uri_attr_map                    A dictionary mapping each URI to an
+                                    attribute name or to a list of attribute
+                                    names.
+    """
+
+    uri_attrs = []
+    for uri, attrs in uri_attr_map.items():
+        if isinstance(attrs, basestring):
+            attrs = [attrs]
+        uri_attrs.extend([(uri, attr) for attr in attrs])
+    values, missing = rest_read_attributes(uri_attrs)
+
+    uri_values = collections.OrderedDict()
+    for (uri, attr), value in values.items():
+        uri_values.setdefault(uri, collections.OrderedDict())[attr] = value
+
+    return uri_values, [uri + " " + attr for uri, attr in missing]
+
+###############################################################################
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+r"""
+This module indexes the objects returned by a REST "/enumerate" so that
+endpoint queries need not scan every object path.
+
+A path_trie holds the object paths in a trie (one node per path component)
+with two indexes:
+- a leaf name index, keyed by leaf name less any trailing digits (e.g. the
+  paths ending in "cpu0" and "cpu1" are both listed under "cpu"), and
+- a property index, keyed by property name.
+
+Each query (see get_endpoint_paths, get_children, get_subtree_paths and
+get_paths_with_property) takes time proportional to the size of its result,
+except for an endpoint query with a regular expression, which must still
+match every path.
+
+The robot keywords (e.g. "Get Trie Endpoint Paths") build the trie for a URI
+on first use and reuse it for as long as the enumerate response is
+unchanged.  With the REST cache enabled for the URI (see rest_cache.py), one
+trie therefore serves a whole suite.
+"""
+
+import re
+import collections
+
+import openbmc_rest
+
+
+class path_trie:
+
+    r"""
+    This class is a trie of the object paths of an enumerate response.
+    """
+
+    def __init__(self,
+                 objects={}):
+
+        r"""
+        Create a path_trie object.
+
+        Description of arguments:
+        objects                     A dictionary mapping object paths to
+                                    dictionaries of their properties (i.e.
+                                    the data of an enumerate response).
+        """
+
+        self.root = self.new_node("")
+        self.leaf_index = {}
+        self.property_index = {}
+        self.num_objects = 0
+        for path, properties in objects.items():
+            self.add(path, properties)
+
+    def new_node(self,
+                 path):
+
+        r"""
+        Return a new trie node for the given path.
+
+        Description of arguments:
+        path                        The node's path.
+        """
+
+        return {'path': path, 'properties': None,
+                'children': collections.OrderedDict()}
+
+    def get_node(self,
+                 path):
+
+        r"""
+        Return the trie node for the given path or None if there is none.
+
+        Description of arguments:
+        path                        The path (e.g.
+                                    "/xyz/openbmc_project/inventory/system").
+        """
+
+        node = self.root
+        for name in path.strip("/").split("/"):
+            if name == "":
+                continue
+            node = node['children'].get(name)
+            if node is None:
+                return None
+
+        return node
+
+    def add(self,
+            path,
+            properties):
+
+        r"""
+        Add the given object to the trie and its indexes.
+
+        Description of arguments:
+        path                        The object's path.
+        properties                  A dictionary of the object's properties.
+        """
+
+        node = self.root
+        for name in path.strip("/").split("/"):
+            if name not in node['children']:
+                node['children'][name] = self.new_node(
+                    node['path'] + "/" + name)
+            node = node['children'][name]
+        if node['properties'] is None:
+            self.num_objects += 1
+            self.leaf_index.setdefault(re.sub(r"[0-9]+$", "", name),
+                                       []).append(node['path'])
+        else:
+            for property_name in node['properties']:
+                self.property_index[property_name].remove(node['path'])
+        node['properties'] = properties
+        for property_name in properties:
+            self.property_index.setdefault(property_name,
+                                           []).append(node['path'])
+
+    def get_endpoint_paths(self,
+                           endpoint):
+
+        r"""
+        Return a sorted list of the object paths matching the given endpoint
+        (as "Get Endpoint Paths" does).
+
+        An endpoint which is a plain name (e.g. "cpu") matches the paths
+        whose leaf names are the endpoint followed by zero or more digits
+        (e.g. ".../motherboard/cpu0" and ".../motherboard/cpu1") and is looked
+        up in the leaf name index.  Any other endpoint is a regular expression
+        (e.g. "fan*" or "*_vdn_temp") and is matched against every path with
+        the regexp used by "Get Endpoint Paths":
+
+        ^.*[0-9a-z_].<endpoint>[0-9]*$
+
+        Description of arguments:
+        endpoint                    The endpoint (e.g. "cpu").
+        """
+
+        if re.match(r"^[0-9A-Za-z_]+$", endpoint):
+            paths = self.leaf_index.get(re.sub(r"[0-9]+$", "", endpoint), [])
+            regex = re.compile("/" + endpoint + "[0-9]*$")
+            return sorted([path for path in paths if regex.search(path)])
+
+        regex = re.compile("^.*[0-9a-z_]." + endpoint + "[0-9]*$")
+
+        return sorted([path for path in self.get_subtree_paths("/")
+                       if regex.match(path)])
+
+    def get_children(self,
+                     path):
+
+        r"""
+        Return a list of the paths of the immediate children of the given
+        path (whether or not they are objects themselves).
+
+        Description of arguments:
+        path                        The parent path.
+        """
+
+        node = self.get_node(path)
+        if node is None:
+            return []
+
+        return [child['path'] for child in node['children'].values()]
+
+    def get_subtree_paths(self,
+                          path):
+
+        r"""
+        Return a list of the paths of all of the objects at or under the
+        given path.
+
+        Description of arguments:
+        path                        The path.
+        """
+
+        node = self.get_node(path)
+        paths = []
+        nodes = [] if node is None else [node]
+        while len(nodes):
+            node = nodes.pop()
+            if node['properties'] is not None:
+                paths.append(node['path'])
+            nodes.extend(reversed(node['children'].values()))
+
+        return paths
+
+    def get_paths_with_property(self,
+                                property_name,
+                                value=None):
+
+        r"""
+        Return a list of the paths of the objects having the given property
+        (and, if given, value).
+
+        Description of arguments:
+        property_name               The property name (e.g. "Present").
+        value                       The property value.  None means any
+                                    value.
+        """
+
+        paths = self.property_index.get(property_name, [])
+        if value is None:
+            return list(paths)
+
+        return [path for path in paths if
+                self.get_node(path)['properties'][property_name] == value]
+
+
+# The path_trie for each enumerated URI, keyed by URI, with the response it
+# was built from.
+path_tries = {}
+
+
+###############################################################################
+def get_path_trie(uri,
+                  timeout=30):
+
+    r"""
+    Return the path_trie for the objects under the given URI.  The URI is
+    enumerated (see openbmc_rest.rest_request) and the trie is rebuilt only
+    if the response differs from the one it was last built from (e.g. if it
+    was not answered from the REST cache).
+
+    Description of arguments:
+    uri                             The URI to be enumerated (e.g.
+                                    "/xyz/openbmc_project/inventory").
+    timeout                         The number of seconds to allow for the
+                                    enumerate request.
+    """
+
+    resp = openbmc_rest.rest_request("GET", uri.rstrip("/") + "/enumerate",
+                                     timeout=timeout)
+    trie, trie_resp = path_tries.get(uri, (None, None))
+    if trie is None or resp is not trie_resp:
+        trie = path_trie(openbmc_rest.get_response_data(resp))
+        path_tries[uri] = (trie, resp)
+
+    return trie
+
+###############################################################################
+
+
+###############################################################################
+def get_trie_endpoint_paths(uri,
+                            endpoint,
+                            timeout=30):
+
+    r"""
+    Return a sorted list of the object paths under the given URI which match
+    the given endpoint (see path_trie.get_endpoint_paths).
+
+    Description of arguments:
+    uri                             The URI to be enumerated.
+    endpoint                        The endpoint (e.g. "cpu" or "fan*").
+    timeout                         See get_path_trie.
+    """
+
+    return get_path_trie(uri, timeout).get_endpoint_paths(endpoint)
+
+###############################################################################
+
+
+###############################################################################
+def get_trie_children(uri,
+                      path,
+                      timeout=30):
+
+    r"""
+    Return a list of the paths of the immediate children of the given path
+    under the given URI.
+
+    Description of arguments:
+    uri                             The URI to be enumerated.
+    path                            The parent path.
+    timeout                         See get_path_trie.
+    """
+
+    return get_path_trie(uri, timeout).get_children(path)
+
+###############################################################################
+
+
+###############################################################################
+def get_trie_paths_with_property(uri,
+                                 property_name,
+                                 value=None,
+                                 timeout=30):
+
+    r"""
+    Return a list of the paths of the objects under the given URI which have
+    the given property (and, if given, value).
+
+    Description of arguments:
+    uri                             The URI to be enumerated.
+    property_name                   The property name (e.g. "Present").
+    value                           The property value.  None means any
+                                    value.
+    timeout                         See get_path_trie.
+    """
+
+    return get_path_trie(uri, timeout).get_paths_with_property(property_name,
+                                                                value)
+
+###############################################################################
+
+
+###############################################################################
+def clear_path_tries():
+
+    r"""
+    Discard all of the path tries.
+    """
+
+    path_tries.clear()
+
+###############################################################################
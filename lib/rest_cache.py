@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+
+r"""
+This module provides an opt-in cache of REST GET responses for read-mostly
+subtrees such as the inventory, the software versions and the settings.
+
+Caching is enabled by giving a time to live (TTL) for one or more URI
+prefixes, either with the "Set REST Cache TTLs" keyword or with the
+REST_CACHE_TTLS environment variable, e.g.:
+
+REST_CACHE_TTLS="/xyz/openbmc_project/inventory=300
+/xyz/openbmc_project/software=60"
+
+A GET of a URI under one of the prefixes is answered from the cache until
+its TTL (that of the longest matching prefix) expires.  An expired response
+which has an ETag is revalidated with If-None-Match.
+
+- Each cached response is bound to the BMC's boot ID (read over the pooled
+  SSH connection, at most every boot_id_check_interval seconds) so nothing
+  cached before a BMC reboot is ever returned after it.
+- Any PUT, POST or DELETE invalidates the cached responses in the same
+  subtree (see get_subtree).
+- Callers may bypass the cache for a single request (cache=0) or for all
+  requests (see set_rest_cache_bypass) when they need live data.
+
+The hit rate and other counts are returned by get_rest_cache_stats.
+"""
+
+import os
+import re
+import time
+import urlparse
+import collections
+
+# The fields of the cache's counts.
+stats_fields = ['hits', 'misses', 'revalidations', 'bypasses', 'stores',
+                'invalidations']
+
+# The number of seconds for which a BMC's boot ID is trusted before it is
+# read again.
+boot_id_check_interval = 10
+
+# The number of leading path components which define a subtree (see
+# get_subtree).
+subtree_depth = 3
+
+# The URI prefixes to be cached, mapped to their TTLs in seconds.
+cache_ttls = collections.OrderedDict()
+
+# The cached responses, keyed by (base URL, URI).  Each entry is a
+# dictionary with boot_id, expires and resp keys.
+cache_entries = {}
+
+# The boot ID of each BMC and when it was read, keyed by base URL.
+boot_ids = {}
+
+cache_stats = collections.OrderedDict([(field, 0) for field in
+                                       stats_fields])
+
+# Bypass the cache for all requests.
+bypass_all = 0
+
+
+###############################################################################
+def set_rest_cache_ttls(**prefix_ttls):
+
+    r"""
+    Set the TTLs of the URI prefixes to be cached, replacing any set before.
+    Calling this with no arguments disables the cache.
+
+    Example robot code:
+
+    Set REST Cache TTLs  /xyz/openbmc_project/inventory=300
+    ...  /xyz/openbmc_project/software=60
+
+    Description of arguments:
+    prefix_ttls                     The URI prefixes to be cached, mapped to
+                                    their TTLs in seconds.
+    """
+
+    cache_ttls.clear()
+    # Order the prefixes longest first so that get_ttl finds the most
+    # specific one.
+    for prefix in sorted(prefix_ttls, key=len, reverse=True):
+        cache_ttls[prefix] = float(prefix_ttls[prefix])
+    clear_rest_cache()
+
+###############################################################################
+
+
+###############################################################################
+def set_rest_cache_bypass(bypass=1):
+
+    r"""
+    Bypass (or stop bypassing) the cache for all requests.  Responses are
+    still stored so that the cache is fresh when bypassing stops.
+
+    Description of arguments:
+    bypass                          Bypass the cache.
+    """
+
+    global bypass_all
+
+    bypass_all = int(bypass)
+
+###############################################################################
+
+
+###############################################################################
+def get_ttl(uri):
+
+    r"""
+    Return the TTL for the given URI (0 if it is not to be cached).
+
+    Description of arguments:
+    uri                             The URI.
+    """
+
+    for prefix, ttl in cache_ttls.items():
+        if uri.startswith(prefix):
+            return ttl
+
+    return 0
+
+###############################################################################
+
+
+###############################################################################
+def get_subtree(uri):
+
+    r"""
+    Return the subtree of the given URI, which is its object path (less any
+    "/enumerate", "/list", "/attr/<name>" or "/action/<name>" suffix) cut to
+    its first subtree_depth path components.  For example, the subtree of
+    "/xyz/openbmc_project/software/3a2b/attr/Priority" is
+    "/xyz/openbmc_project/software".
+
+    Description of arguments:
+    uri                             The URI.
+    """
+
+    path = re.sub(r"/(enumerate|list|attr/[^/]+|action/[^/]+)/?$", "",
+                  uri.rstrip("/"))
+
+    return "/".join(path.split("/")[:subtree_depth + 1])
+
+###############################################################################
+
+
+###############################################################################
+def clear_rest_cache():
+
+    r"""
+    Discard all cached responses and boot IDs.
+    """
+
+    cache_entries.clear()
+    boot_ids.clear()
+
+###############################################################################
+
+
+###############################################################################
+def invalidate_rest_cache(uri,
+                          base_url=None):
+
+    r"""
+    Discard the cached responses in the same subtree as the given URI (i.e.
+    which a write to it could have changed).
+
+    Description of arguments:
+    uri                             The URI written to.
+    base_url                        The BMC's base URL.  None means all BMCs.
+    """
+
+    subtree = get_subtree(uri) + "/"
+    for key in cache_entries.keys():
+        if base_url is not None and key[0] != base_url:
+            continue
+        entry_subtree = get_subtree(key[1]) + "/"
+        if entry_subtree.startswith(subtree) or\
+           subtree.startswith(entry_subtree):
+            del cache_entries[key]
+            cache_stats['invalidations'] += 1
+
+###############################################################################
+
+
+###############################################################################
+def get_boot_id(base_url):
+
+    r"""
+    Return the boot ID of the BMC with the given base URL or None if it
+    cannot be read.  A boot ID read within the last boot_id_check_interval
+    seconds is reused.
+
+    Description of arguments:
+    base_url                        The BMC's base URL.
+    """
+
+    boot_id, checked_at = boot_ids.get(base_url, (None, 0))
+    if boot_id is not None and\
+       time.time() - checked_at < boot_id_check_interval:
+        return boot_id
+
+    # ssh_pool is imported here since it needs paramiko, which is only
+    # needed once caching is enabled.
+    import ssh_pool
+    try:
+        stdout, stderr, rc = ssh_pool.execute_ssh_command(
+            "cat /proc/sys/kernel/random/boot_id", timeout=10,
+            host=urlparse.urlparse(base_url).hostname)
+    except Exception:
+        boot_ids.pop(base_url, None)
+        return None
+    if rc != 0 or stdout == "":
+        boot_ids.pop(base_url, None)
+        return None
+    boot_ids[base_url] = (stdout.strip(), time.time())
+
+    return stdout.strip()
+
+###############################################################################
+
+
+###############################################################################
+def cached_request(base_url,
+                   method,
+                   uri,
+                   send_func,
+                   cache=1,
+                   **kwargs):
+
+    r"""
+    Make a REST request using the cache and return the requests.Response.
+
+    Description of arguments:
+    base_url                        The BMC's base URL.
+    method                          The HTTP method (e.g. "GET").
+    uri                             The URI.
+    send_func                       A function which sends the request to
+                                    the BMC.  It is called with a dictionary
+                                    of any extra headers to be sent and must
+                                    return the requests.Response.
+    cache                           Use the cache.  If this is 0, the request
+                                    is sent to the BMC and its response is
+                                    stored.
+    kwargs                          The other arguments of the request.
+                                    Requests with query parameters, a body
+                                    or a streamed response are not cached.
+    """
+
+    if method != "GET":
+        resp = send_func({})
+        invalidate_rest_cache(uri, base_url)
+        return resp
+
+    ttl = get_ttl(uri)
+    if not ttl or set(kwargs) & set(['params', 'data', 'json', 'stream']):
+        return send_func({})
+
+    key = (base_url, uri)
+    boot_id = get_boot_id(base_url)
+    entry = cache_entries.get(key)
+    if entry is not None and entry['boot_id'] != boot_id:
+        del cache_entries[key]
+        entry = None
+    if not int(cache) or bypass_all:
+        cache_stats['bypasses'] += 1
+        entry = None
+    elif entry is not None:
+        if time.time() < entry['expires']:
+            cache_stats['hits'] += 1
+            return entry['resp']
+        etag = entry['resp'].headers.get('ETag')
+        if etag is not None:
+            resp = send_func({'If-None-Match': etag})
+            if resp.status_code == 304:
+                cache_stats['revalidations'] += 1
+                entry['expires'] = time.time() + ttl
+                return entry['resp']
+            cache_stats['misses'] += 1
+            store_response(key, boot_id, ttl, resp)
+            return resp
+        cache_stats['misses'] += 1
+    else:
+        cache_stats['misses'] += 1
+
+    resp = send_func({})
+    store_response(key, boot_id, ttl, resp)
+
+    return resp
+
+###############################################################################
+
+
+###############################################################################
+def store_response(key,
+                   boot_id,
+                   ttl,
+                   resp):
+
+    r"""
+    Store the given response in the cache if it is cacheable (i.e. its
+    status is 200 and the BMC's boot ID is known).
+
+    Description of arguments:
+    key                             The cache key (see cache_entries).
+    boot_id                         The BMC's boot ID.
+    ttl                             The response's TTL in seconds.
+    resp                            The requests.Response.
+    """
+
+    if resp.status_code != 200 or boot_id is None:
+        return
+    cache_entries[key] = {'boot_id': boot_id,
+                          'expires': time.time() + ttl,
+                          'resp': resp}
+    cache_stats['stores'] += 1
+
+###############################################################################
+
+
+###############################################################################
+def get_rest_cache_stats():
+
+    r"""
+    Return a dictionary of the cache's counts (see stats_fields) plus its
+    hit rate (the percentage of cacheable GET requests which were answered
+    without fetching the response again).
+    """
+
+    stats = collections.OrderedDict(cache_stats)
+    num_lookups = stats['hits'] + stats['revalidations'] + stats['misses']
+    if num_lookups:
+        stats['hit_rate'] = round(100.0 * (stats['hits'] +
+                                           stats['revalidations']) /
+                                  num_lookups, 1)
+    else:
+        stats['hit_rate'] = 0.0
+    stats['entries'] = len(cache_entries)
+
+    return stats
+
+###############################################################################
+
+
+# Initialize the TTLs from the environment.
+set_rest_cache_ttls(**dict([prefix_ttl.rsplit("=", 1) for prefix_ttl in
+                            os.environ.get('REST_CACHE_TTLS', "").split()]))
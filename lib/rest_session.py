@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+
+r"""
+This module provides a persistent, authenticated REST session for each BMC.
+
+The "OpenBMC <method> Request" keywords in rest_client.robot formerly
+created a session, logged in, made one request and deleted the session,
+which cost a TLS handshake, a login and a new TCP connection per request.
+The rest_session class instead logs in once and keeps its HTTPS connections
+alive.  It logs in again transparently if a request is refused with 401
+(e.g. because the BMC's session expired) and reconnects if the connection is
+reset (e.g. because the BMC rebooted), resending the request only if that is
+safe (see request_may_be_resent).  Sessions may also be invalidated
+explicitly (see invalidate_rest_sessions) when a BMC reboot is initiated.
+
+The counts kept by each session (see get_rest_session_stats) show the
+requests made and the logins and reconnects which were needed for them.
+"""
+
+import re
+import json
+import time
+import collections
+
+import requests
+
+import rest_cache
+
+robot_env = 1
+try:
+    from robot.libraries.BuiltIn import BuiltIn
+except ImportError:
+    robot_env = 0
+
+
+# The fields of the counts kept by each rest_session.
+stats_fields = ['requests', 'logins', 'reauths', 'reconnects',
+                'invalidations']
+
+# The methods which may safely be sent again after a request may have reached
+# the BMC (i.e. when the BMC may already have acted on it).  PUT and DELETE
+# are not among them since the BMC's power and reboot actions are PUTs (e.g.
+# of RequestedHostTransition).
+idempotent_methods = ['GET', 'HEAD']
+
+# A regexp matching the URIs of the BMC's state transition attributes.  A
+# request to one of these is never sent again.
+transition_uri_regex = r"/attr/Requested[A-Za-z]*Transition$"
+
+
+###############################################################################
+def request_may_be_resent(method,
+                          exception,
+                          uri=""):
+
+    r"""
+    Return True if a request which failed with the given exception may be
+    sent again without risk of the BMC acting on it twice.  This is so if the
+    method is GET or HEAD or if the request failed while connecting (i.e.
+    before it was sent).  Any other request (e.g. a PUT of
+    RequestedHostTransition or a POST of a reboot action) whose connection
+    was aborted after it was sent must not be sent again.  A request to a
+    state transition attribute (see transition_uri_regex) is never sent
+    again.
+
+    Description of arguments:
+    method                          The HTTP method (e.g. "POST").
+    exception                       The requests.exceptions.RequestException
+                                    raised by the request.
+    uri                             The URI of the request.
+    """
+
+    if re.search(transition_uri_regex, uri):
+        return False
+    if method.upper() in idempotent_methods:
+        return True
+    if isinstance(exception, requests.exceptions.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason is the error which
+    # ended the request.  A failure to connect (including a refused
+    # connection) is a ConnectTimeoutError (e.g. a NewConnectionError).
+    reason = exception.args[0] if len(exception.args) else None
+    reason = getattr(reason, 'reason', reason)
+
+    return isinstance(reason,
+                      requests.packages.urllib3.exceptions.ConnectTimeoutError)
+
+###############################################################################
+
+
+class rest_session:
+
+    r"""
+    This class is a persistent, authenticated REST session with one BMC.
+    """
+
+    def __init__(self,
+                 base_url,
+                 username,
+                 password,
+                 pool_maxsize=4,
+                 login_timeout=20,
+                 login_attempts=2,
+                 login_interval=20):
+
+        r"""
+        Create a rest_session object.  No connection is made until the first
+        request.
+
+        Description of arguments:
+        base_url                    The BMC's base URL (e.g.
+                                    "https://bmc1:443").
+        username                    The BMC user name.
+        password                    The BMC password.
+        pool_maxsize                The maximum number of connections to be
+                                    kept alive.
+        login_timeout               The number of seconds to allow for each
+                                    attempt at a login made by request.
+        login_attempts              The number of attempts to be made at a
+                                    login made by request.  The defaults
+                                    retry for as long as "Initialize
+                                    OpenBMC" did so that a request made just
+                                    after a BMC reboot still succeeds.
+        login_interval              The number of seconds between those
+                                    attempts.
+        """
+
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.pool_maxsize = pool_maxsize
+        self.login_timeout = login_timeout
+        self.login_attempts = login_attempts
+        self.login_interval = login_interval
+        self.stats = collections.OrderedDict([(field, 0) for field in
+                                              stats_fields])
+        self.__session = None
+
+    def __new_session(self):
+
+        r"""
+        Create a new requests.Session (i.e. a new connection pool).  The
+        session's adapter does not retry failed connections since any
+        retrying is done by the caller (see request and
+        openbmc_rest.rest_request).
+        """
+
+        session = requests.Session()
+        session.verify = False
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.pool_maxsize)
+        session.mount("https://", adapter)
+
+        return session
+
+    def login(self,
+              timeout=20,
+              attempts=1,
+              interval=20):
+
+        r"""
+        Log in to the BMC, retrying at the given interval if more than one
+        attempt is requested (as "Initialize OpenBMC" does).  Raise
+        requests.HTTPError if the login is refused.
+
+        Description of arguments:
+        timeout                     The number of seconds to allow for each
+                                    login attempt.
+        attempts                    The number of attempts to be made.
+        interval                    The number of seconds between attempts.
+        """
+
+        if self.__session is None:
+            self.__session = self.__new_session()
+        for attempt in range(1, attempts + 1):
+            self.stats['logins'] += 1
+            try:
+                resp = self.__session.post(
+                    self.base_url + "/login",
+                    json={'data': [self.username, self.password]},
+                    timeout=timeout)
+                resp.raise_for_status()
+                return
+            except requests.exceptions.RequestException:
+                if attempt == attempts:
+                    self.invalidate(count=0)
+                    raise
+                time.sleep(interval)
+
+    def logout(self,
+               timeout=5):
+
+        r"""
+        Log out of the BMC (ignoring any error) and close the connections.
+
+        Description of arguments:
+        timeout                     The number of seconds to allow for the
+                                    logout.
+        """
+
+        if self.__session is None:
+            return
+        try:
+            self.__session.post(self.base_url + "/logout",
+                                json={'data': []}, timeout=timeout)
+        except requests.exceptions.RequestException:
+            pass
+        self.invalidate(count=0)
+
+    def invalidate(self,
+                   count=1):
+
+        r"""
+        Discard the session's connections and login so that the next request
+        starts afresh.  This should be called when the BMC reboots.
+
+        Description of arguments:
+        count                       Count this as an invalidation in the
+                                    session's stats.
+        """
+
+        if self.__session is not None:
+            self.__session.close()
+            self.__session = None
+            if count:
+                self.stats['invalidations'] += 1
+
+    def request(self,
+                method,
+                uri,
+                timeout=10,
+                reconnect=1,
+                **kwargs):
+
+        r"""
+        Make a REST request and return the requests.Response, logging in first
+        if necessary (see login_timeout, login_attempts and login_interval in
+        __init__).  If the request is refused with 401, log in again and
+        retry it once.  If the connection fails, reconnect, log in and retry
+        it once, provided that it may safely be sent again (see
+        request_may_be_resent) and that reconnect is set.
+
+        Description of arguments:
+        method                      The HTTP method (e.g. "GET").
+        uri                         The URI (e.g.
+                                    "/xyz/openbmc_project/state/bmc0").
+        timeout                     The number of seconds to allow for the
+                                    request.
+        reconnect                   Reconnect and retry the request if the
+                                    connection fails.  Callers which do
+                                    their own retrying (e.g.
+                                    openbmc_rest.rest_request) should set
+                                    this to 0 so that retries are not
+                                    nested.
+        kwargs                      Any other arguments for
+                                    requests.Session.request (e.g. json,
+                                    data, headers).
+        """
+
+        if self.__session is None:
+            self.login(self.login_timeout, self.login_attempts,
+                       self.login_interval)
+        self.stats['requests'] += 1
+        try:
+            resp = self.__session.request(method, self.base_url + uri,
+                                          timeout=timeout, **kwargs)
+        except requests.exceptions.ConnectionError as exception:
+            # The connection was reset or refused.  The BMC has probably
+            # rebooted so its sessions are gone too.
+            self.invalidate(count=0)
+            if not int(reconnect) or\
+               not request_may_be_resent(method, exception, uri):
+                raise
+            self.stats['reconnects'] += 1
+            self.login(self.login_timeout, self.login_attempts,
+                       self.login_interval)
+            return self.__session.request(method, self.base_url + uri,
+                                          timeout=timeout, **kwargs)
+        if resp.status_code == requests.codes.unauthorized:
+            self.stats['reauths'] += 1
+            self.login(self.login_timeout, self.login_attempts,
+                       self.login_interval)
+            resp = self.__session.request(method, self.base_url + uri,
+                                          timeout=timeout, **kwargs)
+
+        return resp
+
+
+# The rest_session objects, keyed by (base URL, user name).
+rest_sessions = collections.OrderedDict()
+
+
+###############################################################################
+def get_rest_session(base_url=None,
+                     username=None,
+                     password=None):
+
+    r"""
+    Return the rest_session for the given BMC, creating it if necessary.  The
+    arguments default to the values of the Robot variables AUTH_URI,
+    OPENBMC_USERNAME and OPENBMC_PASSWORD.
+
+    Description of arguments:
+    base_url                        The BMC's base URL.
+    username                        The BMC user name.
+    password                        The BMC password.
+    """
+
+    if robot_env:
+        if base_url is None:
+            base_url = BuiltIn().get_variable_value("${AUTH_URI}")
+        if username is None:
+            username = BuiltIn().get_variable_value("${OPENBMC_USERNAME}")
+        if password is None:
+            password = BuiltIn().get_variable_value("${OPENBMC_PASSWORD}")
+
+    key = (base_url, username)
+    session = rest_sessions.get(key)
+    if session is None or session.password != password:
+        session = rest_session(base_url, username, password)
+        rest_sessions[key] = session
+
+    return session
+
+###############################################################################
+
+
+###############################################################################
+def openbmc_rest_request(method,
+                         uri,
+                         timeout=10,
+                         cache=1,
+                         **kwargs):
+
+    r"""
+    Make a REST request of the BMC using its persistent session and return
+    the requests.Response.
+
+    As with RequestsLibrary's request keywords, a data argument which is not
+    a string is sent as JSON when the Content-Type header says so.
+
+    GET responses are cached if the REST cache is enabled for the URI (see
+    rest_cache.py).
+
+    Description of arguments:
+    method                          The HTTP method (e.g. "GET").
+    uri                             The URI (e.g.
+                                    "/xyz/openbmc_project/state/bmc0").
+    timeout                         The number of seconds to allow for the
+                                    request.
+    cache                           Use the REST cache.  Set this to 0 to get
+                                    live data.
+    kwargs                          Any other arguments for
+                                    requests.Session.request (e.g. data,
+                                    headers).
+    """
+
+    headers = kwargs.get('headers') or {}
+    data = kwargs.get('data')
+    if data is not None and not isinstance(data, basestring) and \
+            headers.get('Content-Type') == 'application/json':
+        kwargs['data'] = json.dumps(data)
+
+    method = method.upper()
+    session = get_rest_session()
+
+    def send_func(extra_headers):
+        send_kwargs = dict(kwargs)
+        if len(extra_headers):
+            send_kwargs['headers'] = dict(headers, **extra_headers)
+        return session.request(method, uri, timeout=float(timeout),
+                               **send_kwargs)
+
+    return rest_cache.cached_request(session.base_url, method, uri,
+                                     send_func, cache, **kwargs)
+
+###############################################################################
+
+
+###############################################################################
+def get_rest_session_stats():
+
+    r"""
+    Return a dictionary of the counts (see stats_fields) totalled over all of
+    the REST sessions.  For example, if 100 requests needed only 1 login, the
+    result would include "requests: 100" and "logins: 1".
+    """
+
+    totals = collections.OrderedDict([(field, 0) for field in stats_fields])
+    for session in rest_sessions.values():
+        for field in stats_fields:
+            totals[field] += session.stats[field]
+
+    return totals
+
+###############################################################################
+
+
+###############################################################################
+def invalidate_rest_sessions():
+
+    r"""
+    Invalidate all of the REST sessions.  This should be called when a BMC
+    reboot is initiated so that no request is sent on a connection to the
+    old BMC instance.
+    """
+
+    for session in rest_sessions.values():
+        session.invalidate()
+    rest_cache.clear_rest_cache()
+
+###############################################################################
+
+
+###############################################################################
+def close_rest_sessions():
+
+    r"""
+    Log out of and close all of the REST sessions.
+    """
+
+    for session in rest_sessions.values():
+        session.logout()
+    rest_sessions.clear()
+
+###############################################################################
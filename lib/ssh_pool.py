@@ -0,0 +1,438 @@
+#!/usr/bin/env python
+
+r"""
+This module keeps one authenticated SSH transport per (host, port, user) and
+runs each command on its own channel of that transport.
+
+"Open Connection And Log In" (connection_client.robot) opens a new
+SSHLibrary connection, with its TCP connect, key exchange and login, every
+time it is called.  Opening a channel on an existing transport takes a
+single round trip.  Each transport is kept alive with SSH keepalives and is
+health-checked before it is reused after a period of inactivity.  If it has
+died (e.g. because the BMC rebooted), a new one is connected transparently.
+
+Python modules may call execute_ssh_command directly.  Robot programs may use
+the following keywords in place of the usual open/login/close pattern:
+
+Open Pooled Connection                          (Open Connection And Log In)
+Execute Pooled Command  <cmd>  return_stderr=True  return_rc=True
+                                                (Execute Command)
+Close Pooled Connections                        (Close All Connections)
+"""
+
+import os
+import time
+import socket
+import select
+import collections
+
+import paramiko
+
+import gen_misc as gm
+
+robot_env = 1
+try:
+    from robot.libraries.BuiltIn import BuiltIn
+except ImportError:
+    robot_env = 0
+
+
+# The fields of the counts kept by each ssh_connection.
+stats_fields = ['commands', 'connects', 'reconnects', 'health_checks']
+
+
+class ssh_connection:
+
+    r"""
+    This class is a persistent, authenticated SSH transport to one host.
+    """
+
+    def __init__(self,
+                 host,
+                 port,
+                 username,
+                 password,
+                 connect_timeout=30,
+                 health_check_interval=30):
+
+        r"""
+        Create an ssh_connection object.  No connection is made until the
+        first command.
+
+        Description of arguments:
+        host                        The host name or IP address.
+        port                        The SSH port.
+        username                    The user name.
+        password                    The password.
+        connect_timeout             The number of seconds to allow for
+                                    connecting and logging in.
+        health_check_interval       The number of seconds a transport may sit
+                                    idle before it is health-checked prior to
+                                    its next use.
+        """
+
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.connect_timeout = connect_timeout
+        self.health_check_interval = health_check_interval
+        self.stats = collections.OrderedDict([(field, 0) for field in
+                                              stats_fields])
+        self.__transport = None
+        self.__last_used = 0
+
+    def connect(self):
+
+        r"""
+        Connect and log in, replacing any existing transport.
+        """
+
+        self.close()
+        self.stats['connects'] += 1
+        sock = socket.create_connection((self.host, self.port),
+                                        self.connect_timeout)
+        transport = paramiko.Transport(sock)
+        try:
+            transport.connect(username=self.username,
+                              password=self.password)
+        except Exception:
+            transport.close()
+            raise
+        transport.set_keepalive(30)
+        self.__transport = transport
+        self.__last_used = time.time()
+
+    def close(self):
+
+        r"""
+        Close the transport (if any).
+        """
+
+        if self.__transport is not None:
+            self.__transport.close()
+            self.__transport = None
+
+    def is_healthy(self):
+
+        r"""
+        Return True if the transport is usable.  A transport which has been
+        idle for more than health_check_interval seconds is checked by
+        sending an SSH_MSG_IGNORE packet, which fails if the connection has
+        been dropped.
+        """
+
+        if self.__transport is None or not self.__transport.is_active():
+            return False
+        if time.time() - self.__last_used < self.health_check_interval:
+            return True
+        self.stats['health_checks'] += 1
+        try:
+            self.__transport.send_ignore()
+        except (paramiko.SSHException, EnvironmentError, EOFError):
+            return False
+
+        return self.__transport.is_active()
+
+    def open_channel(self):
+
+        r"""
+        Return a new session channel, connecting (or reconnecting) first if
+        the transport is not healthy.
+        """
+
+        if not self.is_healthy():
+            if self.__transport is not None:
+                self.stats['reconnects'] += 1
+            self.connect()
+        try:
+            channel = self.__transport.open_session()
+        except (paramiko.SSHException, EnvironmentError, EOFError):
+            # The transport died since it was checked.
+            self.stats['reconnects'] += 1
+            self.connect()
+            channel = self.__transport.open_session()
+        self.__last_used = time.time()
+
+        return channel
+
+    def execute_command(self,
+                        cmd_buf,
+                        timeout=30):
+
+        r"""
+        Run the given command on its own channel and return its stdout,
+        stderr and exit status.  As with SSHLibrary's "Execute Command", one
+        trailing newline is stripped from the stdout and stderr.  Raise
+        socket.timeout if the command does not finish in time and
+        socket.error if the connection is lost before it finishes.
+
+        Description of arguments:
+        cmd_buf                     The command to be run.
+        timeout                     The number of seconds to allow for the
+                                    command.  None means no limit.
+        """
+
+        if timeout is None:
+            time_left_func = None
+        else:
+            end_time = time.time() + float(timeout)
+
+            def time_left_func():
+                time_left = end_time - time.time()
+                if time_left <= 0:
+                    raise socket.timeout("The command did not finish within "
+                                         + str(timeout) + " seconds: " +
+                                         cmd_buf)
+                return time_left
+
+        channel = self.open_channel()
+        self.stats['commands'] += 1
+        try:
+            return execute_channel_command(channel, cmd_buf, time_left_func)
+        finally:
+            channel.close()
+            self.__last_used = time.time()
+
+
+###############################################################################
+def execute_channel_command(channel,
+                            cmd_buf,
+                            time_left_func=None,
+                            stdout_file_obj=None):
+
+    r"""
+    Run the given command on the given (newly opened) session channel and
+    return its stdout, stderr and exit status.  As with SSHLibrary's "Execute
+    Command", one trailing newline is stripped from the stdout and stderr.
+    Raise socket.error if the connection is lost before the command
+    finishes.  The caller is responsible for closing the channel.
+
+    If stdout_file_obj is given, the stdout is written to it as it arrives
+    (without any stripping) and "" is returned in its place.
+
+    Description of arguments:
+    channel                         A paramiko.Channel on which no command
+                                    has been run.
+    cmd_buf                         The command to be run.
+    time_left_func                  A function which returns the number of
+                                    seconds left for the command and which
+                                    raises socket.timeout if there are none
+                                    (e.g. ffdc_collector.time_left).  None
+                                    means no limit.
+    stdout_file_obj                 A file object for the stdout.
+    """
+
+    channel.exec_command(cmd_buf)
+    stdout_chunks = []
+    stderr_chunks = []
+    while True:
+        if time_left_func is None:
+            wait_time = 1
+        else:
+            wait_time = min(time_left_func(), 1)
+        select.select([channel], [], [], wait_time)
+        while channel.recv_ready():
+            if stdout_file_obj is None:
+                stdout_chunks.append(channel.recv(65536))
+            else:
+                stdout_file_obj.write(channel.recv(65536))
+        while channel.recv_stderr_ready():
+            stderr_chunks.append(channel.recv_stderr(65536))
+        if channel.eof_received and channel.exit_status_ready() and\
+           not channel.recv_ready() and not channel.recv_stderr_ready():
+            break
+        # A channel whose transport dies (e.g. because the BMC rebooted) is
+        # closed without ever receiving an EOF.
+        if channel.closed or not channel.get_transport().is_active():
+            raise socket.error("The connection was lost while running: " +
+                               cmd_buf)
+    rc = channel.recv_exit_status()
+
+    return gm.strip_trailing_newline("".join(stdout_chunks)),\
+        gm.strip_trailing_newline("".join(stderr_chunks)), rc
+
+###############################################################################
+
+
+# The ssh_connection objects, keyed by (host, port, user name).
+ssh_connections = collections.OrderedDict()
+
+# The key of the connection used by default (see open_pooled_connection).
+current_key = None
+
+
+###############################################################################
+def get_ssh_connection(host=None,
+                       port=None,
+                       username=None,
+                       password=None):
+
+    r"""
+    Return the ssh_connection for the given host, port and user, creating it
+    if necessary.  The arguments default to the values of the Robot
+    variables OPENBMC_HOST, SSH_PORT (or 22), OPENBMC_USERNAME and
+    OPENBMC_PASSWORD or, outside of Robot, to the environment variables of
+    the same names.
+
+    Description of arguments:
+    host                            The host name or IP address.
+    port                            The SSH port.
+    username                        The user name.
+    password                        The password.
+    """
+
+    parms = collections.OrderedDict([('OPENBMC_HOST', host),
+                                     ('SSH_PORT', port),
+                                     ('OPENBMC_USERNAME', username),
+                                     ('OPENBMC_PASSWORD', password)])
+    for var_name, value in parms.items():
+        if value in (None, ""):
+            if robot_env:
+                value = BuiltIn().get_variable_value("${" + var_name + "}")
+            else:
+                value = os.environ.get(var_name)
+        parms[var_name] = value
+    host, port, username, password = parms.values()
+    if port in (None, ""):
+        port = 22
+
+    key = (host, int(port), username)
+    connection = ssh_connections.get(key)
+    if connection is None or connection.password != password:
+        connection = ssh_connection(host, port, username, password)
+        ssh_connections[key] = connection
+
+    return connection
+
+###############################################################################
+
+
+###############################################################################
+def execute_ssh_command(cmd_buf,
+                        timeout=30,
+                        **connection_args):
+
+    r"""
+    Run the given command on the pooled connection to the given host and
+    return its stdout, stderr and exit status.
+
+    Description of arguments:
+    cmd_buf                         The command to be run.
+    timeout                         The number of seconds to allow for the
+                                    command (as with SSHLibrary's default
+                                    timeout).  None means no limit.
+    connection_args                 Any of the arguments of
+                                    get_ssh_connection (host, port, username,
+                                    password).  If none are given, the
+                                    current connection (see
+                                    open_pooled_connection) is used.
+    """
+
+    if not len(connection_args) and current_key is not None:
+        connection = ssh_connections[current_key]
+    else:
+        connection = get_ssh_connection(**connection_args)
+
+    return connection.execute_command(cmd_buf, timeout)
+
+###############################################################################
+
+
+###############################################################################
+def open_pooled_connection(host=None,
+                           port=None,
+                           username=None,
+                           password=None):
+
+    r"""
+    Make the pooled connection to the given host the current one, connecting
+    and logging in if it has no healthy transport.  This is the pooled
+    counterpart of "Open Connection And Log In".
+
+    Description of arguments:
+    host                            The host name or IP address.
+    port                            The SSH port.
+    username                        The user name.
+    password                        The password.
+    """
+
+    global current_key
+
+    connection = get_ssh_connection(host, port, username, password)
+    if not connection.is_healthy():
+        connection.connect()
+    current_key = (connection.host, connection.port, connection.username)
+
+###############################################################################
+
+
+###############################################################################
+def execute_pooled_command(command,
+                           return_stdout=True,
+                           return_stderr=False,
+                           return_rc=False,
+                           timeout=30):
+
+    r"""
+    Run the given command on the current pooled connection.  As with
+    SSHLibrary's "Execute Command", return the stdout alone or a list of
+    whichever of the stdout, stderr and exit status are requested.
+
+    Description of arguments:
+    command                         The command to be run.
+    return_stdout                   Return the stdout.
+    return_stderr                   Return the stderr.
+    return_rc                       Return the exit status.
+    timeout                         The number of seconds to allow for the
+                                    command (see execute_ssh_command).
+    """
+
+    stdout, stderr, rc = execute_ssh_command(command, timeout)
+    ret_values = []
+    # Robot passes "True" and "False" as strings.
+    for value, requested in [(stdout, return_stdout), (stderr, return_stderr),
+                             (rc, return_rc)]:
+        if str(requested).lower() not in ("false", "0", "no", "none", ""):
+            ret_values.append(value)
+    if len(ret_values) == 1:
+        return ret_values[0]
+
+    return ret_values
+
+###############################################################################
+
+
+###############################################################################
+def get_ssh_pool_stats():
+
+    r"""
+    Return a dictionary of the counts (see stats_fields) totalled over all of
+    the pooled connections.
+    """
+
+    totals = collections.OrderedDict([(field, 0) for field in stats_fields])
+    for connection in ssh_connections.values():
+        for field in stats_fields:
+            totals[field] += connection.stats[field]
+
+    return totals
+
+###############################################################################
+
+
+###############################################################################
+def close_pooled_connections():
+
+    r"""
+    Close all of the pooled connections.
+    """
+
+    global current_key
+
+    for connection in ssh_connections.values():
+        connection.close()
+    ssh_connections.clear()
+    current_key = None
+
+###############################################################################
@@ -31,13 +31,24 @@ import gen_robot_print as grp
 import gen_valid as gv
 import gen_robot_utils as gru
 import gen_cmd as gc
+import openbmc_rest
+import ssh_pool
 
 import commands
+import requests
+import paramiko
 from robot.libraries.BuiltIn import BuiltIn
 from robot.utils import DotDict
 
 import re
 import os
+import sys
+
+# data/variables.py is imported (as code_update.py does) for its URIs.
+robot_pgm_dir_path = os.path.dirname(os.path.abspath(__file__)) + os.sep
+repo_data_path = re.sub('/lib/$', '/data', robot_pgm_dir_path)
+sys.path.append(repo_data_path)
+import variables as var
 
 # We need utils.robot to get keywords like "Get Chassis Power State".
 gru.my_import_resource("utils.robot")
@@ -58,6 +69,9 @@ gru.my_import_resource("state_manager.robot")
 
 OBMC_STATES_VERSION = int(os.environ.get('OBMC_STATES_VERSION', 1))
 
+# The URI of the boot progress sensor read by get_state.
+BOOT_PROGRESS_URI = var.SENSORS_URI + 'host/BootProgress'
+
 # When a user calls get_state w/o specifying req_states, default_req_states
 # is used as its value.
 default_req_states = ['rest',
@@ -512,45 +526,51 @@ def get_state(openbmc_host="",
                  master_req_login]
     must_login = (len(req_login) > 0)
 
+    # The BMC commands are run on the pooled SSH connection (see ssh_pool.py)
+    # rather than on a new SSHLibrary connection.
     bmc_login = 0
     if must_login:
-        cmd_buf = ["Open Connection And Log In"]
-        if not quiet:
-            grp.rpissuing_keyword(cmd_buf)
-        status, ret_values = \
-            BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
-        if status == "PASS":
+        bmc_connection = ssh_pool.get_ssh_connection(openbmc_host, None,
+                                                     openbmc_username,
+                                                     openbmc_password)
+        try:
+            if not bmc_connection.is_healthy():
+                bmc_connection.connect()
             bmc_login = 1
-        else:
-            if re.match('^Authentication failed for user', ret_values):
-                # An authentication failure is worth failing on.
-                BuiltIn().fail(gp.sprint_error(ret_values))
+        except paramiko.AuthenticationException as exception:
+            # An authentication failure is worth failing on.
+            BuiltIn().fail(gp.sprint_error(str(exception)))
+        except (paramiko.SSHException, EnvironmentError,
+                EOFError) as exception:
+            gp.dprint_var(exception)
 
     if 'uptime' in req_states and bmc_login:
-        cmd_buf = ["Execute Command", "cat /proc/uptime | cut -f 1 -d ' '",
-                   "return_stderr=True", "return_rc=True"]
+        cmd_buf = "cat /proc/uptime | cut -f 1 -d ' '"
         if not quiet:
-            grp.rpissuing_keyword(cmd_buf)
-        status, ret_values = \
-            BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
-        if status == "PASS":
-            stdout, stderr, rc = ret_values
+            gp.pissuing(cmd_buf)
+        try:
+            stdout, stderr, rc = bmc_connection.execute_command(cmd_buf,
+                                                              timeout=10)
             if rc == 0 and stderr == "":
                 uptime = stdout
+        except (paramiko.SSHException, EnvironmentError,
+                EOFError) as exception:
+            gp.dprint_var(exception)
 
     if 'epoch_seconds' in req_states and bmc_login:
         date_cmd_buf = "date -u +%s"
         if USE_BMC_EPOCH_TIME:
-            cmd_buf = ["Execute Command", date_cmd_buf, "return_stderr=True",
-                       "return_rc=True"]
             if not quiet:
-                grp.rpissuing_keyword(cmd_buf)
-            status, ret_values = \
-                BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
-            if status == "PASS":
-                stdout, stderr, rc = ret_values
+                gp.pissuing(date_cmd_buf)
+            try:
+                stdout, stderr, rc = \
+                    bmc_connection.execute_command(date_cmd_buf,
+                                                   timeout=10)
                 if rc == 0 and stderr == "":
                     epoch_seconds = stdout.rstrip("\n")
+            except (paramiko.SSHException, EnvironmentError,
+                    EOFError) as exception:
+                gp.dprint_var(exception)
         else:
             shell_rc, out_buf = gc.cmd_fnc_u(date_cmd_buf,
                                              quiet=1,
@@ -567,51 +587,49 @@ def get_state(openbmc_host="",
     # Though we could try to determine 'rest' state on any of several calls,
     # for simplicity, we'll use 'chassis' to figure it out (even if the caller
     # hasn't explicitly asked for 'chassis').
+    # The REST states are read with a single call to
+    # openbmc_rest.rest_read_attributes (which needs only one request per
+    # subtree) rather than by running "Get Chassis Power State", "Get BMC
+    # State", etc.
     if 'chassis' in req_states or need_rest:
-        cmd_buf = ["Get Chassis Power State", "quiet=${" + str(quiet) + "}"]
+        uri_attrs = [(var.CHASSIS_STATE_URI, "CurrentPowerState")]
+        if OBMC_STATES_VERSION > 0:
+            if 'bmc' in req_states:
+                uri_attrs.append((var.BMC_STATE_URI, "CurrentBMCState"))
+            if 'host' in req_states:
+                uri_attrs.append((var.HOST_STATE_URI, "CurrentHostState"))
+        if 'boot_progress' in req_states:
+            uri_attrs.append((BOOT_PROGRESS_URI, "value"))
+        try:
+            values, missing = openbmc_rest.rest_read_attributes(uri_attrs)
+        except (requests.exceptions.RequestException, ValueError,
+                KeyError) as exception:
+            values, missing = {}, []
+            rest = str(exception)
+        gp.dprint_var(missing)
+        if (var.CHASSIS_STATE_URI, "CurrentPowerState") in values:
+            rest = '1'
+            # Strip everything up to the final period.
+            chassis = re.sub(r'.*\.', "", values[(var.CHASSIS_STATE_URI,
+                                                  "CurrentPowerState")])
+            if (var.BMC_STATE_URI, "CurrentBMCState") in values:
+                bmc = re.sub(r'.*\.', "",
+                             values[(var.BMC_STATE_URI, "CurrentBMCState")])
+            if (var.HOST_STATE_URI, "CurrentHostState") in values:
+                host = re.sub(r'.*\.', "",
+                              values[(var.HOST_STATE_URI, "CurrentHostState")])
+            if (BOOT_PROGRESS_URI, "value") in values:
+                boot_progress = values[(BOOT_PROGRESS_URI, "value")]
+        elif len(missing):
+            rest = "The chassis power state could not be read."
+
+    if rest == '1' and 'bmc' in req_states and OBMC_STATES_VERSION == 0:
+        cmd_buf = ["utils.Get BMC State", "quiet=${" + str(quiet) + "}"]
         grp.rdpissuing_keyword(cmd_buf)
         status, ret_values = \
             BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
         if status == "PASS":
-            chassis = ret_values
-            chassis = re.sub(r'.*\.', "", chassis)
-            rest = '1'
-        else:
-            rest = ret_values
-
-    if rest == '1':
-        if 'bmc' in req_states:
-            if OBMC_STATES_VERSION == 0:
-                qualifier = "utils"
-            else:
-                # This will not be supported much longer.
-                qualifier = "state_manager"
-            cmd_buf = [qualifier + ".Get BMC State",
-                       "quiet=${" + str(quiet) + "}"]
-            grp.rdpissuing_keyword(cmd_buf)
-            status, ret_values = \
-                BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
-            if status == "PASS":
-                bmc = ret_values
-
-        if 'boot_progress' in req_states:
-            cmd_buf = ["Get Boot Progress", "quiet=${" + str(quiet) + "}"]
-            grp.rdpissuing_keyword(cmd_buf)
-            status, ret_values = \
-                BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
-            if status == "PASS":
-                boot_progress = ret_values
-
-        if 'host' in req_states:
-            if OBMC_STATES_VERSION > 0:
-                cmd_buf = ["Get Host State", "quiet=${" + str(quiet) + "}"]
-                grp.rdpissuing_keyword(cmd_buf)
-                status, ret_values = \
-                    BuiltIn().run_keyword_and_ignore_error(*cmd_buf)
-                if status == "PASS":
-                    host = ret_values
-                    # Strip everything up to the final period.
-                    host = re.sub(r'.*\.', "", host)
+            bmc = ret_values
 
     state = DotDict()
     for sub_state in req_states:
@@ -819,8 +837,9 @@ def wait_state(match_state=(),
                "quiet=${" + str(check_state_quiet) + "}"]
     grp.rdpissuing_keyword(cmd_buf)
     try:
-        state = BuiltIn().wait_until_keyword_succeeds(wait_time, interval,
-                                                      *cmd_buf)
+        with gp.timer("wait_state"):
+            state = BuiltIn().wait_until_keyword_succeeds(wait_time, interval,
+                                                          *cmd_buf)
     except AssertionError as my_assertion_error:
         gp.printn()
         message = my_assertion_error.args[0]
@@ -8,6 +8,8 @@ State Manager module:
 """
 from robot.libraries.BuiltIn import BuiltIn
 
+import openbmc_rest
+
 BuiltIn().import_resource("state_manager.robot")
 
 # We will build eventually the mapping for warm, cold reset as well.
@@ -32,14 +34,28 @@ class state_map():
         Return the system state as a tuple of power policy, bmc, chassis and
         host states.
         """
-        power_policy = BuiltIn().run_keyword('Get System Power Policy')
-        bmc_state = BuiltIn().run_keyword('Get BMC State')
-        chassis_state = BuiltIn().run_keyword('Get Chassis Power State')
-        host_state = BuiltIn().run_keyword('Get Host State')
+        # Read all four attributes at once (see
+        # openbmc_rest.rest_read_attributes) rather than running "Get System
+        # Power Policy", "Get BMC State", etc.
+        uri_attrs = [
+            (BuiltIn().get_variable_value("${HOST_SETTING}"), 'power_policy'),
+            (BuiltIn().get_variable_value("${BMC_STATE_URI}"),
+             'CurrentBMCState'),
+            (BuiltIn().get_variable_value("${CHASSIS_STATE_URI}"),
+             'CurrentPowerState'),
+            (BuiltIn().get_variable_value("${HOST_STATE_URI}"),
+             'CurrentHostState')]
+        values, missing = openbmc_rest.rest_read_attributes(uri_attrs)
+        if len(missing):
+            BuiltIn().fail("Unable to read the following attributes: " +
+                           ", ".join([uri + " " + attr for uri, attr in
+                                      missing]))
+        power_policy, bmc_state, chassis_state, host_state = \
+            [values[uri_attr] for uri_attr in uri_attrs]
         return (str(power_policy),
-                str(bmc_state),
-                str(chassis_state),
-                str(host_state))
+                str(bmc_state.rsplit('.', 1)[-1]),
+                str(chassis_state.rsplit('.', 1)[-1]),
+                str(host_state.rsplit('.', 1)[-1]))
 
     def valid_boot_state(self, boot_type, state_set):
         r"""